@@ -9,189 +9,301 @@ license: MIT
 """
 
 import canvasapi
+import hashlib
+import html
+import json
+import re
+import threading
+import time
+from canvasapi.course import Course
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel, Field
-from typing import Any, List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional
 
+# Seconds a tool result stays cached, per tool method
+CACHE_TTLS = {
+    "list_courses": 600,
+    "list_assignments": 120,
+    "list_modules": 300,
+    "list_assignments_for_all_courses": 120,
+    "list_upcoming_due": 60,
+    "get_assignment_details": 300,
+}
+# Most cached results kept across all users before the least recently used is dropped
+CACHE_MAX_ENTRIES = 256
+# Items per page requested from Canvas list endpoints (Canvas caps this at 100)
+CANVAS_PER_PAGE = 100
 
-def _module_to_dict(module: Any) -> Dict[str, Any]:
+# Every assignment attribute the tool can return, in Canvas API order
+ASSIGNMENT_FIELDS = (
+    "id", "name", "description", "created_at", "updated_at", "due_at", "lock_at",
+    "unlock_at", "has_overrides", "all_dates", "course_id", "html_url",
+    "submissions_download_url", "assignment_group_id", "due_date_required",
+    "allowed_extensions", "max_name_length", "turnitin_enabled", "vericite_enabled",
+    "turnitin_settings", "grade_group_students_individually",
+    "external_tool_tag_attributes", "peer_reviews", "automatic_peer_reviews",
+    "peer_review_count", "peer_reviews_assign_at", "intra_group_peer_reviews",
+    "group_category_id", "needs_grading_count", "needs_grading_count_by_section",
+    "position", "post_to_sis", "integration_id", "integration_data", "points_possible",
+    "submission_types", "has_submitted_submissions", "grading_type",
+    "grading_standard_id", "published", "unpublishable", "only_visible_to_overrides",
+    "locked_for_user", "lock_info", "lock_explanation", "quiz_id",
+    "anonymous_submissions", "discussion_topic", "freeze_on_copy", "frozen",
+    "frozen_attributes", "submission", "use_rubric_for_grading", "rubric_settings",
+    "rubric", "assignment_visibility", "overrides", "omit_from_final_grade",
+    "hide_in_gradebook", "moderated_grading", "grader_count", "final_grader_id",
+    "grader_comments_visible_to_graders", "graders_anonymous_to_graders",
+    "grader_names_visible_to_final_grader", "anonymous_grading", "allowed_attempts",
+    "post_manually", "score_statistics", "can_submit", "ab_guid",
+    "annotatable_attachment_id", "anonymize_students", "require_lockdown_browser",
+    "important_dates", "muted", "anonymous_peer_reviews",
+    "anonymous_instructor_annotations", "graded_submissions_exist",
+    "is_quiz_assignment", "in_closed_grading_period", "can_duplicate",
+    "original_course_id", "original_assignment_id", "original_lti_resource_link_id",
+    "original_assignment_name", "original_quiz_id", "workflow_state",
+)
+# Fields returned when no selection is given
+ASSIGNMENT_LIST_FIELDS = ("id", "name", "created_at", "updated_at", "due_at")
+ASSIGNMENT_DETAIL_FIELDS = (
+    "id", "name", "description", "due_at", "lock_at", "unlock_at", "points_possible",
+    "grading_type", "submission_types", "allowed_attempts", "html_url", "rubric",
+    "locked_for_user", "lock_explanation", "published", "course_id",
+)
+# Response size limits; roughly 4 bytes per token
+DEFAULT_MAX_RESPONSE_BYTES = 16000
+MAX_TEXT_CHARS = 2000
+# Top-level fields Canvas returns as HTML; every other string is kept verbatim
+HTML_FIELDS = ("description", "lock_explanation")
+MAX_LIST_ITEMS = 10
+MODULE_FIELDS = (
+    "id", "name", "position", "unlock_at", "require_sequential_progress",
+    "requirement_type", "publish_final_grade", "prerequisite_module_ids", "state",
+    "completed_at", "published", "items_count", "items_url",
+)
+
+
+def _select_fields(
+    fields: Optional[List[str]], allowed: tuple, default: tuple
+) -> List[str]:
+    """
+    Keep the requested fields that are known Canvas attributes.
+    Args:
+        fields (List[str], optional): Field names chosen by the caller.
+        allowed (tuple): The attributes that may be returned.
+        default (tuple): Fields used when none of the requested ones is allowed.
+    Returns:
+        List of field names; unknown names and object internals such as
+        methods or _requester are ignored.
+    """
+    selected = [field for field in fields or () if field in allowed]
+    return selected or list(default)
+
+
+def _module_to_dict(module: Any, fields: Optional[List[str]] = None) -> Dict[str, Any]:
     """
     Convert a Module object to a dictionary with structured data.
+    Handles null/missing fields using getattr with default None.
     Args:
         module (Any): A Canvas Module object.
+        fields (List[str], optional): Attributes to include (default: all of
+            MODULE_FIELDS).
     Returns:
         Dictionary with module details.
     """
-    return {
-        "id": module.id,
-        "name": module.name,
-        "position": module.position,
-        "unlock_at": module.unlock_at,
-        "require_sequential_progress": module.require_sequential_progress,
-        "requirement_type": module.requirement_type,
-        "publish_final_grade": module.publish_final_grade,
-        "prerequisite_module_ids": module.prerequisite_module_ids,
-        "state": module.state,
-        "completed_at": module.completed_at,
-        "published": module.published,
-        "items_count": module.items_count,
-        "items_url": module.items_url,
-    }
-
-
-def _detailed_assignment_to_dict(assignment: Any) -> Dict[str, Any]:
+    fields = _select_fields(fields, MODULE_FIELDS, MODULE_FIELDS)
+    return {field: getattr(module, field, None) for field in fields}
+
+
+def _detailed_assignment_to_dict(
+    assignment: Any, fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
     """
     Convert an Assignment object to a dictionary with structured data.
     Handles null/missing fields using getattr with default None.
     Args:
         assignment (Any): A Canvas Assignment object.
+        fields (List[str], optional): Attributes to include (default: all of
+            ASSIGNMENT_FIELDS); names outside ASSIGNMENT_FIELDS are ignored.
     Returns:
         Dictionary with assignment details.
     """
-    return {
-        "id": getattr(assignment, "id", None),
-        "name": getattr(assignment, "name", None),
-        "description": getattr(assignment, "description", None),
-        "created_at": getattr(assignment, "created_at", None),
-        "updated_at": getattr(assignment, "updated_at", None),
-        "due_at": getattr(assignment, "due_at", None),
-        "lock_at": getattr(assignment, "lock_at", None),
-        "unlock_at": getattr(assignment, "unlock_at", None),
-        "has_overrides": getattr(assignment, "has_overrides", None),
-        "all_dates": getattr(assignment, "all_dates", None),
-        "course_id": getattr(assignment, "course_id", None),
-        "html_url": getattr(assignment, "html_url", None),
-        "submissions_download_url": getattr(
-            assignment, "submissions_download_url", None
-        ),
-        "assignment_group_id": getattr(assignment, "assignment_group_id", None),
-        "due_date_required": getattr(assignment, "due_date_required", None),
-        "allowed_extensions": getattr(assignment, "allowed_extensions", None),
-        "max_name_length": getattr(assignment, "max_name_length", None),
-        "turnitin_enabled": getattr(assignment, "turnitin_enabled", None),
-        "vericite_enabled": getattr(assignment, "vericite_enabled", None),
-        "turnitin_settings": getattr(assignment, "turnitin_settings", None),
-        "grade_group_students_individually": getattr(
-            assignment, "grade_group_students_individually", None
-        ),
-        "external_tool_tag_attributes": getattr(
-            assignment, "external_tool_tag_attributes", None
-        ),
-        "peer_reviews": getattr(assignment, "peer_reviews", None),
-        "automatic_peer_reviews": getattr(assignment, "automatic_peer_reviews", None),
-        "peer_review_count": getattr(assignment, "peer_review_count", None),
-        "peer_reviews_assign_at": getattr(assignment, "peer_reviews_assign_at", None),
-        "intra_group_peer_reviews": getattr(
-            assignment, "intra_group_peer_reviews", None
-        ),
-        "group_category_id": getattr(assignment, "group_category_id", None),
-        "needs_grading_count": getattr(assignment, "needs_grading_count", None),
-        "needs_grading_count_by_section": getattr(
-            assignment, "needs_grading_count_by_section", None
-        ),
-        "position": getattr(assignment, "position", None),
-        "post_to_sis": getattr(assignment, "post_to_sis", None),
-        "integration_id": getattr(assignment, "integration_id", None),
-        "integration_data": getattr(assignment, "integration_data", None),
-        "points_possible": getattr(assignment, "points_possible", None),
-        "submission_types": getattr(assignment, "submission_types", None),
-        "has_submitted_submissions": getattr(
-            assignment, "has_submitted_submissions", None
-        ),
-        "grading_type": getattr(assignment, "grading_type", None),
-        "grading_standard_id": getattr(assignment, "grading_standard_id", None),
-        "published": getattr(assignment, "published", None),
-        "unpublishable": getattr(assignment, "unpublishable", None),
-        "only_visible_to_overrides": getattr(
-            assignment, "only_visible_to_overrides", None
-        ),
-        "locked_for_user": getattr(assignment, "locked_for_user", None),
-        "lock_info": getattr(assignment, "lock_info", None),
-        "lock_explanation": getattr(assignment, "lock_explanation", None),
-        "quiz_id": getattr(assignment, "quiz_id", None),
-        "anonymous_submissions": getattr(assignment, "anonymous_submissions", None),
-        "discussion_topic": getattr(assignment, "discussion_topic", None),
-        "freeze_on_copy": getattr(assignment, "freeze_on_copy", None),
-        "frozen": getattr(assignment, "frozen", None),
-        "frozen_attributes": getattr(assignment, "frozen_attributes", None),
-        "submission": getattr(assignment, "submission", None),
-        "use_rubric_for_grading": getattr(assignment, "use_rubric_for_grading", None),
-        "rubric_settings": getattr(assignment, "rubric_settings", None),
-        "rubric": getattr(assignment, "rubric", None),
-        "assignment_visibility": getattr(assignment, "assignment_visibility", None),
-        "overrides": getattr(assignment, "overrides", None),
-        "omit_from_final_grade": getattr(assignment, "omit_from_final_grade", None),
-        "hide_in_gradebook": getattr(assignment, "hide_in_gradebook", None),
-        "moderated_grading": getattr(assignment, "moderated_grading", None),
-        "grader_count": getattr(assignment, "grader_count", None),
-        "final_grader_id": getattr(assignment, "final_grader_id", None),
-        "grader_comments_visible_to_graders": getattr(
-            assignment, "grader_comments_visible_to_graders", None
-        ),
-        "graders_anonymous_to_graders": getattr(
-            assignment, "graders_anonymous_to_graders", None
-        ),
-        "grader_names_visible_to_final_grader": getattr(
-            assignment, "grader_names_visible_to_final_grader", None
-        ),
-        "anonymous_grading": getattr(assignment, "anonymous_grading", None),
-        "allowed_attempts": getattr(assignment, "allowed_attempts", None),
-        "post_manually": getattr(assignment, "post_manually", None),
-        "score_statistics": getattr(assignment, "score_statistics", None),
-        "can_submit": getattr(assignment, "can_submit", None),
-        "ab_guid": getattr(assignment, "ab_guid", None),
-        "annotatable_attachment_id": getattr(
-            assignment, "annotatable_attachment_id", None
-        ),
-        "anonymize_students": getattr(assignment, "anonymize_students", None),
-        "require_lockdown_browser": getattr(
-            assignment, "require_lockdown_browser", None
-        ),
-        "important_dates": getattr(assignment, "important_dates", None),
-        "muted": getattr(assignment, "muted", None),
-        "anonymous_peer_reviews": getattr(assignment, "anonymous_peer_reviews", None),
-        "anonymous_instructor_annotations": getattr(
-            assignment, "anonymous_instructor_annotations", None
-        ),
-        "graded_submissions_exist": getattr(
-            assignment, "graded_submissions_exist", None
-        ),
-        "is_quiz_assignment": getattr(assignment, "is_quiz_assignment", None),
-        "in_closed_grading_period": getattr(
-            assignment, "in_closed_grading_period", None
-        ),
-        "can_duplicate": getattr(assignment, "can_duplicate", None),
-        "original_course_id": getattr(assignment, "original_course_id", None),
-        "original_assignment_id": getattr(assignment, "original_assignment_id", None),
-        "original_lti_resource_link_id": getattr(
-            assignment, "original_lti_resource_link_id", None
-        ),
-        "original_assignment_name": getattr(
-            assignment, "original_assignment_name", None
-        ),
-        "original_quiz_id": getattr(assignment, "original_quiz_id", None),
-        "workflow_state": getattr(assignment, "workflow_state", None),
-    }
+    fields = _select_fields(fields, ASSIGNMENT_FIELDS, ASSIGNMENT_FIELDS)
+    return {field: getattr(assignment, field, None) for field in fields}
 
 
 # Standalone helper function to convert Assignment objects to dictionaries
-def _assignment_to_dict(assignment: Any) -> Dict[str, Any]:
+def _assignment_to_dict(assignment: Any, fields: Optional[List[str]] = None) -> Dict[str, Any]:
     """
-    Convert an Assignment object to a dictionary with structured data.
+    Convert an Assignment object to a compact dictionary for list results.
 
     Args:
         assignment (Any): A Canvas Assignment object.
+        fields (List[str], optional): Attributes to include (default:
+            ASSIGNMENT_LIST_FIELDS); names outside ASSIGNMENT_FIELDS are ignored.
 
     Returns:
         Dictionary with assignment details.
     """
-    return {
-        "id": assignment.id,
-        "name": assignment.name,
-        # "description": assignment.description,
-        "created_at": assignment.created_at,
-        "updated_at": assignment.updated_at,
-        "due_at": assignment.due_at,
-    }
+    fields = _select_fields(fields, ASSIGNMENT_FIELDS, ASSIGNMENT_LIST_FIELDS)
+    return _compact(_detailed_assignment_to_dict(assignment, fields))
+
+
+def _html_to_text(value: str) -> str:
+    """
+    Reduce Canvas HTML (descriptions, lock explanations) to plain text.
+    """
+    value = re.sub(r"(?i)<br\s*/?>|</(p|div|li|h[1-6]|tr)>", "\n", value)
+    value = html.unescape(re.sub(r"<[^>]+>", "", value))
+    return re.sub(r"[ \t]*\n\s*", "\n", re.sub(r"[ \t\xa0]+", " ", value)).strip()
+
+
+def _compact_value(value: Any, is_html: bool = False) -> tuple:
+    """
+    Shrink one field value for the LLM context.
+
+    Args:
+        value (Any): The field value.
+        is_html (bool): The value is Canvas HTML and is reduced to text.
+
+    Returns:
+        (value, truncated) where truncated tells whether anything was cut.
+    """
+    if isinstance(value, str):
+        if is_html:
+            value = _html_to_text(value)
+        if len(value) > MAX_TEXT_CHARS:
+            return value[:MAX_TEXT_CHARS] + "...", True
+        return value, False
+    if isinstance(value, list):
+        truncated = len(value) > MAX_LIST_ITEMS
+        items = []
+        for item in value[:MAX_LIST_ITEMS]:
+            item, cut = _compact_value(item)
+            items.append(item)
+            truncated = truncated or cut
+        return items, truncated
+    if isinstance(value, dict):
+        compacted = {}
+        truncated = False
+        for key, item in value.items():
+            if item is None:
+                continue
+            # Rubric criteria carry a full ratings table; the description and points are enough
+            if key == "ratings" and isinstance(item, list):
+                truncated = True
+                continue
+            compacted[key], cut = _compact_value(item)
+            truncated = truncated or cut
+        return compacted, truncated
+    return value, False
+
+
+def _compact(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop None values, reduce HTML fields to text and cut heavy fields of a
+    result dict. Cut fields are listed under "truncated".
+    """
+    compacted = {}
+    truncated = []
+    for key, value in data.items():
+        if value is None:
+            continue
+        compacted[key], cut = _compact_value(value, key in HTML_FIELDS)
+        if cut:
+            truncated.append(key)
+    if truncated:
+        compacted["truncated"] = truncated
+    return compacted
+
+
+def _fit_bytes(data: Dict[str, Any], max_bytes: Optional[int]) -> Dict[str, Any]:
+    """
+    Halve (or drop) the largest fields of a compacted result dict until its
+    JSON encoding fits in max_bytes. Cut fields are added to "truncated".
+    """
+    if max_bytes is None:
+        return data
+    compacted = {key: value for key, value in data.items() if key != "truncated"}
+    truncated = list(data.get("truncated", ()))
+    sizes = {key: len(json.dumps({key: value}, default=str)) for key, value in compacted.items()}
+    while sum(sizes.values()) > max_bytes:
+        key = max((k for k in sizes if k not in ("id", "name")), key=sizes.get, default=None)
+        if key is None:
+            break
+        value = compacted[key]
+        if isinstance(value, str) and len(value) > 200:
+            compacted[key] = value[: len(value) // 2] + "..."
+        elif isinstance(value, list) and len(value) > 1:
+            compacted[key] = value[: len(value) // 2]
+        else:
+            del compacted[key]
+            del sizes[key]
+            if key not in truncated:
+                truncated.append(key)
+            continue
+        sizes[key] = len(json.dumps({key: compacted[key]}, default=str))
+        if key not in truncated:
+            truncated.append(key)
+
+    if truncated:
+        compacted["truncated"] = truncated
+    return compacted
+
+
+def _fit_list(items: List[Dict[str, Any]], max_bytes: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Keep the leading items of a list result that fit in max_bytes of JSON,
+    followed by an {"omitted": n} entry if any had to be left out.
+    """
+    if max_bytes is None:
+        return items
+    size = 2
+    for index, item in enumerate(items):
+        size += len(json.dumps(item, default=str)) + 2
+        if size > max_bytes:
+            return items[:index] + [{"omitted": len(items) - index}]
+    return items
+
+
+def _course_stub(canvas: canvasapi.Canvas, course_id: int) -> Any:
+    """
+    Build a Course carrying only its id on the client's requester, which is
+    all that listing a course's assignments or modules needs.
+
+    canvasapi keeps the requester in a private attribute; if a release
+    renames it, this falls back to a get_course() round trip.
+    """
+    try:
+        requester = canvas._Canvas__requester
+    except AttributeError:
+        return canvas.get_course(course_id)
+    return Course(requester, {"id": course_id})
+
+
+def _due_sort_key(item: Dict[str, Any]) -> tuple:
+    """
+    Sort key for merged course results: earliest due date first, undated
+    items and per-course errors last.
+    """
+    due_at = item.get("due_at")
+    return (due_at is None, due_at or "", item.get("course_id") or 0)
+
+
+def _parse_canvas_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a Canvas ISO 8601 timestamp (e.g. "2024-01-31T23:59:00Z").
+
+    Returns:
+        A timezone-aware datetime, or None if the value is empty or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
 
 
 class Tools:
@@ -203,79 +315,349 @@ class Tools:
             default="https://fhict.instructure.com",
             description="Your CANVAS DOMAIN address here",
         )
+        max_concurrent_requests: int = Field(
+            default=8,
+            description="Maximum number of courses fetched in parallel by the all-courses tools",
+        )
+        course_enrollment_state: str = Field(
+            default="active",
+            description="Only list courses with this enrollment state "
+            "(active, invited_or_pending, completed); leave empty for all",
+        )
 
     def __init__(self):
         """Initialize the Canvas Course Maker tool."""
         self.valves = self.Valves()
-        self.canvas = canvasapi.Canvas(
-            "https://fhict.instructure.com",
-            "2464~xTDWAKexVeazXxKJu2mFyhhNNmkca3Lm2GncGm8hM64aB6Ry6W23vTnRGeMVUtEn",
-        )
-        # self.canvas = canvasapi.Canvas(self.valves.canvas_domain, self.valves.api_token)
         self.citation = True
+        self._canvas = None
+        self._canvas_key = None
+        # Course objects seen in get_courses(), by id, so child listings can
+        # skip the get_course() round trip
+        self._courses: Dict[int, Any] = {}
+        # (credentials, method, args) -> (expires_at, result), oldest first
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {"hits": 0, "misses": 0}
 
-    # class Valves(BaseModel):
-    #    """Configuration for the Canvas API."""
-    #
-    #    api_token: str = Field(default="", description="Your CANVAS API token here")
-    #    canvas_domain: str = Field(
-    #        default="", description="Your CANVAS DOMAIN address here"
-    #    )
+    @property
+    def canvas(self) -> canvasapi.Canvas:
+        """
+        Canvas client for the current valves, rebuilt when they change.
+        """
+        key = (self.valves.canvas_domain, self.valves.api_token)
+        if self._canvas is None or self._canvas_key != key:
+            self._canvas = canvasapi.Canvas(*key)
+            self._canvas_key = key
+            self._courses = {}
+        return self._canvas
+
+    def _cached(self, method: str, args: tuple, fetch: Callable[[], Any], refresh: bool = False) -> Any:
+        """
+        Return fetch()'s result, reusing one cached for the same credentials
+        and arguments within the method's TTL.
 
-    def list_courses(self) -> List[Dict[str, Any]]:
+        refresh=True skips the lookup and stores a fresh result. Results that
+        contain error entries are not stored.
+        """
+        credentials = hashlib.sha256(
+            f"{self.valves.canvas_domain}\0{self.valves.api_token}".encode()
+        ).hexdigest()
+        key = (credentials, method, args)
+        now = time.monotonic()
+        if not refresh:
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry is not None and entry[0] > now:
+                    self._cache.move_to_end(key)
+                    self.cache_stats["hits"] += 1
+                    return entry[1]
+                self.cache_stats["misses"] += 1
+
+        result = fetch()
+        if isinstance(result, list) and any("error" in item for item in result):
+            return result
+        with self._cache_lock:
+            self._cache[key] = (now + CACHE_TTLS.get(method, 60), result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        return result
+
+    def list_courses(self, refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Retrieve all courses the user has access to.
 
+        Args:
+            refresh (bool): Bypass the cache and fetch fresh data from Canvas.
+
         Returns:
             List of Course objects (or PaginatedList from canvasapi)
         """
-        courses = []
-        for course in self.canvas.get_courses():
-            courses.append({"name": course.name, "id": course.id})
+        return self._cached(
+            "list_courses",
+            (self.valves.course_enrollment_state,),
+            lambda: [
+                {"name": getattr(course, "name", None), "id": course.id}
+                for course in self._get_courses()
+            ],
+            refresh,
+        )
+
+    def _get_courses(self) -> List[Any]:
+        """
+        Fetch the user's courses and remember them for _course().
+
+        Full pages are requested and, unless the course_enrollment_state valve
+        is empty, only courses in that enrollment state are returned, so
+        concluded courses cost neither requests nor fan-out work.
+        """
+        kwargs = {"per_page": CANVAS_PER_PAGE}
+        if self.valves.course_enrollment_state:
+            kwargs["enrollment_state"] = self.valves.course_enrollment_state
+        courses = list(self.canvas.get_courses(**kwargs))
+        self._courses.update((course.id, course) for course in courses)
         return courses
 
-    def list_assignments(self, course_id: int) -> List[Dict[str, Any]]:
+    def _course(self, course_id: int) -> Any:
+        """
+        Return a Course handle for course_id without an HTTP request.
+
+        A Course seen by list_courses() is reused; otherwise a stub from
+        _course_stub() is returned.
+        """
+        # Resolve the client first: it drops handles made with other credentials
+        canvas = self.canvas
+        course = self._courses.get(course_id)
+        if course is None:
+            course = _course_stub(canvas, course_id)
+        return course
+
+    def _for_each_course(
+        self, fetch: Callable[[Any], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Run fetch(course) for every course on a bounded thread pool.
+
+        The Course objects from get_courses() are used as-is, so no extra
+        get_course() round trip is made per course. Each result is tagged with
+        its course_id and course_name; a course that fails contributes a single
+        {"course_id", "error"} entry instead of failing the whole call.
+        """
+        courses = self._get_courses()
+        if not courses:
+            return []
+
+        def run(course: Any) -> List[Dict[str, Any]]:
+            course_name = getattr(course, "name", None)
+            try:
+                items = fetch(course)
+            except Exception as e:
+                return [{"course_id": course.id, "course_name": course_name, "error": str(e)}]
+            for item in items:
+                item["course_id"] = course.id
+                item["course_name"] = course_name
+            return items
+
+        workers = max(1, min(self.valves.max_concurrent_requests, len(courses)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(run, courses)
+            return [item for items in results for item in items]
+
+    def list_assignments(
+        self,
+        course_id: int,
+        fields: Optional[List[str]] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_RESPONSE_BYTES,
+        refresh: bool = False,
+    ) -> List[Dict[str, Any]]:
         """
         Retrieve all assignments for a specific course.
 
         Args:
             course_id (int): The ID of the course to fetch assignments from.
+            fields (List[str], optional): Assignment attributes to return
+                (default: id, name, created_at, updated_at, due_at).
+            max_bytes (int, optional): Size budget for the JSON response; items
+                past it are replaced by an {"omitted": n} entry.
+            refresh (bool): Bypass the cache and fetch fresh data from Canvas.
 
         Returns:
             List of dictionaries with assignment details.
         """
         try:
-            course = self.canvas.get_course(course_id)
-            assignments = course.get_assignments()
-            return [_assignment_to_dict(assignment) for assignment in assignments]
+            assignments = self._cached(
+                "list_assignments",
+                (course_id, tuple(fields or ())),
+                lambda: [
+                    _assignment_to_dict(assignment, fields)
+                    for assignment in self._course(course_id).get_assignments(per_page=CANVAS_PER_PAGE)
+                ],
+                refresh,
+            )
+            return _fit_list(assignments, max_bytes)
+        except Exception as e:
+            return [{"error": f"Failed to fetch assignments: {str(e)}"}]
+
+    def list_assignments_for_all_courses(
+        self,
+        fields: Optional[List[str]] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_RESPONSE_BYTES,
+        refresh: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the assignments of every course in one call.
+
+        Courses are fetched concurrently and the results merged into a single
+        list sorted by due date (assignments without one last).
+
+        Args:
+            fields (List[str], optional): Assignment attributes to return
+                (default: id, name, created_at, updated_at, due_at).
+            max_bytes (int, optional): Size budget for the JSON response; items
+                past it are replaced by an {"omitted": n} entry.
+            refresh (bool): Bypass the cache and fetch fresh data from Canvas.
+
+        Returns:
+            List of dictionaries with assignment details plus course_id and
+            course_name, or error entries for courses that failed.
+        """
+
+        def fetch() -> List[Dict[str, Any]]:
+            assignments = self._for_each_course(
+                lambda course: [
+                    _assignment_to_dict(a, fields)
+                    for a in course.get_assignments(per_page=CANVAS_PER_PAGE)
+                ]
+            )
+            return sorted(assignments, key=_due_sort_key)
+
+        try:
+            assignments = self._cached(
+                "list_assignments_for_all_courses",
+                (self.valves.course_enrollment_state, tuple(fields or ())),
+                fetch,
+                refresh,
+            )
+            return _fit_list(assignments, max_bytes)
         except Exception as e:
             return [{"error": f"Failed to fetch assignments: {str(e)}"}]
 
-    def get_assignment_details(self, assignment_id: int) -> Dict[str, Any]:
+    def list_upcoming_due(
+        self,
+        days: int = 7,
+        fields: Optional[List[str]] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_RESPONSE_BYTES,
+        refresh: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the assignments due in the next few days across all courses.
+
+        Args:
+            days (int): How many days ahead to look (default 7).
+            fields (List[str], optional): Assignment attributes to return
+                (default: id, name, created_at, updated_at, due_at).
+            max_bytes (int, optional): Size budget for the JSON response; items
+                past it are replaced by an {"omitted": n} entry.
+            refresh (bool): Bypass the cache and fetch fresh data from Canvas.
+
+        Returns:
+            List of dictionaries with assignment details plus course_id and
+            course_name, sorted by due date, or error entries for courses that
+            failed.
+        """
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(days=days)
+
+        def upcoming(course: Any) -> List[Dict[str, Any]]:
+            items = []
+            # Canvas leaves out assignments whose due date has passed
+            for assignment in course.get_assignments(bucket="future", per_page=CANVAS_PER_PAGE):
+                due_at = _parse_canvas_time(getattr(assignment, "due_at", None))
+                if due_at is not None and now <= due_at <= until:
+                    items.append(_assignment_to_dict(assignment, fields))
+            return items
+
+        try:
+            assignments = self._cached(
+                "list_upcoming_due",
+                (self.valves.course_enrollment_state, days, tuple(fields or ())),
+                lambda: sorted(self._for_each_course(upcoming), key=_due_sort_key),
+                refresh,
+            )
+            return _fit_list(assignments, max_bytes)
+        except Exception as e:
+            return [{"error": f"Failed to fetch upcoming assignments: {str(e)}"}]
+
+    def get_assignment_details(
+        self,
+        course_id: int,
+        assignment_id: int,
+        fields: Optional[List[str]] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_RESPONSE_BYTES,
+        refresh: bool = False,
+    ) -> Dict[str, Any]:
         """
         Retrieve detailed assignment data by ID.
         Args:
+            course_id (int): The ID of the course the assignment belongs to.
             assignment_id (int): The ID of the assignment.
+            fields (List[str], optional): Assignment attributes to return, or
+                ["*"] for all of them (default: the commonly needed details).
+            max_bytes (int, optional): Size budget for the JSON response; the
+                largest fields are shortened or dropped to fit.
+            refresh (bool): Bypass the cache and fetch fresh data from Canvas.
         Returns:
-            Dictionary with all assignment details or error message.
+            Dictionary with assignment details (HTML reduced to text, empty
+            fields left out) or error message.
         """
+        if fields is None:
+            fields = list(ASSIGNMENT_DETAIL_FIELDS)
+        elif "*" in fields:
+            fields = list(ASSIGNMENT_FIELDS)
         try:
-            assignment = self.canvas.get_assignment(assignment_id)
-            return self._assignment_to_dict(assignment)
+            assignment = self._cached(
+                "get_assignment_details",
+                (course_id, assignment_id, tuple(fields)),
+                lambda: _compact(
+                    _detailed_assignment_to_dict(
+                        self._course(course_id).get_assignment(assignment_id), fields
+                    )
+                ),
+                refresh,
+            )
+            return _fit_bytes(assignment, max_bytes)
         except Exception as e:
             return {"error": f"Failed to fetch assignment details: {str(e)}"}
 
-    def list_modules(self, course_id: int) -> List[Dict[str, Any]]:
+    def list_modules(
+        self,
+        course_id: int,
+        fields: Optional[List[str]] = None,
+        max_bytes: Optional[int] = DEFAULT_MAX_RESPONSE_BYTES,
+        refresh: bool = False,
+    ) -> List[Dict[str, Any]]:
         """
         Retrieve all modules for a specific course.
         Args:
             course_id (int): The ID of the course to fetch modules from.
+            fields (List[str], optional): Module attributes to return (default: all).
+            max_bytes (int, optional): Size budget for the JSON response; items
+                past it are replaced by an {"omitted": n} entry.
+            refresh (bool): Bypass the cache and fetch fresh data from Canvas.
         Returns:
             List of dictionaries with module details.
         """
+
         try:
-            course = self.canvas.get_course(course_id)
-            modules = course.get_modules()
-            return [_module_to_dict(module) for module in modules]
+            modules = self._cached(
+                "list_modules",
+                (course_id, tuple(fields or ())),
+                lambda: [
+                    _compact(_module_to_dict(module, fields))
+                    for module in self._course(course_id).get_modules(per_page=CANVAS_PER_PAGE)
+                ],
+                refresh,
+            )
+            return _fit_list(modules, max_bytes)
         except Exception as e:
             return [{"error": f"Failed to fetch modules: {str(e)}"}]
@@ -10,7 +10,9 @@ licence: MIT
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List, Optional, Union
+from urllib3.util.retry import Retry
 
 
 class Tools:
@@ -32,6 +34,36 @@ class Tools:
         # Add authorization if API key is provided
         if api_key:
             self.headers["Authorization"] = f"Bearer {api_key}"
+        
+        # Connect and read timeouts in seconds
+        self.timeout = (
+            float(os.environ.get("API_CONNECT_TIMEOUT", "5")),
+            float(os.environ.get("API_READ_TIMEOUT", "30")),
+        )
+        
+        # One pooled session per instance, so connections are kept alive and
+        # reused; idempotent requests that get 429 or 5xx are retried with
+        # exponential backoff (honouring Retry-After)
+        retries = Retry(
+            total=int(os.environ.get("API_MAX_RETRIES", "3")),
+            backoff_factor=float(os.environ.get("API_RETRY_BACKOFF", "0.5")),
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False,
+        )
+        pool_size = int(os.environ.get("API_POOL_SIZE", "10"))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
+        
+        # requests re-reads proxy, netrc and CA bundle settings from the
+        # environment on every call; with API_TRUST_ENV=false proxy and CA
+        # bundle settings are read once, here, instead (netrc is then unused)
+        if os.environ.get("API_TRUST_ENV", "true").lower() in ("0", "false", "no"):
+            self.session.proxies.update(requests.utils.get_environ_proxies(self.api_base))
+            self.session.verify = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or True
+            self.session.trust_env = False
 
     def list_items(self, limit: Optional[int] = None) -> dict:
         """
@@ -48,22 +80,11 @@ class Tools:
         params = {
             "limit": limit,
         }
+        params = {key: value for key, value in params.items() if value is not None}
         
+        response = None
         try:
-            method = "get".lower()
-            if method == "get":
-                response = requests.get(url, params=params, headers=self.headers)
-            elif method == "post":
-                response = requests.post(url, params=params, headers=self.headers)
-            elif method == "put":
-                response = requests.put(url, params=params, headers=self.headers)
-            elif method == "delete":
-                response = requests.delete(url, params=params, headers=self.headers)
-            elif method == "patch":
-                response = requests.patch(url, params=params, headers=self.headers)
-            else:
-                response = requests.get(url, params=params, headers=self.headers)
-            
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+OpenAPI Loader - Reads parts of a large OpenAPI schema without decoding all of it.
+
+json.load on a multi-megabyte spec builds the whole dict tree even when only
+one tag is needed. LazySpec instead scans the file once for the byte offsets
+of every path item and component schema, and decodes an entry only when it
+is asked for, so peak memory stays close to the size of the file text.
+
+load_compiled_spec goes further and caches the parsed spec, its schema
+reference graph and per-tag subsets in an artifact next to the spec, which
+the parser and the proxy both reuse until the spec's content changes.
+"""
+
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Top-level members whose own members are indexed; all other values are
+# skipped whole
+SPEC_LAYOUT = {'paths': {}, 'components': {'schemas': {}}}
+
+# Bump when the layout of compiled spec artifacts (see compile_spec) changes
+COMPILED_SPEC_VERSION = 2
+COMPILED_SPEC_SUFFIX = '.compiled.pickle'
+
+WHITESPACE = re.compile(r'\s*')
+_decoder = json.JSONDecoder()
+
+def schema_ref_name(ref: Any) -> Optional[str]:
+    """
+    Return the component schema name a $ref value points to.
+
+    Besides '#/components/schemas/Name', bare names such as 'User' are accepted,
+    as used by the Swagger-converted Canvas spec.
+    """
+    if not isinstance(ref, str):
+        return None
+    if ref.startswith('#/components/schemas/'):
+        return ref.split('/')[-1]
+    if ref and '/' not in ref and '#' not in ref:
+        return ref
+    return None
+
+def find_schema_refs(value: Any) -> Set[str]:
+    """
+    Collect the component schema names referenced anywhere inside a value.
+
+    The walk is iterative and covers every keyword (properties, items,
+    allOf/oneOf/anyOf, additionalProperties, parameters, nested objects...).
+    """
+    refs: Set[str] = set()
+    stack = [value]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            name = schema_ref_name(current.get('$ref'))
+            if name:
+                refs.add(name)
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return refs
+
+def scan_object(text: str, start: int, layout: Optional[Dict] = None) -> Tuple[Dict[str, Tuple], int]:
+    """
+    Index the members of the JSON object whose opening brace is at text[start].
+
+    Returns ({key: (value_start, value_end, members)}, end). Members named in
+    layout are scanned recursively (members is their own index); every other
+    value is run through the C decoder once to find its end and then dropped,
+    so no more than one member is materialized at a time.
+    """
+    members: Dict[str, Tuple] = {}
+    position = WHITESPACE.match(text, start + 1).end()
+    if text.startswith('}', position):
+        return members, position + 1
+    while True:
+        if not text.startswith('"', position):
+            raise ValueError(f"Expected a property name at offset {position}")
+        key, position = json.decoder.scanstring(text, position + 1)
+        position = WHITESPACE.match(text, position).end()
+        if not text.startswith(':', position):
+            raise ValueError(f"Expected ':' at offset {position}")
+        value_start = WHITESPACE.match(text, position + 1).end()
+        if layout is not None and key in layout and text.startswith('{', value_start):
+            children, position = scan_object(text, value_start, layout[key])
+        else:
+            children = None
+            _, position = _decoder.raw_decode(text, value_start)
+        members[key] = (value_start, position, children)
+        position = WHITESPACE.match(text, position).end()
+        if text.startswith('}', position):
+            return members, position + 1
+        if not text.startswith(',', position):
+            raise ValueError(f"Expected ',' or '}}' at offset {position}")
+        position = WHITESPACE.match(text, position + 1).end()
+
+class RefGraph:
+    """
+    Reference graph between component schemas.
+
+    The graph is built once; the transitive closure of every schema is then
+    computed in a single pass over its strongly connected components, so
+    reference cycles are handled and each closure is computed only once.
+    """
+
+    def __init__(self, components_schemas: Dict[str, Any]):
+        self.edges: Dict[str, Set[str]] = {
+            name: {ref for ref in find_schema_refs(schema) if ref in components_schemas}
+            for name, schema in components_schemas.items()
+        }
+        self._closures: Optional[Dict[str, FrozenSet[str]]] = None
+
+    @classmethod
+    def from_closures(cls, closures: Dict[str, FrozenSet[str]]) -> 'RefGraph':
+        """Rebuild a graph from closures computed earlier, e.g. by compile_spec."""
+        graph = cls({})
+        graph._closures = closures
+        return graph
+
+    def closures(self) -> Dict[str, FrozenSet[str]]:
+        """Return the closure of every schema."""
+        if self._closures is None:
+            self._closures = self._compute_closures()
+        return self._closures
+
+    def _compute_closures(self) -> Dict[str, FrozenSet[str]]:
+        """Tarjan's algorithm (iterative); components are emitted successors first."""
+        closures: Dict[str, FrozenSet[str]] = {}
+        index_of: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        scc_stack: List[str] = []
+        counter = 0
+
+        for root in self.edges:
+            if root in index_of:
+                continue
+            work = [(root, iter(sorted(self.edges[root])))]
+            index_of[root] = lowlink[root] = counter
+            counter += 1
+            scc_stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for successor in successors:
+                    if successor not in index_of:
+                        index_of[successor] = lowlink[successor] = counter
+                        counter += 1
+                        scc_stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(sorted(self.edges[successor]))))
+                        advanced = True
+                        break
+                    if successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index_of[successor])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_of[node]:
+                    component = set()
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack.discard(member)
+                        component.add(member)
+                        if member == node:
+                            break
+                    # Successor components are already closed
+                    closure = set(component)
+                    for member in component:
+                        for successor in self.edges[member]:
+                            if successor not in component:
+                                closure |= closures[successor]
+                    frozen = frozenset(closure)
+                    for member in component:
+                        closures[member] = frozen
+        return closures
+
+    def closure(self, name: str) -> FrozenSet[str]:
+        """Return the schemas name depends on transitively, itself included."""
+        return self.closures().get(name, frozenset())
+
+    def closure_of(self, names: Iterable[str]) -> Set[str]:
+        """Return the union of the closures of several schemas."""
+        result: Set[str] = set()
+        for name in names:
+            result |= self.closure(name)
+        return result
+
+class LazySpec:
+    """
+    An OpenAPI schema whose path items and component schemas are decoded on demand.
+
+    Decoded entries are not cached, so callers that need one twice should
+    keep the result.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        start = WHITESPACE.match(text).end()
+        if not text.startswith('{', start):
+            raise ValueError("An OpenAPI schema must be a JSON object")
+        self.members, _ = scan_object(text, start, SPEC_LAYOUT)
+        self.path_spans = self._children('paths', self.members)
+        components = self.members.get('components', (0, 0, None))[2] or {}
+        self.component_spans = {key: member[:2] for key, member in components.items() if key != 'schemas'}
+        self.schema_spans = self._children('schemas', components)
+
+    @classmethod
+    def from_file(cls, openapi_file: str) -> 'LazySpec':
+        with open(openapi_file, 'r', encoding='utf-8') as f:
+            return cls(f.read())
+
+    @staticmethod
+    def _children(key: str, members: Dict[str, Tuple]) -> Dict[str, Tuple[int, int]]:
+        children = members[key][2] if key in members else None
+        return {name: member[:2] for name, member in (children or {}).items()}
+
+    def decode(self, span: Tuple[int, ...]) -> Any:
+        return _decoder.raw_decode(self.text, span[0])[0]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Decode a top-level member such as 'info' or 'openapi'."""
+        return self.decode(self.members[key]) if key in self.members else default
+
+    def path_item(self, path: str) -> Dict[str, Any]:
+        return self.decode(self.path_spans[path])
+
+    def operations(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Yield (path, method, operation), decoding one path item at a time."""
+        for path, span in self.path_spans.items():
+            for method, operation in self.decode(span).items():
+                yield path, method, operation
+
+    def schema_closure(self, names: Iterable[str]) -> Dict[str, Any]:
+        """Decode the named component schemas and every schema they reference."""
+        schemas: Dict[str, Any] = {}
+        pending = [name for name in names if name in self.schema_spans]
+        while pending:
+            name = pending.pop()
+            if name in schemas:
+                continue
+            schemas[name] = self.decode(self.schema_spans[name])
+            pending.extend(ref for ref in find_schema_refs(schemas[name]) if ref in self.schema_spans)
+        return schemas
+
+    def subset(self, operations: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        Materialize a schema with only the given (path, method) operations and
+        the component schemas they need; other components are kept whole, so
+        the schemas they reference are kept too.
+        """
+        paths: Dict[str, Dict[str, Any]] = {}
+        path_items: Dict[str, Dict[str, Any]] = {}
+        used: Set[str] = set()
+        for path, method in operations:
+            if path not in path_items:
+                path_items[path] = self.path_item(path)
+            operation = path_items[path][method]
+            paths.setdefault(path, {})[method] = operation
+            used |= find_schema_refs(operation)
+
+        components = {key: self.decode(span) for key, span in self.component_spans.items()}
+        used |= find_schema_refs(components)
+        schemas = self.schema_closure(used)
+        # Keep the component order of the source file
+        components['schemas'] = {name: schemas[name] for name in self.schema_spans if name in schemas}
+
+        subset = {key: self.decode(span) for key, span in self.members.items() if key not in ('paths', 'components')}
+        subset['paths'] = paths
+        subset['components'] = components
+        return subset
+
+def spec_subset(
+    openapi: Dict[str, Any],
+    operations: Iterable[Tuple[str, str]],
+    operation_schemas: Dict[Tuple[str, str], Set[str]],
+    ref_graph: RefGraph
+) -> Dict[str, Any]:
+    """The same subset as LazySpec.subset, taken from a decoded spec."""
+    components_schemas = openapi.get('components', {}).get('schemas', {})
+    paths: Dict[str, Dict[str, Any]] = {}
+    used: Set[str] = set()
+    for path, method in operations:
+        paths.setdefault(path, {})[method] = openapi['paths'][path][method]
+        used |= operation_schemas[(path, method)]
+
+    subset = {key: value for key, value in openapi.items() if key not in ('paths', 'components')}
+    subset['paths'] = paths
+    subset['components'] = {key: value for key, value in openapi.get('components', {}).items() if key != 'schemas'}
+    used = ref_graph.closure_of(used | find_schema_refs(subset['components']))
+    subset['components']['schemas'] = {name: schema for name, schema in components_schemas.items() if name in used}
+    return subset
+
+def compile_spec(openapi: Dict[str, Any], digest: str) -> bytes:
+    """
+    Compile a decoded spec into a cache artifact.
+
+    The artifact is a pickled header (format version, source hash and section
+    offsets) followed by separately pickled sections, so readers only unpickle
+    the sections they use:
+
+    - openapi: the spec itself
+    - operations: every (path, method) in spec order
+    - operation_schemas: the schemas each operation references directly
+    - closures: the transitive schema closure of every component schema
+    - tags: each tag's operations
+    - tag_subsets: each tag's subset spec (see spec_subset) as compact JSON
+    """
+    operations = [(path, method) for path, methods in openapi['paths'].items() for method in methods]
+    operation_schemas = {
+        (path, method): find_schema_refs(openapi['paths'][path][method]) for path, method in operations
+    }
+    components_schemas = openapi.get('components', {}).get('schemas', {})
+    ref_graph = RefGraph(components_schemas)
+    tags: Dict[str, List[Tuple[str, str]]] = {}
+    for path, method in operations:
+        for tag in openapi['paths'][path][method].get('tags', []):
+            tags.setdefault(tag, []).append((path, method))
+    tag_subsets = {
+        tag: json.dumps(spec_subset(openapi, tag_operations, operation_schemas, ref_graph),
+                        separators=(',', ':')).encode('utf-8')
+        for tag, tag_operations in tags.items()
+    }
+
+    sections = {
+        'openapi': openapi,
+        'operations': operations,
+        'operation_schemas': operation_schemas,
+        # In spec order, which tag_subset relies on
+        'closures': {name: ref_graph.closure(name) for name in components_schemas},
+        'tags': tags,
+        'tag_subsets': tag_subsets,
+    }
+    body = io.BytesIO()
+    offsets = {}
+    for name, value in sections.items():
+        start = body.tell()
+        pickle.dump(value, body, protocol=pickle.HIGHEST_PROTOCOL)
+        offsets[name] = (start, body.tell() - start)
+    header = {'version': COMPILED_SPEC_VERSION, 'source_hash': digest, 'sections': offsets}
+    return pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL) + body.getvalue()
+
+class CompiledSpec:
+    """A compiled spec artifact whose sections are unpickled on first use."""
+
+    def __init__(self, data: bytes):
+        stream = io.BytesIO(data)
+        header = pickle.load(stream)
+        self.version = header['version']
+        self.source_hash = header['source_hash']
+        self._data = memoryview(data)[stream.tell():]
+        self._offsets = header['sections']
+        self._sections: Dict[str, Any] = {}
+
+    def section(self, name: str) -> Any:
+        if name not in self._sections:
+            start, length = self._offsets[name]
+            self._sections[name] = pickle.loads(self._data[start:start + length])
+        return self._sections[name]
+
+    @property
+    def openapi(self) -> Dict[str, Any]:
+        return self.section('openapi')
+
+    def ref_graph(self) -> RefGraph:
+        return RefGraph.from_closures(self.section('closures'))
+
+    def tag_subset(self, include_tags: List[str]) -> Dict[str, Any]:
+        """
+        The subset spec of the operations carrying any of include_tags, built
+        from the pre-serialized per-tag subsets without unpickling the spec.
+        """
+        tag_subsets = self.section('tag_subsets')
+        subsets = [json.loads(tag_subsets[tag]) for tag in dict.fromkeys(include_tags) if tag in tag_subsets]
+        if len(subsets) == 1:
+            return subsets[0]
+        if not subsets:
+            return spec_subset(self.openapi, [], {}, self.ref_graph())
+
+        # Merge in spec order, as if the subset had been built in one pass
+        operation_order = {operation: position for position, operation in enumerate(self.section('operations'))}
+        schema_order = {name: position for position, name in enumerate(self.section('closures'))}
+        operations: Dict[Tuple[str, str], Any] = {}
+        schemas: Dict[str, Any] = {}
+        for tag_subset in subsets:
+            for path, methods in tag_subset['paths'].items():
+                for method, operation in methods.items():
+                    operations[(path, method)] = operation
+            schemas.update(tag_subset['components']['schemas'])
+        merged = subsets[0]
+        merged['paths'] = {}
+        for path, method in sorted(operations, key=operation_order.__getitem__):
+            merged['paths'].setdefault(path, {})[method] = operations[(path, method)]
+        merged['components']['schemas'] = {name: schemas[name] for name in sorted(schemas, key=schema_order.__getitem__)}
+        return merged
+
+def compiled_spec_path(openapi_file: str) -> str:
+    """Where the compiled artifact of a spec lives: next to it, as <name>.compiled.pickle."""
+    return os.path.splitext(openapi_file)[0] + COMPILED_SPEC_SUFFIX
+
+def load_compiled_spec(openapi_file: str) -> CompiledSpec:
+    """
+    Load the compiled artifact of a spec, compiling it first when it is missing,
+    was built by another format version, or its source hash no longer matches.
+
+    The artifact is replaced atomically, so concurrent proxy workers never read
+    a partial file; if it cannot be written the compiled spec is still returned.
+    """
+    with open(openapi_file, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    artifact_file = compiled_spec_path(openapi_file)
+    try:
+        with open(artifact_file, 'rb') as f:
+            compiled = CompiledSpec(f.read())
+        if compiled.version == COMPILED_SPEC_VERSION and compiled.source_hash == digest:
+            return compiled
+    except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+        pass
+
+    data = compile_spec(json.loads(source), digest)
+    temp_file = f"{artifact_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, artifact_file)
+    except OSError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return CompiledSpec(data)
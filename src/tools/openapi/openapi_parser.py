@@ -10,12 +10,18 @@ This script:
 4. Creates subset OpenAPI schema files for each group
 """
 
+import hashlib
 import json
+import keyword
 import os
 import re
-from typing import Dict, List, Optional, Set, Any
+from typing import Dict, Iterable, List, Optional, Set, Any, Tuple
 import argparse
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+
+from openapi_loader import CompiledSpec, LazySpec, RefGraph, find_schema_refs, load_compiled_spec
 
 # Template for the tool header
 TOOL_HEADER_TEMPLATE = '''"""
@@ -30,7 +36,9 @@ licence: MIT
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List, Optional, Union
+from urllib3.util.retry import Retry
 '''
 
 # Template for the tool class
@@ -55,6 +63,36 @@ class Tools:
         # Add authorization if API key is provided
         if api_key:
             self.headers["Authorization"] = f"Bearer {api_key}"
+        
+        # Connect and read timeouts in seconds
+        self.timeout = (
+            float(os.environ.get("API_CONNECT_TIMEOUT", "5")),
+            float(os.environ.get("API_READ_TIMEOUT", "30")),
+        )
+        
+        # One pooled session per instance, so connections are kept alive and
+        # reused; idempotent requests that get 429 or 5xx are retried with
+        # exponential backoff (honouring Retry-After)
+        retries = Retry(
+            total=int(os.environ.get("API_MAX_RETRIES", "3")),
+            backoff_factor=float(os.environ.get("API_RETRY_BACKOFF", "0.5")),
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False,
+        )
+        pool_size = int(os.environ.get("API_POOL_SIZE", "10"))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
+        
+        # requests re-reads proxy, netrc and CA bundle settings from the
+        # environment on every call; with API_TRUST_ENV=false proxy and CA
+        # bundle settings are read once, here, instead (netrc is then unused)
+        if os.environ.get("API_TRUST_ENV", "true").lower() in ("0", "false", "no"):
+            self.session.proxies.update(requests.utils.get_environ_proxies(self.api_base))
+            self.session.verify = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or True
+            self.session.trust_env = False
 '''
 
 # Template for method implementation
@@ -68,25 +106,113 @@ METHOD_TEMPLATE = '''
         {param_docs}
         :return: Dictionary with API response data or error details
         """
-        url = self.api_base + f"{path_template}"
+        url = {url_expression}
         
         {payload_code}
         
+        response = None
         try:
-            method = "{http_method}".lower()
-            if method == "get":
-                response = requests.get(url{payload_arg}{query_param_arg}, headers=self.headers)
-            elif method == "post":
-                response = requests.post(url{payload_arg}{query_param_arg}, headers=self.headers)
-            elif method == "put":
-                response = requests.put(url{payload_arg}{query_param_arg}, headers=self.headers)
-            elif method == "delete":
-                response = requests.delete(url{payload_arg}{query_param_arg}, headers=self.headers)
-            elif method == "patch":
-                response = requests.patch(url{payload_arg}{query_param_arg}, headers=self.headers)
-            else:
-                response = requests.get(url{payload_arg}{query_param_arg}, headers=self.headers)
-            
+            response = self.session.{http_method}(url{payload_arg}{query_param_arg}, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return {{
+                "error": str(e),
+                "status_code": getattr(response, "status_code", None),
+                "text": getattr(response, "text", ""),
+            }}
+'''
+
+# Template for the header of async tools
+ASYNC_TOOL_HEADER_TEMPLATE = '''"""
+title: {title} API Tool
+author: Auto Generated
+description: Async API Tool for interacting with {title} endpoints
+required_open_webui_version: 0.5.0
+requirements: httpx
+version: 0.1.0
+licence: MIT
+"""
+
+import asyncio
+import os
+import httpx
+from typing import Dict, Any, Awaitable, Iterable, List, Optional, Union
+
+
+async def run_concurrently(calls: Iterable[Awaitable[dict]], limit: int = 10) -> List[dict]:
+    """
+    Await several tool calls concurrently, with at most `limit` in flight.
+
+    Results are returned in the order of `calls`, e.g.
+    await run_concurrently([tools.list_assignments(course_id=c) for c in course_ids], limit=5)
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call: Awaitable[dict]) -> dict:
+        async with semaphore:
+            return await call
+
+    return await asyncio.gather(*(run(call) for call in calls))
+'''
+
+# Template for the async tool class
+ASYNC_TOOL_CLASS_TEMPLATE = '''
+
+class Tools:
+    def __init__(self):
+        """
+        Initialize the Tools class with API configuration.
+        Modify the API base URL and authentication as needed for your service.
+        """
+        # Get the base URL from environment variable or use default
+        self.api_base = os.environ.get("API_BASE_URL", "http://localhost:8000")
+        # Get the API key from environment variable if it exists
+        api_key = os.environ.get("API_KEY", "")
+        
+        # Set up headers
+        self.headers = {
+            "Content-Type": "application/json",
+        }
+        
+        # Add authorization if API key is provided
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        
+        # Connect and read timeouts in seconds
+        self.timeout = httpx.Timeout(
+            float(os.environ.get("API_READ_TIMEOUT", "30")),
+            connect=float(os.environ.get("API_CONNECT_TIMEOUT", "5")),
+        )
+        
+        # One AsyncClient is shared by all calls; it is created on first use
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared client, creating it if needed."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(headers=self.headers, timeout=self.timeout)
+        return self._client
+'''
+
+# Template for async method implementation
+ASYNC_METHOD_TEMPLATE = '''
+    async def {method_name}(self, {method_params}) -> dict:
+        """
+        {summary}
+        
+        {description}
+        
+        {param_docs}
+        :return: Dictionary with API response data or error details
+        """
+        url = {url_expression}
+        
+        {payload_code}
+        
+        response = None
+        try:
+            response = await self._get_client().request("{http_method_upper}", url{payload_arg}{query_param_arg})
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -97,11 +223,49 @@ METHOD_TEMPLATE = '''
             }}
 '''
 
+# Header, class and method templates of each generation target
+GENERATION_TARGETS = {
+    'sync': (TOOL_HEADER_TEMPLATE, TOOL_CLASS_TEMPLATE, METHOD_TEMPLATE),
+    'async': (ASYNC_TOOL_HEADER_TEMPLATE, ASYNC_TOOL_CLASS_TEMPLATE, ASYNC_METHOD_TEMPLATE),
+}
+
+# Verbs generated sync methods call directly on the session; others fall back to GET
+SESSION_VERBS = {'get', 'post', 'put', 'delete', 'patch', 'head', 'options'}
+
+# Largest number of operations per generated tool; bigger groups are split
+DEFAULT_MAX_OPERATIONS = 40
+
+# Specs with fewer operations than this are generated serially even with --jobs,
+# since starting worker processes costs more than it saves
+PARALLEL_MIN_OPERATIONS = 200
+
+# Manifest recording, per group, the content hash its files were generated from
+MANIFEST_FILE = '.openapi_manifest.json'
+
+# Path-derived groups smaller than this are folded into their context's group,
+# so actions such as /courses/{course_id}/search_users join 'courses'
+MIN_PATH_GROUP_OPERATIONS = 3
+
+# Path segments that address the current user or a version rather than a resource
+PATH_PLACEHOLDER_SEGMENTS = {'self'}
+VERSION_SEGMENT = re.compile(r'^(api|v\d+)$')
+
 def snake_case(name: str) -> str:
     """Convert a string to snake_case."""
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
+def python_identifier(name: str) -> str:
+    """Turn a snake_case name (possibly derived from a path) into a valid identifier."""
+    identifier = re.sub(r'\W+', '_', name).strip('_')
+    if not identifier or identifier[0].isdigit() or keyword.iskeyword(identifier):
+        identifier = f'_{identifier}'
+    return identifier
+
+def docstring_text(text: Any) -> str:
+    """Escape text from the spec for use inside a generated triple-quoted docstring."""
+    return str(text or '').replace('\\', '\\\\').replace('"""', '\\"\\"\\"')
+
 def extract_params_from_schema(schema: Dict) -> List[Dict]:
     """Extract parameters from a schema."""
     params = []
@@ -131,6 +295,7 @@ def extract_params_from_schema(schema: Dict) -> List[Dict]:
                         'in': 'body',
                         'description': 'Request body',
                         'schema': body_schema,
+                        'whole_body': True,
                     })
                 # Handle inline schema
                 else:
@@ -171,15 +336,26 @@ def get_type_hint(schema: Dict) -> str:
         return 'Any'
 
 def generate_method_params(params: List[Dict], components: Dict) -> tuple:
-    """Generate method parameters and documentation."""
+    """
+    Generate method parameters and documentation.
+
+    Parameter names are turned into unique identifiers (Canvas uses names such
+    as 'assignment[name]'), and required parameters come first.
+    """
     param_list = []
+    optional_param_list = []
     param_docs = []
     payload_dict = {}
     query_params = {}
+    path_params = {}
+    used_names = {'self'}
     
     for param in params:
         param_name = param['name']
-        snake_name = snake_case(param_name)
+        snake_name = python_identifier(snake_case(param_name))
+        while snake_name in used_names:
+            snake_name = f'{snake_name}_'
+        used_names.add(snake_name)
         
         # Resolve schema reference if needed
         schema = param['schema']
@@ -197,10 +373,10 @@ def generate_method_params(params: List[Dict], components: Dict) -> tuple:
         if param['required']:
             param_list.append(f'{snake_name}: {type_hint}')
         else:
-            param_list.append(f'{snake_name}: Optional[{type_hint}] = None')
+            optional_param_list.append(f'{snake_name}: Optional[{type_hint}] = None')
         
         # Add to documentation
-        param_docs.append(f':param {snake_name}: {param.get("description", "")}')
+        param_docs.append(f':param {snake_name}: {docstring_text(param.get("description", ""))}')
         
         # Track parameter for payload or query string
         if param['in'] == 'body':
@@ -209,32 +385,40 @@ def generate_method_params(params: List[Dict], components: Dict) -> tuple:
             query_params[param_name] = snake_name
         elif param['in'] == 'path':
             # Path parameters should be part of URL formatting
-            pass
+            path_params[param_name] = snake_name
     
     # Join parameters with commas for method signature
-    method_params_str = ', '.join(param_list)
+    method_params_str = ', '.join(param_list + optional_param_list)
     param_docs_str = '\n        '.join(param_docs)
     
-    return method_params_str, param_docs_str, payload_dict, query_params
+    return method_params_str, param_docs_str, payload_dict, query_params, path_params
 
-def generate_method(path: str, method: str, schema: Dict, components: Dict) -> str:
+def generate_method(path: str, method: str, schema: Dict, components: Dict, target: str = 'sync') -> str:
     """Generate a Python method for an API endpoint."""
     # Extract basic information
-    operation_id = schema.get('operationId', f'{method}_{snake_case(path)}')
-    method_name = snake_case(operation_id)
+    operation_id = schema.get('operationId', f"{method}_{snake_case(path.strip('/'))}")
+    method_name = python_identifier(snake_case(operation_id))
     summary = schema.get('summary', '')
     description = schema.get('description', 'No description provided')
     
     # Extract parameters
     all_params = extract_params_from_schema(schema)
-    method_params, param_docs, payload_dict, query_params = generate_method_params(all_params, components)
+    method_params, param_docs, payload_dict, query_params, path_params = generate_method_params(
+        all_params, components
+    )
     
-    # Generate payload code
-    if payload_dict:
+    # Generate payload code; a $ref request body is sent as is, and None
+    # values are dropped so they don't reach the API as empty strings/nulls
+    whole_body = any(param.get('whole_body') for param in all_params)
+    if whole_body and 'body' in payload_dict:
+        payload_code = f"payload = {payload_dict['body']}"
+        payload_arg = ", json=payload"
+    elif payload_dict:
         payload_lines = ["payload = {"]
         for api_name, param_name in payload_dict.items():
-            payload_lines.append(f'            "{api_name}": {param_name},')
+            payload_lines.append(f'            {json.dumps(api_name)}: {param_name},')
         payload_lines.append("        }")
+        payload_lines.append("        payload = {key: value for key, value in payload.items() if value is not None}")
         payload_code = '\n'.join(payload_lines)
         payload_arg = ", json=payload"
     else:
@@ -245,8 +429,9 @@ def generate_method(path: str, method: str, schema: Dict, components: Dict) -> s
     if query_params:
         query_lines = ["params = {"]
         for api_name, param_name in query_params.items():
-            query_lines.append(f'            "{api_name}": {param_name},')
+            query_lines.append(f'            {json.dumps(api_name)}: {param_name},')
         query_lines.append("        }")
+        query_lines.append("        params = {key: value for key, value in params.items() if value is not None}")
         query_code = '\n'.join(query_lines)
         query_param_arg = ", params=params"
         # Add query_code to payload_code
@@ -260,33 +445,215 @@ def generate_method(path: str, method: str, schema: Dict, components: Dict) -> s
     # Process path parameters
     path_template = path
     # Check for path parameters - replace {param} with {param_snake_case}
-    for param in all_params:
-        if param['in'] == 'path':
-            param_name = param['name']
-            snake_name = snake_case(param_name)
-            path_template = path_template.replace(f"{{{param_name}}}", f"{{{snake_name}}}")
+    for param_name, snake_name in path_params.items():
+        path_template = path_template.replace(f"{{{param_name}}}", f"{{{snake_name}}}")
+    # Static paths are plain string constants; only templated ones need an f-string
+    if '{' in path_template:
+        url_expression = f'self.api_base + f"{path_template}"'
+    else:
+        url_expression = f'self.api_base + {json.dumps(path_template)}'
             
     # Return the formatted method template
-    return METHOD_TEMPLATE.format(
+    method_template = GENERATION_TARGETS[target][2]
+    return method_template.format(
         method_name=method_name,
         method_params=method_params,
-        summary=summary,
-        description=description,
+        summary=docstring_text(summary),
+        description=docstring_text(description),
         param_docs=param_docs,
-        path_template=path_template,
+        url_expression=url_expression,
         payload_code=payload_code,
-        http_method=method.lower(),
+        http_method=method.lower() if method.lower() in SESSION_VERBS else 'get',
+        http_method_upper=method.upper(),
         payload_arg=payload_arg,
         query_param_arg=query_param_arg
     )
 
+def group_name(name: str) -> str:
+    """Turn a tag, path segment or prefix into a name usable for generated files."""
+    name = re.sub(r'[^0-9a-zA-Z]+', '_', snake_case(name)).strip('_')
+    return name or 'default'
+
+def path_group(path: str, context: bool = False) -> str:
+    """
+    Derive a group from the resource a path addresses.
+
+    Version segments are skipped, and a leading context such as
+    /courses/{course_id} or /users/self is skipped when a sub-resource follows,
+    so /v1/courses/{course_id}/assignments/{id} belongs to 'assignments'.
+    With context=True the leading context ('courses') is returned instead.
+    """
+    segments = [segment for segment in path.strip('/').split('/') if segment]
+    while segments and VERSION_SEGMENT.match(segments[0]):
+        segments = segments[1:]
+    literals = [
+        (position, segment) for position, segment in enumerate(segments)
+        if not segment.startswith('{') and segment not in PATH_PLACEHOLDER_SEGMENTS
+    ]
+    if not literals:
+        return 'default'
+    first_position, first = literals[0]
+    context_follows = first_position + 1 < len(segments) and (
+        segments[first_position + 1].startswith('{')
+        or segments[first_position + 1] in PATH_PLACEHOLDER_SEGMENTS
+    )
+    if context_follows and len(literals) > 1 and not context:
+        return group_name(literals[1][1])
+    return group_name(first)
+
+def operation_id_group(path: str, method: str, operation: Dict) -> str:
+    """Derive a group from the first word of the operationId (e.g. 'users' for users_list)."""
+    operation_id = operation.get('operationId')
+    if not operation_id:
+        return path_group(path)
+    return group_name(re.split(r'[_.\-/]', snake_case(operation_id))[0])
+
+def load_group_map(group_map_file: str) -> List[Tuple[str, str]]:
+    """
+    Load a JSON object mapping path globs (optionally prefixed with a method,
+    e.g. "GET /v1/courses/*") to group names. The first matching entry wins.
+    """
+    with open(group_map_file, 'r', encoding='utf-8') as f:
+        return list(json.load(f).items())
+
+def operation_groups(
+    path: str,
+    method: str,
+    operation: Dict,
+    group_by: str = 'auto',
+    group_map: Optional[List[Tuple[str, str]]] = None
+) -> Tuple[List[str], Optional[str]]:
+    """
+    Return the groups an operation belongs to, plus the group to fold it into
+    when its own group turns out too small (only for path-derived groups).
+
+    group_by is 'tags', 'path', 'operation-id' or 'auto' (tags when the
+    operation has any, otherwise the path). Entries of group_map take
+    precedence over all of them.
+    """
+    for pattern, group in group_map or []:
+        pattern_method, _, pattern_path = pattern.rpartition(' ')
+        if pattern_method and pattern_method.lower() != method.lower():
+            continue
+        if fnmatch(path, pattern_path):
+            return [group_name(group)], None
+    if group_by == 'operation-id':
+        return [operation_id_group(path, method, operation)], None
+    tags = operation.get('tags')
+    if group_by == 'tags' or (group_by == 'auto' and tags):
+        return tags or ['default'], None
+    return [path_group(path)], path_group(path, context=True)
+
+def merge_small_groups(
+    groups: Dict[str, List[Tuple[str, str]]],
+    fallbacks: Dict[Tuple[str, str], str]
+) -> Dict[str, List[Tuple[str, str]]]:
+    """Fold path-derived groups below MIN_PATH_GROUP_OPERATIONS into their context groups."""
+    merged: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for group, operations in groups.items():
+        small = len(operations) < MIN_PATH_GROUP_OPERATIONS
+        for operation in operations:
+            fallback = fallbacks.get(operation)
+            merged[fallback if small and fallback else group].append(operation)
+    return dict(merged)
+
+def split_groups(
+    groups: Dict[str, List[Tuple[str, str]]],
+    max_operations: Optional[int]
+) -> Dict[str, List[Tuple[str, str]]]:
+    """Split groups larger than max_operations into numbered parts, in path order."""
+    if not max_operations:
+        return groups
+    result = {}
+    for group, operations in groups.items():
+        if len(operations) <= max_operations:
+            result[group] = operations
+            continue
+        operations = sorted(operations)
+        for part, start in enumerate(range(0, len(operations), max_operations), 1):
+            result[f"{group}_{part}"] = operations[start:start + max_operations]
+    return result
+
+def index_groups(
+    operations: Iterable[Tuple[str, str, Dict]],
+    group_by: str = 'tags',
+    group_map: Optional[List[Tuple[str, str]]] = None,
+    max_operations: Optional[int] = None
+) -> Dict[str, List[Tuple[str, str]]]:
+    """Map each group (see operation_groups and split_groups) to its (path, method) operations."""
+    groups: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    fallbacks: Dict[Tuple[str, str], str] = {}
+
+    for path, method, operation in operations:
+        operation_group_names, fallback = operation_groups(path, method, operation, group_by, group_map)
+        for group in operation_group_names:
+            groups[group].append((path, method))
+        if fallback:
+            fallbacks[(path, method)] = fallback
+
+    return split_groups(merge_small_groups(dict(groups), fallbacks), max_operations)
+
+def index_operations(
+    openapi: Dict,
+    groups: Dict[str, List[Tuple[str, str]]],
+    compiled: Optional[CompiledSpec] = None
+) -> Dict[str, Any]:
+    """
+    Complete an index for the given groups of operations of openapi, reusing
+    the schema references and closures of a compiled spec when given one.
+    """
+    if compiled is not None:
+        return {
+            'groups': groups,
+            'operation_schemas': compiled.section('operation_schemas'),
+            'ref_graph': compiled.ref_graph(),
+        }
+    return {
+        'groups': groups,
+        'operation_schemas': {
+            (path, method): find_schema_refs(operation)
+            for path, methods in openapi['paths'].items()
+            for method, operation in methods.items()
+        },
+        'ref_graph': RefGraph(openapi.get('components', {}).get('schemas', {})),
+    }
+
+def build_index(
+    openapi: Dict,
+    group_by: str = 'tags',
+    group_map: Optional[List[Tuple[str, str]]] = None,
+    max_operations: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Index an OpenAPI schema in a single pass over its paths.
+
+    The index maps each group (see operation_groups and split_groups) to its
+    (path, method) operations and each operation to the component schemas it
+    references directly, and holds the RefGraph used to resolve transitive
+    schema dependencies.
+    """
+    operations = (
+        (path, method, operation)
+        for path, methods in openapi['paths'].items()
+        for method, operation in methods.items()
+    )
+    return index_operations(openapi, index_groups(operations, group_by, group_map, max_operations))
+
 def create_subset_openapi(
     tag: str,
     paths: Dict,
     components_schemas: Dict,
-    original_info: Dict
+    original_info: Dict,
+    index: Optional[Dict[str, Any]] = None
 ) -> Dict:
-    """Create a subset of the OpenAPI schema for the given tag."""
+    """
+    Create a subset of the OpenAPI schema for the given tag (or group).
+
+    Pass an index from build_index to avoid rescanning all paths for every tag.
+    """
+    if index is None:
+        index = build_index({'paths': paths, 'components': {'schemas': components_schemas}})
+
     # Start with a base structure
     openapi_subset = {
         "openapi": "3.1.0",
@@ -309,132 +676,236 @@ def create_subset_openapi(
     
     used_schemas: Set[str] = set()
     
-    # Add paths for the specified tag
-    for path, methods in paths.items():
-        for method, operation in methods.items():
-            operation_tags = operation.get('tags', [])
-            if tag in operation_tags:
-                # Add this path/method to our subset
-                if path not in openapi_subset["paths"]:
-                    openapi_subset["paths"][path] = {}
-                openapi_subset["paths"][path][method] = operation
-                
-                # Track referenced schemas
-                if 'requestBody' in operation and 'content' in operation['requestBody']:
-                    for content_type, content_schema in operation['requestBody']['content'].items():
-                        if 'schema' in content_schema and '$ref' in content_schema['schema']:
-                            ref = content_schema['schema']['$ref']
-                            if ref.startswith('#/components/schemas/'):
-                                schema_name = ref.split('/')[-1]
-                                used_schemas.add(schema_name)
-                
-                # Check responses for schema references
-                if 'responses' in operation:
-                    for response_code, response in operation['responses'].items():
-                        if 'content' in response:
-                            for content_type, content_schema in response['content'].items():
-                                if 'schema' in content_schema and '$ref' in content_schema['schema']:
-                                    ref = content_schema['schema']['$ref']
-                                    if ref.startswith('#/components/schemas/'):
-                                        schema_name = ref.split('/')[-1]
-                                        used_schemas.add(schema_name)
+    # Add paths for the specified tag, with every schema they reference
+    for path, method in index['groups'].get(tag, []):
+        if path not in openapi_subset["paths"]:
+            openapi_subset["paths"][path] = {}
+        openapi_subset["paths"][path][method] = paths[path][method]
+        used_schemas |= index['operation_schemas'][(path, method)]
+    used_schemas = index['ref_graph'].closure_of(used_schemas)
     
-    # Recursively add referenced schemas
-    def add_ref_schemas(schema_name: str):
-        if schema_name not in components_schemas:
-            return
-        
-        # Add this schema
+    for schema_name in sorted(used_schemas):
         openapi_subset["components"]["schemas"][schema_name] = components_schemas[schema_name]
-        
-        # Look for references within this schema
-        schema = components_schemas[schema_name]
-        refs = []
-        
-        # Check properties
-        if 'properties' in schema:
-            for prop_name, prop in schema['properties'].items():
-                if '$ref' in prop:
-                    ref = prop['$ref']
-                    if ref.startswith('#/components/schemas/'):
-                        refs.append(ref.split('/')[-1])
-                elif prop.get('type') == 'array' and 'items' in prop:
-                    if '$ref' in prop['items']:
-                        ref = prop['items']['$ref']
-                        if ref.startswith('#/components/schemas/'):
-                            refs.append(ref.split('/')[-1])
-        
-        # Add all referenced schemas recursively
-        for ref in refs:
-            if ref not in openapi_subset["components"]["schemas"]:
-                add_ref_schemas(ref)
-    
-    # Add all used schemas and their dependencies
-    for schema_name in used_schemas:
-        add_ref_schemas(schema_name)
     
     return openapi_subset
 
-def process_openapi(openapi_file: str, output_dir: str):
-    """Process an OpenAPI schema file and generate tools and subset schemas."""
-    # Load the OpenAPI schema
-    with open(openapi_file, 'r', encoding='utf-8') as f:
-        openapi = json.load(f)
+# generator_hash per target, computed once per process
+_generator_hashes: Dict[str, str] = {}
+
+def generator_hash(target: str = 'sync') -> str:
+    """
+    Hash of the target's code templates and of this module's source, so that
+    switching targets or changing the templates or the generator code (such
+    as generate_method) regenerates every group.
+    """
+    if target not in _generator_hashes:
+        with open(os.path.abspath(__file__), 'rb') as f:
+            source = f.read()
+        templates = target + ''.join(GENERATION_TARGETS[target])
+        _generator_hashes[target] = hashlib.sha256(templates.encode('utf-8') + source).hexdigest()
+    return _generator_hashes[target]
+
+def group_hash(openapi_subset: Dict, target: str = 'sync') -> str:
+    """Hash a group's subset schema, which holds its operations and referenced schemas."""
+    content = json.dumps(openapi_subset, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(generator_hash(target).encode('utf-8') + content).hexdigest()
+
+def group_files(tag: str) -> List[str]:
+    """Names of the files generated for a group."""
+    return [f"{tag.lower()}_tool.py", f"{tag.lower()}_openapi.json"]
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    """Load the manifest of a previous run, or an empty one."""
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'groups': {}}
+    if not isinstance(manifest.get('groups'), dict):
+        return {'groups': {}}
+    return manifest
+
+def save_manifest(output_dir: str, groups: Dict[str, Dict[str, Any]]):
+    """Write the manifest for this run."""
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({'groups': groups}, f, indent=2, sort_keys=True)
+
+def existing_group_hash(output_dir: str, entry: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The hash a group was last generated from, if all of its files still exist."""
+    if not entry:
+        return None
+    if not all(os.path.exists(os.path.join(output_dir, name)) for name in entry.get('files', [])):
+        return None
+    return entry.get('hash')
+
+def render_group(
+    tag: str,
+    openapi: Dict,
+    index: Dict[str, Any],
+    previous_hash: Optional[str] = None,
+    target: str = 'sync'
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Render the tool code (for a target of GENERATION_TARGETS) and subset schema of one group.
+
+    Returns (hash, tool code, schema JSON); the code and schema are None when
+    the hash equals previous_hash, since the files on disk are then current.
+    """
+    components = openapi.get('components', {'schemas': {}})
+    components_schemas = openapi.get('components', {}).get('schemas', {})
+    
+    # Create a subset OpenAPI schema
+    openapi_subset = create_subset_openapi(
+        tag,
+        openapi['paths'],
+        components_schemas,
+        openapi['info'],
+        index
+    )
+    digest = group_hash(openapi_subset, target)
+    if digest == previous_hash:
+        return digest, None, None
+    
+    # Header and class definition, then one method per path/method
+    header_template, class_template, _ = GENERATION_TARGETS[target]
+    code = [header_template.format(title=tag.capitalize()), class_template]
+    for path, method in sorted(index['groups'][tag]):
+        code.append(generate_method(path, method, openapi['paths'][path][method], components, target))
     
+    return digest, ''.join(code), json.dumps(openapi_subset, indent=2)
+
+# Spec and index shared by the worker processes of a parallel run
+_worker_state: Dict[str, Any] = {}
+
+def _init_worker(openapi: Dict, index: Dict[str, Any], target: str):
+    """Receive the spec and index once per worker process instead of once per group."""
+    _worker_state['openapi'] = openapi
+    _worker_state['index'] = index
+    _worker_state['target'] = target
+
+def _render_group_in_worker(task: Tuple[str, Optional[str]]) -> Tuple[str, Optional[str], Optional[str]]:
+    tag, previous_hash = task
+    return render_group(tag, _worker_state['openapi'], _worker_state['index'], previous_hash, _worker_state['target'])
+
+def process_openapi(
+    openapi_file: str,
+    output_dir: str,
+    group_by: str = 'auto',
+    group_map_file: Optional[str] = None,
+    max_operations: Optional[int] = DEFAULT_MAX_OPERATIONS,
+    force: bool = False,
+    jobs: int = 1,
+    only_groups: Optional[List[str]] = None,
+    target: str = 'sync'
+):
+    """
+    Process an OpenAPI schema file and generate tools and subset schemas.
+
+    Operations are grouped as described in operation_groups, so specs without
+    tags (such as openapi_for_canvas.json) are split by resource path, and no
+    group gets more than max_operations operations.
+
+    Generation is incremental: a manifest in output_dir records the content
+    hash of each group, groups whose hash is unchanged are not rewritten (so
+    their files keep their mtimes), and files of groups that no longer exist
+    are deleted. Pass force=True to regenerate everything.
+
+    With jobs > 1 groups are rendered in a pool of worker processes after the
+    index is built once; files are still written in group order by this
+    process, so the output does not depend on jobs. Specs with fewer than
+    PARALLEL_MIN_OPERATIONS operations are always rendered serially.
+
+    target selects the generated code: 'sync' tools call the API with
+    requests, 'async' tools have async methods sharing an httpx.AsyncClient.
+
+    The parsed spec, schema references and closures come from the compiled
+    artifact next to the spec (see load_compiled_spec).
+
+    With only_groups, just those groups are generated. The spec is then read
+    through LazySpec: grouping still needs every operation (for its tags), so
+    path items are decoded one at a time to assign groups and then dropped,
+    but only the selected groups' schemas are decoded, and the full spec is
+    never decoded as a whole.
+    """
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Group paths by tag
-    paths_by_tag = defaultdict(dict)
+    # Index groups, operations and schema references once for all groups
+    group_map = load_group_map(group_map_file) if group_map_file else None
+    if only_groups:
+        spec = LazySpec.from_file(openapi_file)
+        all_groups = index_groups(spec.operations(), group_by, group_map, max_operations)
+        for tag in only_groups:
+            if tag not in all_groups:
+                print(f"Warning: group {tag} not found")
+        selected = {tag: operations for tag, operations in all_groups.items() if tag in only_groups}
+        openapi = spec.subset(operation for operations in selected.values() for operation in operations)
+        index = index_operations(openapi, selected)
+        operation_count = sum(len(operations) for operations in selected.values())
+    else:
+        # Load the OpenAPI schema from its compiled artifact, (re)building it if needed
+        compiled = load_compiled_spec(openapi_file)
+        openapi = compiled.openapi
+        operations = (
+            (path, method, operation)
+            for path, methods in openapi['paths'].items()
+            for method, operation in methods.items()
+        )
+        all_groups = index_groups(operations, group_by, group_map, max_operations)
+        index = index_operations(openapi, all_groups, compiled)
+        operation_count = sum(len(methods) for methods in openapi['paths'].values())
+    # force only ignores the previous hashes; the entries still drive retention and deletion
+    previous = load_manifest(output_dir)['groups']
+    tasks = [(tag, None if force else existing_group_hash(output_dir, previous.get(tag))) for tag in index['groups']]
+    
+    if jobs > 1 and len(tasks) > 1 and operation_count >= PARALLEL_MIN_OPERATIONS:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                       initargs=(openapi, index, target))
+        with executor:
+            rendered = list(executor.map(_render_group_in_worker, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+    else:
+        rendered = [render_group(tag, openapi, index, previous_hash, target) for tag, previous_hash in tasks]
     
-    for path, methods in openapi['paths'].items():
-        for method, operation in methods.items():
-            tags = operation.get('tags', ['default'])
-            for tag in tags:
-                if path not in paths_by_tag[tag]:
-                    paths_by_tag[tag] = {}
-                if path not in paths_by_tag[tag]:
-                    paths_by_tag[tag][path] = {}
-                paths_by_tag[tag][path][method] = operation
+    # Groups that were not regenerated this time keep their previous entries
+    manifest: Dict[str, Dict[str, Any]] = {
+        tag: previous[tag] for tag in all_groups if tag not in index['groups'] and tag in previous
+    }
+    unchanged = 0
     
-    # Process each tag group
-    for tag, paths in paths_by_tag.items():
-        print(f"Processing tag: {tag}")
+    # Write each group's files in index order
+    for (tag, _), (digest, tool_code, schema_json) in zip(tasks, rendered):
+        manifest[tag] = {'hash': digest, 'files': group_files(tag)}
+        if tool_code is None:
+            unchanged += 1
+            continue
+        
+        print(f"Processing group: {tag} ({len(index['groups'][tag])} operations)")
         
         # Create a Python tool file for this tag
         tool_file = os.path.join(output_dir, f"{tag.lower()}_tool.py")
         with open(tool_file, 'w', encoding='utf-8') as f:
-            # Write header
-            f.write(TOOL_HEADER_TEMPLATE.format(title=tag.capitalize()))
-            
-            # Write class definition
-            f.write(TOOL_CLASS_TEMPLATE)
-            
-            # Process each path/method
-            for path in sorted(paths.keys()):
-                for method, operation in sorted(paths[path].items()):
-                    # Generate Python method
-                    method_code = generate_method(
-                        path, 
-                        method, 
-                        operation, 
-                        openapi.get('components', {'schemas': {}})
-                    )
-                    f.write(method_code)
-        
-        # Create a subset OpenAPI schema
-        openapi_subset = create_subset_openapi(
-            tag,
-            openapi['paths'],
-            openapi.get('components', {}).get('schemas', {}),
-            openapi['info']
-        )
+            f.write(tool_code)
         
         # Write subset schema to file
         schema_file = os.path.join(output_dir, f"{tag.lower()}_openapi.json")
         with open(schema_file, 'w', encoding='utf-8') as f:
-            json.dump(openapi_subset, f, indent=2)
+            f.write(schema_json)
+    
+    # Delete files of groups that are gone (or renamed) since the last run
+    current_files = {name for tag in all_groups for name in group_files(tag)}
+    for tag, entry in previous.items():
+        for name in entry.get('files', []):
+            stale_file = os.path.join(output_dir, name)
+            if name not in current_files and os.path.exists(stale_file):
+                print(f"Removing stale file: {name} (group {tag})")
+                os.remove(stale_file)
+    
+    save_manifest(output_dir, {tag: manifest[tag] for tag in all_groups if tag in manifest})
+    if unchanged:
+        print(f"Skipped {unchanged} unchanged groups")
 
 def main():
     """Main entry point."""
@@ -442,9 +913,29 @@ def main():
     parser.add_argument("input_file", help="Path to the OpenAPI schema file")
     parser.add_argument("--output-dir", default="generated_tools", 
                        help="Directory to output generated tools (default: generated_tools)")
+    parser.add_argument("--group-by", choices=["auto", "tags", "path", "operation-id"], default="auto",
+                       help="How operations are grouped into tools; 'auto' uses tags and falls back "
+                            "to the resource path for untagged operations (default: auto)")
+    parser.add_argument("--group-map",
+                       help="JSON file mapping path globs (optionally 'METHOD /glob') to group names")
+    parser.add_argument("--max-operations", type=int, default=DEFAULT_MAX_OPERATIONS,
+                       help=f"Split groups with more operations than this; 0 disables splitting "
+                            f"(default: {DEFAULT_MAX_OPERATIONS})")
+    parser.add_argument("--force", action="store_true",
+                       help="Regenerate every group, ignoring the manifest of the previous run")
+    parser.add_argument("--jobs", type=int, default=1,
+                       help=f"Render groups in this many worker processes; specs with fewer than "
+                            f"{PARALLEL_MIN_OPERATIONS} operations are always rendered serially (default: 1)")
+    parser.add_argument("--group", action="append", dest="only_groups", metavar="GROUP",
+                       help="Generate only this group (may be repeated); the spec is then read lazily "
+                            "and only the group's operations and schemas are kept in memory")
+    parser.add_argument("--async", action="store_const", const="async", default="sync", dest="target",
+                       help="Generate async tools whose methods share an httpx.AsyncClient, plus a "
+                            "run_concurrently() helper for bounded concurrent calls")
     args = parser.parse_args()
     
-    process_openapi(args.input_file, args.output_dir)
+    process_openapi(args.input_file, args.output_dir, args.group_by, args.group_map, args.max_operations,
+                    args.force, args.jobs, args.only_groups, args.target)
     print(f"Generated tools and schemas in {args.output_dir}")
 
 if __name__ == "__main__":
@@ -9,18 +9,71 @@ This script creates a FastAPI server that:
 """
 
 import argparse
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
+import random
+from contextlib import asynccontextmanager
 import json
 import os
+import sqlite3
+import sys
+import threading
+import time
 import httpx
-from typing import Any, Dict, List, Optional, Union
+from collections import OrderedDict, defaultdict
+from fnmatch import fnmatch
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 from fastapi import FastAPI, Request, HTTPException, Header, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 import uvicorn
 
-# Create FastAPI app
-app = FastAPI()
+# The compiled spec cache is shared with the OpenAPI parser
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "openapi"))
+from openapi_loader import load_compiled_spec
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared upstream HTTP client on startup and close it on shutdown."""
+    global client, response_cache, rate_limiter
+    client = create_http_client()
+    # The SQLite backend shares cache entries and rate-limit budgets between
+    # worker processes on the same host
+    shared_state = config["state_backend"] == "sqlite"
+    if config["rate_limit_enabled"]:
+        limiter_class = SQLiteRateLimiter if shared_state else RateLimiter
+        rate_limiter = limiter_class(
+            config["rate_limit_bucket_size"],
+            config["rate_limit_refill_rate"],
+            config["rate_limit_reserve"],
+            config["rate_limit_max_retries"],
+            config["rate_limit_backoff"],
+            **({"state_path": config["state_path"]} if shared_state else {})
+        )
+    if config["cache_enabled"]:
+        cache_class = SQLiteResponseCache if shared_state else ResponseCache
+        response_cache = cache_class(
+            config["cache_max_bytes"],
+            config["cache_default_ttl"],
+            config["cache_route_ttls"],
+            **({"state_path": config["state_path"]} if shared_state else {})
+        )
+    try:
+        yield
+    finally:
+        await client.aclose()
+        client = None
+        response_cache = None
+        rate_limiter = None
+
+# Create FastAPI app (the built-in /openapi.json route is disabled so that
+# the filtered schema served below is not shadowed by FastAPI's own schema)
+app = FastAPI(openapi_url=None, lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -31,16 +84,227 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global config
-config = {
+# Default configuration; see load_config for how it is overridden
+DEFAULT_CONFIG = {
     "target_url": "http://localhost:8000",
     "openapi_path": "./openapi.json",
     "proxy_prefix": "",
-    "include_tags": []
+    "include_tags": [],
+    "stream_responses": False,
+    # Upstream connection pool and timeouts
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+    "http2": False,
+    # Opt-in cache for upstream GET responses
+    "cache_enabled": False,
+    "cache_max_bytes": 64 * 1024 * 1024,
+    "cache_default_ttl": 30.0,
+    # List of (path glob, ttl seconds); the first matching pattern wins
+    "cache_route_ttls": [],
+    # Share one upstream request between concurrent identical GETs
+    "coalesce_requests": False,
+    # Answer requests for paths outside the served schema locally with 404/405
+    "enforce_routes": True,
+    # Upper bound on pages fetched when aggregating Link-header pagination
+    "max_pages": 50,
+    # Per-credential scheduling against the Canvas rate limit (bucket of 700
+    # units that leaks back at roughly 10 units per second)
+    "rate_limit_enabled": False,
+    "rate_limit_bucket_size": 700.0,
+    "rate_limit_refill_rate": 10.0,
+    "rate_limit_reserve": 50.0,
+    "rate_limit_max_retries": 3,
+    "rate_limit_backoff": 1.0,
+    # Where cache entries and rate-limit budgets live: "memory" (per process)
+    # or "sqlite" (shared by all workers on the host through state_path)
+    "state_backend": "memory",
+    "state_path": "./openapi_proxy_state.db"
+}
+
+# Global config of this process
+config = dict(DEFAULT_CONFIG)
+
+# Environment variables read by load_config: a JSON config file, a JSON object
+# of settings (used to hand the parsed CLI options to worker processes), and
+# OPENAPI_PROXY_<KEY> overrides for single keys
+CONFIG_FILE_ENV = "OPENAPI_PROXY_CONFIG"
+SETTINGS_ENV = "OPENAPI_PROXY_SETTINGS"
+ENV_PREFIX = "OPENAPI_PROXY_"
+
+# Request header clients can use to order queued requests (lower runs first)
+PRIORITY_HEADER = "x-proxy-priority"
+
+# Query parameter that switches a GET to pagination aggregation ("all" or "ndjson");
+# it is consumed by the proxy and never forwarded upstream
+PAGINATE_PARAM = "proxy_paginate"
+
+# Request headers that change the upstream response; requests are only
+# coalesced when they agree on all of them
+COALESCE_VARY_HEADERS = ("accept", "accept-language", "if-none-match", "if-modified-since", "if-range", "range")
+
+# Keys of an OpenAPI path item that describe operations
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+
+# Hop-by-hop headers (RFC 7230, section 6.1) must not be forwarded by proxies
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
 }
 
-# HTTP client for proxying requests
-client = httpx.AsyncClient()
+# HTTP client for proxying requests (created in the lifespan handler)
+client: Optional[httpx.AsyncClient] = None
+
+# Upstream GET response cache (created in the lifespan handler when enabled)
+response_cache: Optional["ResponseCache"] = None
+
+# Upstream GETs in flight, keyed like the response cache plus the
+# COALESCE_VARY_HEADERS they were sent with, for request coalescing
+_pending_requests: Dict[Tuple, "asyncio.Future[httpx.Response]"] = {}
+coalescing_stats = {"upstream_requests": 0, "coalesced_requests": 0}
+
+# Seconds spent waiting on the target server while handling the current request
+_upstream_seconds: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "upstream_seconds", default=None
+)
+
+# Per-credential upstream scheduler (created in the lifespan handler when enabled)
+rate_limiter: Optional["RateLimiter"] = None
+
+# Requests currently waiting on or using an upstream connection
+_in_flight_requests = 0
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the upstream HTTP client from the pool and timeout settings in config."""
+    limits = httpx.Limits(
+        max_connections=config["max_connections"],
+        max_keepalive_connections=config["max_keepalive_connections"],
+        keepalive_expiry=config["keepalive_expiry"]
+    )
+    timeout = httpx.Timeout(
+        config["read_timeout"],
+        connect=config["connect_timeout"],
+        read=config["read_timeout"],
+        # Waiting for a free pooled connection is bounded by the connect timeout
+        pool=config["connect_timeout"]
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=config["http2"])
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Report the upstream connection pool usage for sizing the limits."""
+    stats = {
+        "max_connections": config["max_connections"],
+        "max_keepalive_connections": config["max_keepalive_connections"],
+        "http2": config["http2"],
+        "in_flight_requests": _in_flight_requests,
+        "connections": 0,
+        "active_connections": 0,
+        "idle_connections": 0,
+        "http2_connections": 0,
+        "queued_requests": 0,
+    }
+    # httpx does not expose pool statistics, so read them from the httpcore pool
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return stats
+    for connection in list(getattr(pool, "connections", [])):
+        stats["connections"] += 1
+        if connection.is_idle():
+            stats["idle_connections"] += 1
+        else:
+            stats["active_connections"] += 1
+        if "HTTP/2" in connection.info():
+            stats["http2_connections"] += 1
+    stats["queued_requests"] = sum(
+        1 for pool_request in getattr(pool, "_requests", [])
+        if getattr(pool_request, "connection", None) is None
+    )
+    return stats
+
+# Cache of serialized schemas keyed by (path, mtime, include_tags, proxy_prefix)
+_schema_cache: Dict[Tuple[str, int, Tuple[str, ...], str], Dict[str, Any]] = {}
+
+def parse_route_ttl(route_ttl: str) -> Tuple[str, float]:
+    """Parse a PATTERN=SECONDS per-route cache TTL, as given to --cache-route-ttl."""
+    pattern, _, seconds = route_ttl.rpartition("=")
+    if not pattern:
+        raise ValueError(f"Invalid route TTL (expected PATTERN=SECONDS): {route_ttl}")
+    return pattern, float(seconds)
+
+def parse_config_value(key: str, value: Any) -> Any:
+    """Coerce a value from a config file or environment variable to the type of its default."""
+    default = DEFAULT_CONFIG[key]
+    if isinstance(value, str):
+        if isinstance(default, bool):
+            return value.strip().lower() in ["1", "true", "yes", "on"]
+        if isinstance(default, list):
+            value = json.loads(value) if value.strip().startswith("[") else [
+                item.strip() for item in value.split(",") if item.strip()
+            ]
+    if key == "cache_route_ttls":
+        # "PATTERN=SECONDS" strings from the environment or [pattern, seconds] pairs from JSON
+        return [
+            parse_route_ttl(item) if isinstance(item, str) else (item[0], float(item[1]))
+            for item in value
+        ]
+    if isinstance(default, bool):
+        return bool(value)
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
+
+def load_config(config_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the proxy configuration.
+
+    Later sources win: defaults, the JSON file named by config_file or the
+    OPENAPI_PROXY_CONFIG environment variable, OPENAPI_PROXY_<KEY> variables
+    such as OPENAPI_PROXY_TARGET_URL, then the JSON object in
+    OPENAPI_PROXY_SETTINGS. main() puts its fully resolved settings (command
+    line included) there for worker processes, so it has to win.
+    """
+    settings = dict(DEFAULT_CONFIG)
+    config_file = config_file or os.environ.get(CONFIG_FILE_ENV)
+    overrides = []
+    if config_file:
+        with open(config_file, "r", encoding="utf-8") as f:
+            overrides.append(json.load(f))
+    overrides.append({
+        key: os.environ[ENV_PREFIX + key.upper()]
+        for key in DEFAULT_CONFIG
+        if ENV_PREFIX + key.upper() in os.environ
+    })
+    if os.environ.get(SETTINGS_ENV):
+        overrides.append(json.loads(os.environ[SETTINGS_ENV]))
+    for override in overrides:
+        for key, value in override.items():
+            if key not in DEFAULT_CONFIG:
+                raise ValueError(f"Unknown config key: {key}")
+            settings[key] = parse_config_value(key, value)
+    return settings
+
+def create_app(settings: Optional[Dict[str, Any]] = None) -> FastAPI:
+    """
+    App factory for uvicorn (--factory) and gunicorn workers.
+
+    Every worker process calls this on startup, so the configuration is read
+    from the environment (see load_config) rather than from argparse.
+    """
+    config.clear()
+    config.update(load_config())
+    if settings:
+        config.update(settings)
+    _schema_cache.clear()
+    return app
 
 # Function to load and filter OpenAPI schema
 def load_openapi_schema(
@@ -48,31 +312,28 @@ def load_openapi_schema(
     include_tags: Optional[List[str]] = None,
     proxy_prefix: str = ""
 ) -> Dict[str, Any]:
-    """Load an OpenAPI schema and filter it based on tags."""
-    with open(openapi_path, "r", encoding="utf-8") as f:
-        schema = json.load(f)
+    """
+    Load an OpenAPI schema and filter it based on tags.
+
+    The schema is read from its compiled artifact (see load_compiled_spec),
+    which holds a pre-serialized subset per tag with the component schemas
+    its operations reference.
+    """
+    compiled = load_compiled_spec(openapi_path)
     
     # If no tags specified, return the full schema
     if not include_tags:
-        return schema
+        return compiled.openapi
     
     # Create a new schema with only the requested tags
+    schema = compiled.tag_subset(include_tags)
     filtered_schema = {
         "openapi": schema["openapi"],
         "info": schema["info"],
-        "paths": {},
-        "components": schema.get("components", {})
+        "paths": schema["paths"],
+        "components": schema["components"]
     }
     
-    # Filter paths by tag
-    for path, methods in schema["paths"].items():
-        for method, operation in methods.items():
-            tags = operation.get("tags", [])
-            if any(tag in include_tags for tag in tags):
-                if path not in filtered_schema["paths"]:
-                    filtered_schema["paths"][path] = {}
-                filtered_schema["paths"][path][method] = operation
-    
     # Update paths with proxy prefix if provided
     if proxy_prefix:
         prefixed_paths = {}
@@ -83,22 +344,1022 @@ def load_openapi_schema(
     
     return filtered_schema
 
+class RouteTable:
+    """
+    Segment trie over the templated paths of an OpenAPI schema.
+
+    Literal segments are matched before templated ones such as {course_id},
+    falling back to the templated branch when the literal branch dead-ends.
+    """
+
+    def __init__(self):
+        self.root = self._node()
+
+    @staticmethod
+    def _node() -> Dict[str, Any]:
+        return {"literals": {}, "param": None, "operations": None}
+
+    @classmethod
+    def from_schema(cls, schema: Dict[str, Any]) -> "RouteTable":
+        table = cls()
+        for path, path_item in schema.get("paths", {}).items():
+            for method, operation in path_item.items():
+                if method.lower() in HTTP_METHODS and isinstance(operation, dict):
+                    operation_id = operation.get("operationId") or f"{method.upper()} {path}"
+                    table.add(path, method, operation_id)
+        return table
+
+    def add(self, path: str, method: str, operation_id: str) -> None:
+        node = self.root
+        for segment in path.strip("/").split("/"):
+            if segment.startswith("{") and segment.endswith("}"):
+                if node["param"] is None:
+                    node["param"] = self._node()
+                node = node["param"]
+            else:
+                node = node["literals"].setdefault(segment, self._node())
+        if node["operations"] is None:
+            node["operations"] = {}
+        node["operations"][method.upper()] = {"operation_id": operation_id, "path": path}
+
+    def match(self, path: str) -> Optional[Dict[str, Dict[str, str]]]:
+        """Return the operations (by HTTP method) of the route matching path."""
+        segments = path.strip("/").split("/")
+        stack = [(self.root, 0)]
+        while stack:
+            node, index = stack.pop()
+            if index == len(segments):
+                if node["operations"] is not None:
+                    return node["operations"]
+                continue
+            # Pushed last so that it is tried first
+            if node["param"] is not None and segments[index]:
+                stack.append((node["param"], index + 1))
+            literal = node["literals"].get(segments[index])
+            if literal is not None:
+                stack.append((literal, index + 1))
+        return None
+
+def get_cached_openapi_schema(
+    openapi_path: str,
+    include_tags: Optional[List[str]] = None,
+    proxy_prefix: str = ""
+) -> Dict[str, Any]:
+    """
+    Return the filtered schema as pre-serialized bytes plus its ETag.
+
+    The schema file is only re-read when its modification time changes, so
+    repeated hits cost a single os.stat call.
+    """
+    mtime = os.stat(openapi_path).st_mtime_ns
+    key = (os.path.abspath(openapi_path), mtime, tuple(include_tags or []), proxy_prefix)
+    entry = _schema_cache.get(key)
+    if entry is None:
+        schema = load_openapi_schema(openapi_path, include_tags, proxy_prefix)
+        body = json.dumps(schema, separators=(",", ":")).encode("utf-8")
+        entry = {
+            "schema": schema,
+            "body": body,
+            "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            "routes": RouteTable.from_schema(schema),
+        }
+        # Drop entries for older versions of the same file/filter combination
+        for stale_key in [k for k in _schema_cache if k[0] == key[0] and k[2:] == key[2:]]:
+            del _schema_cache[stale_key]
+        _schema_cache[key] = entry
+    return entry
+
 @app.get("/openapi.json")
-async def get_openapi():
+async def get_openapi(request: Request):
     """Serve the filtered OpenAPI schema."""
     try:
-        schema = load_openapi_schema(
+        entry = get_cached_openapi_schema(
             config["openapi_path"],
             config["include_tags"],
             config["proxy_prefix"]
         )
-        return JSONResponse(content=schema)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading OpenAPI schema: {str(e)}")
 
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if entry["etag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+def filter_headers(headers: httpx.Headers, exclude: Optional[set] = None) -> Dict[str, str]:
+    """Drop hop-by-hop headers (and any extra names in exclude) from a header set."""
+    exclude = HOP_BY_HOP_HEADERS | (exclude or set())
+    # Headers named in the Connection header are hop-by-hop as well
+    for name in headers.get("connection", "").split(","):
+        exclude.add(name.strip().lower())
+    return {name: value for name, value in headers.items() if name.lower() not in exclude}
+
+def credential_hash(authorization: Optional[str]) -> str:
+    """Hash an Authorization header so credentials are never kept in plain text."""
+    return hashlib.sha256((authorization or "").encode("utf-8")).hexdigest()[:16]
+
+def request_key(method: str, path: str, params: List[Tuple[str, str]], authorization: Optional[str]) -> Tuple:
+    """Identify a request by method, path, sorted query and a hash of its credentials."""
+    return (method.upper(), "/" + path.strip("/"), tuple(sorted(params)), credential_hash(authorization))
+
+class RateLimiter:
+    """
+    Per-credential token bucket that schedules upstream requests against the
+    Canvas rate limit.
+
+    The local estimate of the remaining budget refills over time and is
+    corrected from the X-Rate-Limit-Remaining and X-Request-Cost headers of
+    every response. Requests that would dip into the reserve wait in a
+    priority queue instead of being sent, and throttled responses are retried
+    with jittered exponential backoff.
+    """
+
+    def __init__(self, bucket_size: float, refill_rate: float, reserve: float, max_retries: int, backoff: float):
+        self.bucket_size = bucket_size
+        self.refill_rate = refill_rate
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.buckets: Dict[str, Dict[str, Any]] = {}
+        self._sequence = itertools.count()
+        self.stats = {
+            "requests": 0,
+            "queued_requests": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "throttled_responses": 0,
+            "retries": 0,
+        }
+
+    async def run(self, function, *args) -> Any:
+        """Call one of this limiter's budget methods from the event loop (see SQLiteState)."""
+        return function(*args)
+
+    def _bucket(self, credential: str) -> Dict[str, Any]:
+        bucket = self.buckets.get(credential)
+        if bucket is None:
+            bucket = {
+                "remaining": self.bucket_size,
+                "updated_at": time.monotonic(),
+                # Running estimate of X-Request-Cost, used before the cost is known
+                "cost": 1.0,
+                "in_flight": 0,
+                "waiting": [],
+                "condition": asyncio.Condition(),
+            }
+            self.buckets[credential] = bucket
+        return bucket
+
+    def _refill(self, bucket: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        bucket["remaining"] = min(
+            self.bucket_size,
+            bucket["remaining"] + (now - bucket["updated_at"]) * self.refill_rate
+        )
+        bucket["updated_at"] = now
+
+    def _try_consume(self, credential: str, bucket: Dict[str, Any]) -> float:
+        """Take one request's cost from the budget; return 0.0, or the seconds to wait first."""
+        self._refill(bucket)
+        available = bucket["remaining"] - self.reserve
+        if available >= bucket["cost"]:
+            bucket["remaining"] -= bucket["cost"]
+            return 0.0
+        return (bucket["cost"] - available) / self.refill_rate
+
+    def _correct(self, credential: str, bucket: Dict[str, Any], cost: Optional[float], remaining: Optional[float]) -> None:
+        """Apply the X-Request-Cost and X-Rate-Limit-Remaining values of a response."""
+        if cost is not None:
+            bucket["cost"] = 0.8 * bucket["cost"] + 0.2 * cost
+        if remaining is not None:
+            # The header does not yet account for requests still in flight
+            self._refill(bucket)
+            bucket["remaining"] = remaining - bucket["in_flight"] * bucket["cost"]
+
+    def _drain(self, credential: str, bucket: Dict[str, Any]) -> None:
+        """Empty the budget after the upstream reported throttling."""
+        bucket["remaining"] = min(bucket["remaining"], 0.0)
+
+    def budget(self, credential: str) -> Tuple[float, float]:
+        """Return the remaining budget and the estimated request cost of a credential."""
+        bucket = self._bucket(credential)
+        return bucket["remaining"], bucket["cost"]
+
+    async def acquire(self, credential: str, priority: int = 0) -> None:
+        """Wait until the credential has budget and no higher-priority request is queued."""
+        bucket = self._bucket(credential)
+        ticket = (priority, next(self._sequence))
+        started = time.monotonic()
+        async with bucket["condition"]:
+            # Queued only once the lock is held, so a request cancelled while
+            # waiting for the lock never leaves its ticket behind
+            heapq.heappush(bucket["waiting"], ticket)
+            try:
+                while True:
+                    delay = None
+                    if bucket["waiting"][0] == ticket:
+                        delay = await self.run(self._try_consume, credential, bucket)
+                        if delay <= 0:
+                            break
+                    try:
+                        await asyncio.wait_for(bucket["condition"].wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                bucket["waiting"].remove(ticket)
+                heapq.heapify(bucket["waiting"])
+                bucket["condition"].notify_all()
+        bucket["in_flight"] += 1
+
+        waited = time.monotonic() - started
+        self.stats["requests"] += 1
+        if waited > 0.001:
+            self.stats["queued_requests"] += 1
+        self.stats["total_wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+    async def release(self, credential: str, response: Optional[httpx.Response]) -> None:
+        """Correct the budget estimate from the rate-limit headers of a response."""
+        bucket = self._bucket(credential)
+        bucket["in_flight"] -= 1
+        if response is not None:
+            cost = response.headers.get("x-request-cost")
+            remaining = response.headers.get("x-rate-limit-remaining")
+            try:
+                cost = float(cost) if cost is not None else None
+                remaining = float(remaining) if remaining is not None else None
+            except ValueError:
+                cost = remaining = None
+            if cost is not None or remaining is not None:
+                await self.run(self._correct, credential, bucket, cost, remaining)
+        async with bucket["condition"]:
+            bucket["condition"].notify_all()
+
+    @staticmethod
+    async def is_throttled(response: httpx.Response) -> bool:
+        """Canvas answers throttled requests with 403 "Rate Limit Exceeded"."""
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        await response.aread()
+        return b"rate limit exceeded" in response.content.lower()
+
+    async def send(self, upstream_request: httpx.Request, stream: bool = False, priority: int = 0) -> httpx.Response:
+        """Send a request once the credential has budget, retrying throttled responses."""
+        credential = credential_hash(upstream_request.headers.get("authorization"))
+        attempt = 0
+        while True:
+            await self.acquire(credential, priority)
+            response = None
+            try:
+                response = await client.send(upstream_request, stream=stream)
+            finally:
+                await self.release(credential, response)
+            if not await self.is_throttled(response):
+                return response
+
+            self.stats["throttled_responses"] += 1
+            await self.run(self._drain, credential, self._bucket(credential))
+            if attempt >= self.max_retries:
+                return response
+            await response.aclose()
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+    def queue_depth(self) -> int:
+        return sum(len(bucket["waiting"]) for bucket in self.buckets.values())
+
+class SQLiteState:
+    """
+    Mixin for state kept in the SQLite file shared by all workers.
+
+    Its methods block while another worker holds the write lock (up to the
+    busy timeout), so run() executes them in a worker thread, one at a time
+    per connection, instead of on the event loop.
+    """
+
+    def open_state_db(self, state_path: str) -> None:
+        self.db = connect_state_db(state_path)
+        self.db_lock = threading.Lock()
+
+    async def run(self, function, *args) -> Any:
+        def locked():
+            with self.db_lock:
+                return function(*args)
+        return await asyncio.to_thread(locked)
+
+class SQLiteRateLimiter(SQLiteState, RateLimiter):
+    """
+    Rate limiter whose per-credential budget lives in a SQLite file, so that
+    all workers on a host draw from the same bucket. Queues stay per process.
+    """
+
+    def __init__(self, bucket_size: float, refill_rate: float, reserve: float, max_retries: int, backoff: float,
+                 state_path: str):
+        super().__init__(bucket_size, refill_rate, reserve, max_retries, backoff)
+        self.open_state_db(state_path)
+
+    def _update_budget(self, credential: str, update) -> Any:
+        """Run update(remaining, cost) -> (remaining, cost, result) atomically on the shared row."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = self.db.execute(
+                "SELECT remaining, updated_at, cost FROM rate_limit WHERE credential = ?", (credential,)
+            ).fetchone()
+            remaining, updated_at, cost = row if row is not None else (self.bucket_size, now, 1.0)
+            remaining = min(self.bucket_size, remaining + (now - updated_at) * self.refill_rate)
+            remaining, cost, result = update(remaining, cost)
+            self.db.execute(
+                "INSERT OR REPLACE INTO rate_limit VALUES (?, ?, ?, ?)", (credential, remaining, now, cost)
+            )
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return result
+
+    def _try_consume(self, credential: str, bucket: Dict[str, Any]) -> float:
+        def update(remaining, cost):
+            available = remaining - self.reserve
+            if available >= cost:
+                return remaining - cost, cost, 0.0
+            return remaining, cost, (cost - available) / self.refill_rate
+        return self._update_budget(credential, update)
+
+    def _correct(self, credential: str, bucket: Dict[str, Any], cost: Optional[float], remaining: Optional[float]) -> None:
+        def update(current_remaining, current_cost):
+            if cost is not None:
+                current_cost = 0.8 * current_cost + 0.2 * cost
+            if remaining is not None:
+                # Only requests in flight in this process are known here
+                current_remaining = remaining - bucket["in_flight"] * current_cost
+            return current_remaining, current_cost, None
+        self._update_budget(credential, update)
+
+    def _drain(self, credential: str, bucket: Dict[str, Any]) -> None:
+        self._update_budget(credential, lambda remaining, cost: (min(remaining, 0.0), cost, None))
+
+    def budget(self, credential: str) -> Tuple[float, float]:
+        return self._update_budget(credential, lambda remaining, cost: (remaining, cost, (remaining, cost)))
+
+async def send_upstream(upstream_request: httpx.Request, stream: bool = False, priority: int = 0) -> httpx.Response:
+    """Send a request to the target server, through the rate limiter when enabled."""
+    started = time.perf_counter()
+    try:
+        if rate_limiter is None:
+            return await client.send(upstream_request, stream=stream)
+        return await rate_limiter.send(upstream_request, stream, priority)
+    finally:
+        upstream_seconds = _upstream_seconds.get()
+        if upstream_seconds is not None:
+            upstream_seconds.append(time.perf_counter() - started)
+
+class Metrics:
+    """Minimal registry of counters and histograms in the Prometheus text format."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[Tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self.histograms: Dict[str, Dict[Tuple, Dict[str, Any]]] = defaultdict(dict)
+        self.help: Dict[str, str] = {}
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1.0, help_text: str = "") -> None:
+        self.help.setdefault(name, help_text)
+        self.counters[name][tuple(sorted(labels.items()))] += value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float, help_text: str = "") -> None:
+        self.help.setdefault(name, help_text)
+        key = tuple(sorted(labels.items()))
+        histogram = self.histograms[name].get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0}
+            self.histograms[name][key] = histogram
+        for index, bound in enumerate(self.BUCKETS):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+        items = labels + extra
+        if not items:
+            return ""
+        escaped = [
+            f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for key, value in items
+        ]
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self, gauges: Dict[str, Tuple[str, float]]) -> str:
+        """Render all metrics plus values read from other components (name -> (help, value))."""
+        lines = []
+        for name, series in self.counters.items():
+            lines.append(f"# HELP {name} {self.help.get(name, '')}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for name, series in self.histograms.items():
+            lines.append(f"# HELP {name} {self.help.get(name, '')}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                for bound, count in zip(self.BUCKETS, histogram["buckets"]):
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {histogram['count']}")
+        for name, (help_text, value) in gauges.items():
+            # Running totals kept by other components are exposed as counters
+            metric_type = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+async def collect_gauges() -> Dict[str, Tuple[str, float]]:
+    """Point-in-time values from the pool, cache, coalescing and rate limiter."""
+    pool = get_pool_stats()
+    gauges = {
+        "proxy_pool_connections": ("Open upstream connections", pool["connections"]),
+        "proxy_pool_active_connections": ("Upstream connections serving a request", pool["active_connections"]),
+        "proxy_pool_idle_connections": ("Idle keep-alive upstream connections", pool["idle_connections"]),
+        "proxy_pool_queued_requests": ("Requests waiting for a pooled connection", pool["queued_requests"]),
+        "proxy_pool_max_connections": ("Configured upstream connection limit", pool["max_connections"]),
+        "proxy_in_flight_requests": ("Proxied requests in progress", pool["in_flight_requests"]),
+        "proxy_coalesced_requests_total": (
+            "GETs served from another request's upstream response", coalescing_stats["coalesced_requests"]
+        ),
+    }
+    if response_cache is not None:
+        lookups = response_cache.stats["hits"] + response_cache.stats["misses"]
+        gauges.update({
+            "proxy_cache_hits_total": ("Response cache hits", response_cache.stats["hits"]),
+            "proxy_cache_misses_total": ("Response cache misses", response_cache.stats["misses"]),
+            "proxy_cache_revalidated_total": ("Stale entries confirmed by the upstream", response_cache.stats["revalidated"]),
+            "proxy_cache_evictions_total": ("Entries evicted to stay under the size bound", response_cache.stats["evictions"]),
+            "proxy_cache_hit_ratio": ("Share of cache lookups that were hits", response_cache.stats["hits"] / lookups if lookups else 0.0),
+            "proxy_cache_bytes": ("Bytes held by the response cache", (await response_cache.run(response_cache.usage))[1]),
+        })
+    if rate_limiter is not None:
+        gauges.update({
+            "proxy_rate_limit_queue_depth": ("Requests waiting for rate limit budget", rate_limiter.queue_depth()),
+            "proxy_rate_limit_wait_seconds_total": ("Time requests spent queued", rate_limiter.stats["total_wait_seconds"]),
+            "proxy_rate_limit_throttled_total": ("Throttled upstream responses", rate_limiter.stats["throttled_responses"]),
+        })
+    return gauges
+
+def paths_overlap(first: str, second: str) -> bool:
+    """Check whether one path is a segment-wise prefix of the other."""
+    shorter, longer = sorted((first.rstrip("/"), second.rstrip("/")), key=len)
+    return longer == shorter or longer.startswith(shorter + "/")
+
+class ResponseCache:
+    """
+    In-memory LRU cache of upstream GET responses, bounded by total body size.
+
+    Entries are keyed by method, path, normalized query and a hash of the
+    Authorization header, so responses are never shared between credentials.
+    Expired entries that carry an ETag or Last-Modified header are kept and
+    revalidated with a conditional request instead of being refetched.
+    """
+
+    # Clock used for expiry times
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_bytes: int, default_ttl: float, route_ttls: List[Tuple[str, float]]):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.route_ttls = route_ttls
+        self.entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    async def run(self, function, *args) -> Any:
+        """Call one of this cache's storage methods from the event loop (see SQLiteState)."""
+        return function(*args)
+
+    def ttl_for(self, path: str) -> float:
+        """Return the TTL of the first route pattern matching path."""
+        for pattern, ttl in self.route_ttls:
+            if fnmatch(path, pattern):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Look up an entry (fresh or stale) and mark it as recently used."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return self.clock() < entry["expires_at"]
+
+    def usage(self) -> Tuple[int, int]:
+        """Return the number of entries and the total size of their bodies."""
+        return len(self.entries), self.total_bytes
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        """Headers for revalidating a stale entry against the upstream."""
+        headers = {}
+        if entry["etag"]:
+            headers["if-none-match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["if-modified-since"] = entry["last_modified"]
+        return headers
+
+    def make_entry(self, key: Tuple, response: httpx.Response) -> Optional[Dict[str, Any]]:
+        """Build a cache entry for a response, or None if it must not be cached."""
+        ttl = self.ttl_for(key[1])
+        if ttl <= 0 or response.status_code != 200:
+            return None
+        if "no-store" in response.headers.get("cache-control", "").lower():
+            return None
+        if len(response.content) > self.max_bytes:
+            return None
+        return {
+            "body": response.content,
+            "status_code": response.status_code,
+            "headers": filter_headers(response.headers, {"content-encoding", "content-length"}),
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "expires_at": self.clock() + ttl,
+        }
+
+    def store(self, key: Tuple, response: httpx.Response) -> None:
+        """Store a successful upstream response if it is cacheable."""
+        entry = self.make_entry(key, response)
+        if entry is None:
+            return
+        self.remove(key)
+        self.entries[key] = entry
+        self.total_bytes += len(entry["body"])
+        self.stats["stores"] += 1
+        while self.total_bytes > self.max_bytes and self.entries:
+            oldest_key = next(iter(self.entries))
+            self.remove(oldest_key)
+            self.stats["evictions"] += 1
+
+    def refresh(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Extend the lifetime of an entry the upstream confirmed with a 304."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry["expires_at"] = self.clock() + self.ttl_for(key[1])
+            self.stats["revalidated"] += 1
+        return entry
+
+    def remove(self, key: Tuple) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry["body"])
+
+    def invalidate(self, path: str) -> None:
+        """Drop every entry whose path overlaps a path that was just modified."""
+        path = "/" + path.strip("/")
+        for key in [key for key in self.entries if paths_overlap(key[1], path)]:
+            self.remove(key)
+            self.stats["invalidations"] += 1
+
+def connect_state_db(state_path: str) -> sqlite3.Connection:
+    """Open the SQLite file that holds state shared between worker processes."""
+    # Used from worker threads (see SQLiteState), one at a time
+    db = sqlite3.connect(state_path, timeout=10.0, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS response_cache ("
+        "key TEXT PRIMARY KEY, path TEXT, status_code INTEGER, headers TEXT, body BLOB, "
+        "etag TEXT, last_modified TEXT, expires_at REAL, size INTEGER, last_used REAL)"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS rate_limit ("
+        "credential TEXT PRIMARY KEY, remaining REAL, updated_at REAL, cost REAL)"
+    )
+    return db
+
+class SQLiteResponseCache(SQLiteState, ResponseCache):
+    """
+    Response cache kept in a SQLite file, so that all workers on a host share
+    entries and invalidations. Hit/miss statistics stay per process.
+    """
+
+    # Expiry times are compared across processes, so wall-clock time is used
+    clock = staticmethod(time.time)
+
+    # Hits are not written one by one, which would make every reader wait for
+    # the write lock: their times are buffered and written at most this often,
+    # and before each eviction. LRU order across workers is approximate by
+    # up to this many seconds.
+    RECENCY_FLUSH_SECONDS = 5.0
+
+    def __init__(self, max_bytes: int, default_ttl: float, route_ttls: List[Tuple[str, float]], state_path: str):
+        super().__init__(max_bytes, default_ttl, route_ttls)
+        self.open_state_db(state_path)
+        self._last_used: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+    def _write_last_used(self) -> None:
+        """Write the buffered hit times; called inside a write transaction."""
+        if self._last_used:
+            self.db.executemany(
+                "UPDATE response_cache SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, db_key) for db_key, used in self._last_used.items()]
+            )
+            self._last_used.clear()
+        self._flushed_at = time.monotonic()
+
+    @staticmethod
+    def _db_key(key: Tuple) -> str:
+        return json.dumps(key)
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        db_key = self._db_key(key)
+        row = self.db.execute(
+            "SELECT status_code, headers, body, etag, last_modified, expires_at "
+            "FROM response_cache WHERE key = ?",
+            (db_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._last_used[db_key] = time.time()
+        if time.monotonic() - self._flushed_at >= self.RECENCY_FLUSH_SECONDS:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_last_used()
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return {
+            "status_code": row[0],
+            "headers": json.loads(row[1]),
+            "body": row[2],
+            "etag": row[3],
+            "last_modified": row[4],
+            "expires_at": row[5],
+        }
+
+    def usage(self) -> Tuple[int, int]:
+        count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        return count, size
+
+    def store(self, key: Tuple, response: httpx.Response) -> None:
+        entry = self.make_entry(key, response)
+        if entry is None:
+            return
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._db_key(key), key[1], entry["status_code"], json.dumps(entry["headers"]),
+                    entry["body"], entry["etag"], entry["last_modified"], entry["expires_at"],
+                    len(entry["body"]), time.time()
+                )
+            )
+            self._write_last_used()
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+            # Evict least recently used entries until the size bound holds again
+            for db_key, size in self.db.execute(
+                "SELECT key, size FROM response_cache ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM response_cache WHERE key = ?", (db_key,))
+                total -= size
+                self.stats["evictions"] += 1
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        self.stats["stores"] += 1
+
+    def refresh(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        self.db.execute(
+            "UPDATE response_cache SET expires_at = ? WHERE key = ?",
+            (self.clock() + self.ttl_for(key[1]), self._db_key(key))
+        )
+        entry = self.get(key)
+        if entry is not None:
+            self.stats["revalidated"] += 1
+        return entry
+
+    def remove(self, key: Tuple) -> None:
+        self.db.execute("DELETE FROM response_cache WHERE key = ?", (self._db_key(key),))
+
+    def invalidate(self, path: str) -> None:
+        path = "/" + path.strip("/")
+        rows = self.db.execute("SELECT key, path FROM response_cache").fetchall()
+        for db_key, entry_path in rows:
+            if paths_overlap(entry_path, path):
+                self.db.execute("DELETE FROM response_cache WHERE key = ?", (db_key,))
+                self.stats["invalidations"] += 1
+
+def cached_response(entry: Dict[str, Any], cache_status: str) -> Response:
+    """Build a client response from a cache entry."""
+    headers = dict(entry["headers"])
+    headers["X-Proxy-Cache"] = cache_status
+    return Response(content=entry["body"], status_code=entry["status_code"], headers=headers)
+
+async def send_coalesced(key: Tuple, upstream_request: httpx.Request, priority: int = 0) -> httpx.Response:
+    """
+    Send an upstream request, sharing it with concurrent requests for the same key.
+
+    The first caller (the leader) performs the request; callers arriving while
+    it is in flight wait for its fully read response instead of sending their own.
+    """
+    # If the leader is cancelled, the first waiter to wake up takes over and
+    # the others wait for it instead
+    while True:
+        pending = _pending_requests.get(key)
+        if pending is None:
+            break
+        try:
+            response = await asyncio.shield(pending)
+            coalescing_stats["coalesced_requests"] += 1
+            return response
+        except asyncio.CancelledError:
+            # Only carry on if the leader was cancelled rather than this request
+            if not pending.cancelled():
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    _pending_requests[key] = future
+    coalescing_stats["upstream_requests"] += 1
+    try:
+        response = await send_upstream(upstream_request, priority=priority)
+        future.set_result(response)
+        return response
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved in case nobody was waiting for it
+        future.exception()
+        raise
+    finally:
+        if _pending_requests.get(key) is future:
+            del _pending_requests[key]
+
+def page_urls_from_links(response: httpx.Response, max_pages: int) -> Optional[List[str]]:
+    """
+    Build the URLs of all remaining pages when the Link header gives the last page number.
+
+    Returns None for cursor-style pagination (e.g. Canvas bookmarks), which
+    can only be followed one rel="next" link at a time.
+    """
+    next_link = response.links.get("next", {}).get("url")
+    last_link = response.links.get("last", {}).get("url")
+    if not next_link or not last_link:
+        return None
+    next_url = httpx.URL(next_link)
+    next_page = next_url.params.get("page", "")
+    last_page = httpx.URL(last_link).params.get("page", "")
+    if not (next_page.isdigit() and last_page.isdigit()):
+        return None
+    # The first page has already been fetched and counts towards max_pages
+    last = min(int(last_page), int(next_page) + max_pages - 2)
+    return [str(next_url.copy_set_param("page", str(page))) for page in range(int(next_page), last + 1)]
+
+def is_upstream_url(url: str) -> bool:
+    """Only follow pagination links that point back at the target server."""
+    target = httpx.URL(config["target_url"])
+    candidate = httpx.URL(url)
+    return (candidate.scheme, candidate.host, candidate.port) == (target.scheme, target.host, target.port)
+
+async def iter_pages(
+    first_response: httpx.Response,
+    headers: Dict[str, str],
+    max_pages: int,
+    priority: int = 0
+) -> AsyncIterator[httpx.Response]:
+    """
+    Yield the pages following first_response in order.
+
+    When the last page number is known the remaining pages are fetched
+    concurrently, otherwise rel="next" links are followed one by one.
+    Iteration stops at the first page that is not a successful response.
+    """
+    page_urls = page_urls_from_links(first_response, max_pages)
+    if page_urls is not None:
+        page_urls = [url for url in page_urls if is_upstream_url(url)]
+        tasks = [
+            asyncio.ensure_future(
+                send_upstream(client.build_request("GET", url, headers=headers), priority=priority)
+            )
+            for url in page_urls
+        ]
+        try:
+            for task in tasks:
+                response = await task
+                if not response.is_success:
+                    return
+                yield response
+        finally:
+            for task in tasks:
+                task.cancel()
+        return
+
+    response = first_response
+    for _ in range(max_pages - 1):
+        next_link = response.links.get("next", {}).get("url")
+        if not next_link or not is_upstream_url(next_link):
+            return
+        response = await send_upstream(client.build_request("GET", next_link, headers=headers), priority=priority)
+        if not response.is_success:
+            return
+        yield response
+
+async def paginate(
+    mode: str,
+    target_url: str,
+    headers: Dict[str, str],
+    params: List[Tuple[str, str]],
+    priority: int = 0
+) -> Response:
+    """Fetch every page of a paginated list endpoint and return the merged items."""
+    first_response = await send_upstream(
+        client.build_request("GET", target_url, headers=headers, params=params),
+        priority=priority
+    )
+    try:
+        first_items = first_response.json() if first_response.is_success else None
+    except ValueError:
+        first_items = None
+    if not isinstance(first_items, list):
+        # Not a paginated list; pass the response through unchanged
+        return Response(
+            content=first_response.content,
+            status_code=first_response.status_code,
+            headers=filter_headers(first_response.headers, {"content-encoding", "content-length"})
+        )
+
+    max_pages = config["max_pages"]
+    if mode == "ndjson":
+        async def ndjson_lines() -> AsyncIterator[bytes]:
+            for item in first_items:
+                yield json.dumps(item).encode("utf-8") + b"\n"
+            async for page in iter_pages(first_response, headers, max_pages, priority):
+                for item in page.json():
+                    yield json.dumps(item).encode("utf-8") + b"\n"
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    items = list(first_items)
+    page_count = 1
+    async for page in iter_pages(first_response, headers, max_pages, priority):
+        items.extend(page.json())
+        page_count += 1
+    return JSONResponse(content=items, headers={"X-Proxy-Pages": str(page_count)})
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Record request counts, latency split into upstream and proxy time, and bytes."""
+    if request.url.path == "/metrics" or request.url.path.startswith("/_proxy/"):
+        return await call_next(request)
+
+    upstream_seconds: List[float] = []
+    token = _upstream_seconds.set(upstream_seconds)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _upstream_seconds.reset(token)
+    elapsed = time.perf_counter() - started
+
+    # Labelled by the matched operation rather than the raw path to bound cardinality
+    if request.url.path == "/openapi.json":
+        operation = "openapi_schema"
+    else:
+        operation = getattr(request.state, "operation_id", None) or "unmatched"
+    labels = {"operation": operation}
+    upstream = sum(upstream_seconds)
+    metrics.inc(
+        "proxy_requests_total",
+        {**labels, "method": request.method, "status": str(response.status_code)},
+        help_text="Requests handled by the proxy"
+    )
+    metrics.observe("proxy_request_duration_seconds", labels, elapsed, "Total time to response headers")
+    metrics.observe("proxy_upstream_duration_seconds", labels, upstream, "Time spent waiting on the target server")
+    metrics.observe("proxy_overhead_duration_seconds", labels, max(elapsed - upstream, 0.0), "Time spent in the proxy itself")
+    metrics.inc(
+        "proxy_request_bytes_total", labels,
+        int(request.headers.get("content-length", 0) or 0), "Request body bytes received"
+    )
+
+    async def count_body(body_iterator):
+        async for chunk in body_iterator:
+            metrics.inc("proxy_response_bytes_total", labels, len(chunk), "Response body bytes sent")
+            yield chunk
+
+    response.body_iterator = count_body(response.body_iterator)
+    return response
+
+@app.get("/metrics")
+async def get_metrics():
+    """Serve proxy metrics in the Prometheus text exposition format."""
+    return Response(content=metrics.render(await collect_gauges()), media_type="text/plain; version=0.0.4")
+
+@app.get("/_proxy/rate-limit")
+async def rate_limit_stats():
+    """Serve rate limiter queue and wait-time statistics."""
+    if rate_limiter is None:
+        return JSONResponse(content={"enabled": False})
+    credentials = {}
+    for credential, bucket in rate_limiter.buckets.items():
+        remaining, cost = await rate_limiter.run(rate_limiter.budget, credential)
+        credentials[credential] = {
+            "remaining": round(remaining, 2),
+            "request_cost": round(cost, 2),
+            "in_flight": bucket["in_flight"],
+            "queued": len(bucket["waiting"]),
+        }
+    return JSONResponse(content={
+        "enabled": True,
+        "backend": config["state_backend"],
+        "queue_depth": rate_limiter.queue_depth(),
+        **rate_limiter.stats,
+        "credentials": credentials,
+    })
+
+@app.get("/_proxy/coalescing")
+async def coalescing_stats_endpoint():
+    """Serve request coalescing statistics."""
+    return JSONResponse(content={
+        "enabled": config["coalesce_requests"],
+        "in_flight": len(_pending_requests),
+        **coalescing_stats,
+    })
+
+@app.get("/_proxy/cache")
+async def cache_stats():
+    """Serve response cache statistics."""
+    if response_cache is None:
+        return JSONResponse(content={"enabled": False})
+    entries, size = await response_cache.run(response_cache.usage)
+    return JSONResponse(content={
+        "enabled": True,
+        "backend": config["state_backend"],
+        "entries": entries,
+        "bytes": size,
+        "max_bytes": response_cache.max_bytes,
+        **response_cache.stats,
+    })
+
+@app.get("/_proxy/pool")
+async def pool_stats():
+    """Serve upstream connection pool statistics."""
+    return JSONResponse(content=get_pool_stats())
+
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD", "PATCH"])
 async def proxy_endpoint(request: Request, path: str, authorization: Optional[str] = Header(None)):
     """Proxy all requests to the target server."""
+    global _in_flight_requests
+
+    # Resolve the operation, rejecting paths outside the served schema without
+    # an upstream round trip
+    try:
+        routes = get_cached_openapi_schema(
+            config["openapi_path"],
+            config["include_tags"],
+            config["proxy_prefix"]
+        )["routes"]
+    except Exception as e:
+        if config["enforce_routes"]:
+            raise HTTPException(status_code=500, detail=f"Error loading OpenAPI schema: {str(e)}")
+        routes = None
+    operations = routes.match(path) if routes is not None else None
+    method = request.method
+    if method == "HEAD" and method not in (operations or {}):
+        method = "GET"
+    if config["enforce_routes"]:
+        if operations is None:
+            raise HTTPException(status_code=404, detail=f"No operation for path: /{path}")
+        if method not in operations and request.method != "OPTIONS":
+            raise HTTPException(
+                status_code=405,
+                detail=f"Method {request.method} not allowed for path: /{path}",
+                headers={"Allow": ", ".join(sorted(operations))}
+            )
+    operation = (operations or {}).get(method)
+    request.state.operation_id = operation["operation_id"] if operation else None
+
     # Build target URL
     target_url = f"{config['target_url']}/{path}"
     
@@ -107,69 +1368,256 @@ async def proxy_endpoint(request: Request, path: str, authorization: Optional[st
     if request.method in ["POST", "PUT", "PATCH"]:
         body = await request.body()
     
-    # Prepare headers
-    headers = dict(request.headers)
-    if "host" in headers:
-        del headers["host"]  # Remove host header to avoid conflicts
+    # Prepare headers (host is removed to avoid conflicts with the target)
+    headers = filter_headers(request.headers, {"host", "content-length", PRIORITY_HEADER})
+
+    # Queue position when the rate limiter has to hold requests back
+    try:
+        priority = int(request.headers.get(PRIORITY_HEADER, "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{PRIORITY_HEADER} must be an integer")
     
-    # Get query parameters
-    params = dict(request.query_params)
+    # Get query parameters, keeping repeated keys such as include[]; the
+    # proxy's own flag is never forwarded, whatever the method
+    params = [(key, value) for key, value in request.query_params.multi_items() if key != PAGINATE_PARAM]
+
+    # Aggregate Link-header pagination when requested with ?proxy_paginate=all|ndjson
+    paginate_mode = request.query_params.get(PAGINATE_PARAM)
+    if paginate_mode is not None and request.method == "GET":
+        if paginate_mode not in ["all", "ndjson"]:
+            raise HTTPException(status_code=400, detail=f"{PAGINATE_PARAM} must be 'all' or 'ndjson'")
+        try:
+            return await paginate(paginate_mode, target_url, headers, params, priority)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error proxying request: {str(e)}")
     
+    # Serve idempotent GETs from the response cache when it is enabled
+    cache_key = None
+    cache_entry = None
+    if response_cache is not None:
+        if request.method == "GET":
+            cache_key = request_key(request.method, path, params, authorization)
+            cache_entry = await response_cache.run(response_cache.get, cache_key)
+            if cache_entry is not None and response_cache.is_fresh(cache_entry):
+                response_cache.stats["hits"] += 1
+                return cached_response(cache_entry, "HIT")
+            if cache_entry is not None:
+                headers.update(response_cache.conditional_headers(cache_entry))
+            else:
+                response_cache.stats["misses"] += 1
+        elif request.method not in ["HEAD", "OPTIONS"]:
+            await response_cache.run(response_cache.invalidate, path)
+
+    _in_flight_requests += 1
     try:
-        # Make the request to the target server
-        response = await client.request(
+        upstream_request = client.build_request(
             method=request.method,
             url=target_url,
             headers=headers,
             params=params,
             content=body
         )
+
+        coalesce_key = None
+        if config["coalesce_requests"] and request.method == "GET":
+            # A conditional, range or differently negotiated request must not
+            # be handed another request's 304 or partial response
+            coalesce_key = (
+                cache_key or request_key(request.method, path, params, authorization),
+                tuple(upstream_request.headers.get(name) for name in COALESCE_VARY_HEADERS),
+            )
+
+        if config["stream_responses"] and cache_key is None and coalesce_key is None:
+            # Forward the raw (still encoded) body chunk by chunk, so memory use
+            # does not depend on the payload size
+            response = await send_upstream(upstream_request, stream=True, priority=priority)
+            if response.is_stream_consumed:
+                # The body was already read to check for throttling
+                return Response(
+                    content=response.content,
+                    status_code=response.status_code,
+                    headers=filter_headers(response.headers, {"content-encoding", "content-length"})
+                )
+            return StreamingResponse(
+                response.aiter_raw(),
+                status_code=response.status_code,
+                headers=filter_headers(response.headers),
+                background=BackgroundTask(response.aclose)
+            )
+
+        # Make the request to the target server
+        if coalesce_key is not None:
+            response = await send_coalesced(coalesce_key, upstream_request, priority)
+        else:
+            response = await send_upstream(upstream_request, priority=priority)
+
+        if cache_key is not None:
+            if response.status_code == 304 and cache_entry is not None:
+                refreshed = await response_cache.run(response_cache.refresh, cache_key)
+                # The entry may have been evicted while the upstream was asked;
+                # the 304 still confirms the copy looked up before the request
+                return cached_response(refreshed or cache_entry, "REVALIDATED")
+            await response_cache.run(response_cache.store, cache_key, response)
         
-        # Return the proxied response
-        return JSONResponse(
-            content=response.json() if response.headers.get("content-type") == "application/json" else response.text,
+        # Return the proxied body as-is; httpx has already decoded any
+        # content-encoding, so the length is recomputed for the decoded bytes
+        response_headers = filter_headers(response.headers, {"content-encoding", "content-length"})
+        if cache_key is not None:
+            response_headers["X-Proxy-Cache"] = "MISS"
+        return Response(
+            content=response.content,
             status_code=response.status_code,
-            headers=dict(response.headers)
+            headers=response_headers
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error proxying request: {str(e)}")
+    finally:
+        _in_flight_requests -= 1
+
+# CLI options that map directly onto config keys
+CLI_CONFIG_KEYS = {
+    "openapi": "openapi_path",
+    "target": "target_url",
+    "prefix": "proxy_prefix",
+    "tags": "include_tags",
+    "stream": "stream_responses",
+    "max_connections": "max_connections",
+    "max_keepalive": "max_keepalive_connections",
+    "keepalive_expiry": "keepalive_expiry",
+    "connect_timeout": "connect_timeout",
+    "read_timeout": "read_timeout",
+    "http2": "http2",
+    "max_pages": "max_pages",
+    "rate_limit": "rate_limit_enabled",
+    "rate_limit_bucket": "rate_limit_bucket_size",
+    "rate_limit_refill": "rate_limit_refill_rate",
+    "rate_limit_reserve": "rate_limit_reserve",
+    "rate_limit_retries": "rate_limit_max_retries",
+    "coalesce": "coalesce_requests",
+    "cache": "cache_enabled",
+    "cache_max_bytes": "cache_max_bytes",
+    "cache_ttl": "cache_default_ttl",
+    "state_backend": "state_backend",
+    "state_path": "state_path",
+}
 
 def main():
     """Main entry point."""
-    parser = argparse.ArgumentParser(description="OpenAPI Proxy Server")
-    parser.add_argument("--openapi", default="./openapi.json", 
+    # Options left out on the command line do not override the config file or environment
+    parser = argparse.ArgumentParser(description="OpenAPI Proxy Server", argument_default=argparse.SUPPRESS)
+    parser.add_argument("--config",
+                        help=f"JSON config file (default: ${CONFIG_FILE_ENV}); see load_config for the keys")
+    parser.add_argument("--openapi",
                         help="Path to OpenAPI schema file (default: ./openapi.json)")
-    parser.add_argument("--target", default="http://localhost:8000",
+    parser.add_argument("--target",
                         help="Target URL to proxy requests to (default: http://localhost:8000)")
     parser.add_argument("--host", default="127.0.0.1",
                         help="Host to bind the server (default: 127.0.0.1)")
     parser.add_argument("--port", type=int, default=7899,
                         help="Port to bind the server (default: 7899)")
-    parser.add_argument("--tags", nargs="+", default=[],
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (default: 1)")
+    parser.add_argument("--tags", nargs="+",
                         help="Tags to include in the filtered OpenAPI schema")
-    parser.add_argument("--prefix", default="",
+    parser.add_argument("--prefix",
                         help="Prefix to add to paths in the OpenAPI schema")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream upstream response bodies through without buffering them")
+    parser.add_argument("--max-connections", type=int,
+                        help="Maximum number of upstream connections (default: 100)")
+    parser.add_argument("--max-keepalive", type=int,
+                        help="Maximum number of idle keep-alive connections (default: 20)")
+    parser.add_argument("--keepalive-expiry", type=float,
+                        help="Seconds an idle keep-alive connection is kept open (default: 30)")
+    parser.add_argument("--connect-timeout", type=float,
+                        help="Upstream connect timeout in seconds (default: 5)")
+    parser.add_argument("--read-timeout", type=float,
+                        help="Upstream read timeout in seconds (default: 30)")
+    parser.add_argument("--http2", action="store_true",
+                        help="Use HTTP/2 for upstream requests (requires httpx[http2])")
+    parser.add_argument("--allow-unlisted", action="store_true",
+                        help="Forward requests for paths that are not in the served schema")
+    parser.add_argument("--max-pages", type=int,
+                        help=f"Maximum pages fetched for ?{PAGINATE_PARAM}=all|ndjson (default: 50)")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Schedule upstream requests per credential against the Canvas rate limit")
+    parser.add_argument("--rate-limit-bucket", type=float,
+                        help="Rate limit bucket size per credential (default: 700)")
+    parser.add_argument("--rate-limit-refill", type=float,
+                        help="Rate limit budget regained per second (default: 10)")
+    parser.add_argument("--rate-limit-reserve", type=float,
+                        help="Budget kept in reserve before requests are queued (default: 50)")
+    parser.add_argument("--rate-limit-retries", type=int,
+                        help="Retries for throttled requests (default: 3)")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="Share one upstream request between concurrent identical GETs")
+    parser.add_argument("--cache", action="store_true",
+                        help="Cache upstream GET responses")
+    parser.add_argument("--cache-max-bytes", type=int,
+                        help="Maximum total size of cached response bodies (default: 64 MiB)")
+    parser.add_argument("--cache-ttl", type=float,
+                        help="Default cache TTL in seconds (default: 30)")
+    parser.add_argument("--cache-route-ttl", action="append", metavar="PATTERN=SECONDS",
+                        help="Per-route cache TTL for paths matching a glob, e.g. "
+                             "'/v1/courses/*/assignments*=120' (may be repeated)")
+    parser.add_argument("--state-backend", choices=["memory", "sqlite"],
+                        help="Where cache entries and rate-limit budgets are kept; use sqlite "
+                             "to share them between workers (default: memory)")
+    parser.add_argument("--state-path",
+                        help="SQLite file for --state-backend sqlite (default: ./openapi_proxy_state.db)")
     args = parser.parse_args()
-    
-    # Update global config
-    config.update({
-        "target_url": args.target,
-        "openapi_path": args.openapi,
-        "proxy_prefix": args.prefix,
-        "include_tags": args.tags
-    })
+
+    try:
+        settings = load_config(getattr(args, "config", None))
+    except (OSError, ValueError) as e:
+        parser.error(f"Invalid configuration: {e}")
+    for option, key in CLI_CONFIG_KEYS.items():
+        if hasattr(args, option):
+            settings[key] = getattr(args, option)
+    if hasattr(args, "allow_unlisted"):
+        settings["enforce_routes"] = False
+    if hasattr(args, "cache_route_ttl"):
+        try:
+            settings["cache_route_ttls"] = [parse_route_ttl(route_ttl) for route_ttl in args.cache_route_ttl]
+        except ValueError as e:
+            parser.error(f"Invalid --cache-route-ttl value: {e}")
     
     # Print configuration
     print(f"Starting OpenAPI Proxy Server:")
-    print(f"  - Listening on: http://{args.host}:{args.port}")
-    print(f"  - Proxying to: {args.target}")
-    print(f"  - OpenAPI Schema: {args.openapi}")
-    print(f"  - Included Tags: {args.tags if args.tags else 'All'}")
-    print(f"  - Path Prefix: {args.prefix if args.prefix else 'None'}")
+    print(f"  - Listening on: http://{args.host}:{args.port} ({args.workers} worker(s))")
+    print(f"  - Proxying to: {settings['target_url']}")
+    print(f"  - OpenAPI Schema: {settings['openapi_path']}")
+    print(f"  - Included Tags: {settings['include_tags'] if settings['include_tags'] else 'All'}")
+    print(f"  - Path Prefix: {settings['proxy_prefix'] if settings['proxy_prefix'] else 'None'}")
+    print(f"  - Streaming: {'Enabled' if settings['stream_responses'] else 'Disabled'}")
+    print(f"  - Upstream Pool: {settings['max_connections']} connections, "
+          f"{settings['max_keepalive_connections']} keep-alive, HTTP/2 {'on' if settings['http2'] else 'off'}")
+    print(f"  - Unlisted Paths: {'Rejected' if settings['enforce_routes'] else 'Forwarded'}")
+    print(f"  - Rate Limiting: {'Enabled' if settings['rate_limit_enabled'] else 'Disabled'}")
+    print(f"  - Request Coalescing: {'Enabled' if settings['coalesce_requests'] else 'Disabled'}")
+    cache_ttl = settings["cache_default_ttl"]
+    print(f"  - Response Cache: {f'{cache_ttl}s default TTL' if settings['cache_enabled'] else 'Disabled'}")
+    print(f"  - Shared State: {settings['state_backend']}")
     
     # Start server with uvicorn
     import uvicorn
-    uvicorn.run(app, host=args.host, port=args.port)
+    if args.workers == 1:
+        uvicorn.run(create_app(settings), host=args.host, port=args.port)
+        return
+
+    if settings["state_backend"] == "memory" and (settings["cache_enabled"] or settings["rate_limit_enabled"]):
+        print("Warning: with --state-backend memory every worker keeps its own cache and rate-limit budget")
+    # Worker processes import this module afresh, so they receive the settings
+    # through the environment and build the app with create_app
+    os.environ[SETTINGS_ENV] = json.dumps(settings)
+    uvicorn.run(
+        "openapi_proxy:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        app_dir=os.path.dirname(os.path.abspath(__file__))
+    )
 
 if __name__ == "__main__":
     main()
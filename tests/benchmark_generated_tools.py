@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for Generated Tool Methods
+
+This script:
+1. Generates a sync tool from a small Canvas-like spec (a list call with
+   optional query parameters and a create call with optional body fields)
+2. Defines the same two methods the way the generator used to emit them
+   (if/elif verb dispatch, None values sent along)
+3. Calls both, and the generated ones again with API_TRUST_ENV=false, through
+   a session whose adapter answers locally, so only the per-call overhead and
+   the bytes put on the wire are measured
+4. Prints all three and fails if the generated methods do not send fewer
+   bytes, or are not cheaper once environment settings are read only once
+
+test_openapi_parser.py runs a short version of the same comparison.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import BaseAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "openapi"))
+
+from openapi_parser import build_index, render_group
+
+OPTIONAL_QUERY = ["include", "search_term", "bucket", "order_by", "assignment_ids", "post_to_sis", "new_quizzes"]
+OPTIONAL_BODY = ["position", "points_possible", "grading_type", "due_at", "lock_at", "unlock_at",
+                 "description", "published", "omit_from_final_grade", "allowed_attempts"]
+
+SPEC = {
+    "openapi": "3.1.0",
+    "info": {"title": "Benchmark", "version": "1.0"},
+    "paths": {
+        "/v1/courses/{course_id}/assignments": {
+            "get": {
+                "operationId": "list_assignments",
+                "tags": ["assignments"],
+                "parameters": [{"name": "course_id", "in": "path", "required": True, "schema": {"type": "string"}}]
+                + [{"name": name, "in": "query", "schema": {"type": "string"}} for name in OPTIONAL_QUERY],
+            },
+            "post": {
+                "operationId": "create_assignment",
+                "tags": ["assignments"],
+                "parameters": [{"name": "course_id", "in": "path", "required": True, "schema": {"type": "string"}}],
+                "requestBody": {"content": {"application/json": {"schema": {
+                    "type": "object",
+                    "required": ["name"],
+                    "properties": {name: {"type": "string"} for name in ["name"] + OPTIONAL_BODY},
+                }}}},
+            },
+        }
+    },
+}
+
+class LocalAdapter(BaseAdapter):
+    """Answers every request with an empty JSON object and counts the bytes sent."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent_bytes = 0
+
+    def send(self, request, **kwargs):
+        self.sent_bytes += len(request.url) + len(request.body or b"")
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+def load_generated_tools(directory):
+    """Render the benchmark spec's tool into directory and import it."""
+    index = build_index(SPEC)
+    _, tool_code, _ = render_group("assignments", SPEC, index)
+    tool_file = os.path.join(directory, "assignments_tool.py")
+    with open(tool_file, "w", encoding="utf-8") as f:
+        f.write(tool_code)
+    spec = importlib.util.spec_from_file_location("assignments_tool", tool_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Tools
+
+def legacy_tools(tools_class):
+    """The generated class with its methods as the generator used to emit them."""
+
+    class LegacyTools(tools_class):
+        def __init__(self):
+            super().__init__()
+            # Legacy sessions re-read proxy, netrc and CA settings on every request
+            self.session.trust_env = True
+
+        def list_assignments(self, course_id: str, include: Optional[str] = None, search_term: Optional[str] = None,
+                             bucket: Optional[str] = None, order_by: Optional[str] = None,
+                             assignment_ids: Optional[str] = None, post_to_sis: Optional[str] = None,
+                             new_quizzes: Optional[str] = None) -> dict:
+            url = self.api_base + f"/v1/courses/{course_id}/assignments"
+
+            # No payload required
+            params = {
+                "include": include,
+                "search_term": search_term,
+                "bucket": bucket,
+                "order_by": order_by,
+                "assignment_ids": assignment_ids,
+                "post_to_sis": post_to_sis,
+                "new_quizzes": new_quizzes,
+            }
+
+            response = None
+            try:
+                method = "get".lower()
+                if method == "get":
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                elif method == "post":
+                    response = self.session.post(url, params=params, timeout=self.timeout)
+                elif method == "put":
+                    response = self.session.put(url, params=params, timeout=self.timeout)
+                elif method == "delete":
+                    response = self.session.delete(url, params=params, timeout=self.timeout)
+                elif method == "patch":
+                    response = self.session.patch(url, params=params, timeout=self.timeout)
+                else:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+
+                response.raise_for_status()
+                return response.json()
+            except Exception as e:
+                return {"error": str(e)}
+
+        def create_assignment(self, course_id: str, name: str, position: Optional[str] = None,
+                              points_possible: Optional[str] = None, grading_type: Optional[str] = None,
+                              due_at: Optional[str] = None, lock_at: Optional[str] = None,
+                              unlock_at: Optional[str] = None, description: Optional[str] = None,
+                              published: Optional[str] = None, omit_from_final_grade: Optional[str] = None,
+                              allowed_attempts: Optional[str] = None) -> dict:
+            url = self.api_base + f"/v1/courses/{course_id}/assignments"
+
+            payload = {
+                "name": name,
+                "position": position,
+                "points_possible": points_possible,
+                "grading_type": grading_type,
+                "due_at": due_at,
+                "lock_at": lock_at,
+                "unlock_at": unlock_at,
+                "description": description,
+                "published": published,
+                "omit_from_final_grade": omit_from_final_grade,
+                "allowed_attempts": allowed_attempts,
+            }
+
+            response = None
+            try:
+                method = "post".lower()
+                if method == "get":
+                    response = self.session.get(url, json=payload, timeout=self.timeout)
+                elif method == "post":
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+                elif method == "put":
+                    response = self.session.put(url, json=payload, timeout=self.timeout)
+                elif method == "delete":
+                    response = self.session.delete(url, json=payload, timeout=self.timeout)
+                elif method == "patch":
+                    response = self.session.patch(url, json=payload, timeout=self.timeout)
+                else:
+                    response = self.session.get(url, json=payload, timeout=self.timeout)
+
+                response.raise_for_status()
+                return response.json()
+            except Exception as e:
+                return {"error": str(e)}
+
+    return LegacyTools
+
+def run_calls(tools, calls):
+    """Make calls list and create calls, returning (seconds, bytes sent)."""
+    adapter = LocalAdapter()
+    tools.session.mount("http://", adapter)
+    start = time.perf_counter()
+    for i in range(calls):
+        tools.list_assignments(course_id=str(i), search_term="essay")
+        tools.create_assignment(course_id=str(i), name="Essay", points_possible="10")
+    return time.perf_counter() - start, adapter.sent_bytes
+
+def best_of(tools, calls, repeat):
+    """Fastest of several runs, with the bytes sent by one run."""
+    runs = [run_calls(tools, calls) for _ in range(repeat)]
+    return min(seconds for seconds, _ in runs), runs[0][1]
+
+def create_tools(tools_class, trust_env=True):
+    """Instantiate tools_class with API_TRUST_ENV set as given."""
+    previous = os.environ.get("API_TRUST_ENV")
+    os.environ["API_TRUST_ENV"] = "true" if trust_env else "false"
+    try:
+        return tools_class()
+    finally:
+        if previous is None:
+            del os.environ["API_TRUST_ENV"]
+        else:
+            os.environ["API_TRUST_ENV"] = previous
+
+def compare(calls, repeat):
+    """Return (seconds, bytes sent) of the legacy, generated and generated without trust_env variants."""
+    with tempfile.TemporaryDirectory() as directory:
+        tools_class = load_generated_tools(directory)
+        return {
+            "legacy": best_of(create_tools(legacy_tools(tools_class)), calls, repeat),
+            "generated": best_of(create_tools(tools_class), calls, repeat),
+            "generated, API_TRUST_ENV=false": best_of(create_tools(tools_class, trust_env=False), calls, repeat),
+        }
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark generated tool methods against the legacy dispatch")
+    parser.add_argument("--calls", type=int, default=2000,
+                        help="Number of list+create call pairs per run (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs per variant; the fastest is reported (default: 3)")
+    args = parser.parse_args()
+
+    results = compare(args.calls, args.repeat)
+
+    calls = args.calls * 2
+    print(f"{calls} calls per run")
+    for variant, (seconds, sent_bytes) in results.items():
+        print(f"  - {variant + ':':31} {seconds / calls * 1e6:6.1f} us/call, {sent_bytes / calls:6.1f} bytes/call")
+    assert results["generated"][1] < results["legacy"][1], "Generated methods should send fewer bytes"
+    assert results["generated, API_TRUST_ENV=false"][0] < results["legacy"][0], \
+        "Generated methods should have less per-call overhead with API_TRUST_ENV=false"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for the OpenAPI Loaders
+
+For each spec this script runs, in a fresh process each:
+1. Eager: json.load the whole spec, index it and render the first tool
+2. Lazy: scan the spec with LazySpec, decode only the first group and render it
+3. Compiled: load the compiled artifact (built beforehand), index and render
+
+and prints the peak RSS of each process and the time until the first tool's
+code was rendered.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+OPENAPI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "openapi")
+DEFAULT_SPECS = [
+    os.path.join(OPENAPI_DIR, "openapi.json"),
+    os.path.join(OPENAPI_DIR, "openapi_for_canvas.json"),
+]
+
+def first_tool_eager(openapi_file):
+    """Render the first group's tool after loading the whole spec."""
+    from openapi_parser import build_index, render_group
+    with open(openapi_file, "r", encoding="utf-8") as f:
+        openapi = json.load(f)
+    index = build_index(openapi, "auto")
+    tag = next(iter(index["groups"]))
+    return render_group(tag, openapi, index)
+
+def first_tool_lazy(openapi_file):
+    """Render the first group's tool decoding only what it needs."""
+    from openapi_loader import LazySpec
+    from openapi_parser import index_groups, index_operations, render_group
+    spec = LazySpec.from_file(openapi_file)
+    groups = index_groups(spec.operations(), "auto")
+    tag = next(iter(groups))
+    openapi = spec.subset(groups[tag])
+    return render_group(tag, openapi, index_operations(openapi, {tag: groups[tag]}))
+
+def first_tool_compiled(openapi_file):
+    """Render the first group's tool from the compiled spec artifact."""
+    from openapi_loader import load_compiled_spec
+    from openapi_parser import index_groups, index_operations, render_group
+    compiled = load_compiled_spec(openapi_file)
+    openapi = compiled.openapi
+    operations = (
+        (path, method, operation)
+        for path, methods in openapi["paths"].items()
+        for method, operation in methods.items()
+    )
+    groups = index_groups(operations, "auto")
+    tag = next(iter(groups))
+    return render_group(tag, openapi, index_operations(openapi, {tag: groups[tag]}, compiled))
+
+def run_child(mode, openapi_file):
+    """Measure one mode in this (fresh) process and print the result as JSON."""
+    sys.path.insert(0, OPENAPI_DIR)
+    import openapi_loader, openapi_parser  # noqa: F401  imports are not part of the measurement
+    start = time.perf_counter()
+    if mode == "eager":
+        first_tool_eager(openapi_file)
+    elif mode == "lazy":
+        first_tool_lazy(openapi_file)
+    elif mode == "compiled":
+        first_tool_compiled(openapi_file)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "peak_kb": peak_kb}))
+
+def measure(mode, openapi_file):
+    """Run one mode in a child process and return its measurements."""
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--openapi", openapi_file]
+    )
+    return json.loads(output)
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark eager, lazy and compiled OpenAPI loading")
+    parser.add_argument("--openapi", action="append",
+                        help="Path to an OpenAPI schema file; may be repeated "
+                             "(default: openapi.json and openapi_for_canvas.json)")
+    parser.add_argument("--child", choices=["baseline", "eager", "lazy", "compiled"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.openapi[0])
+        return
+
+    for openapi_file in args.openapi or DEFAULT_SPECS:
+        size_mb = os.path.getsize(openapi_file) / 1024 / 1024
+        baseline = measure("baseline", openapi_file)
+        # Build the compiled artifact up front; only loading it is measured
+        sys.path.insert(0, OPENAPI_DIR)
+        from openapi_loader import load_compiled_spec
+        load_compiled_spec(openapi_file)
+        print(f"Spec: {openapi_file} ({size_mb:.1f} MB)")
+        for mode in ["eager", "lazy", "compiled"]:
+            result = measure(mode, openapi_file)
+            extra_mb = (result["peak_kb"] - baseline["peak_kb"]) / 1024
+            print(f"  - {mode:8}: first tool in {result['seconds'] * 1000:6.1f} ms, "
+                  f"peak RSS {result['peak_kb'] / 1024:5.1f} MB (+{extra_mb:.1f} MB over interpreter)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for the OpenAPI Parser
+
+This script:
+1. Loads an OpenAPI schema (by default the full Canvas spec)
+2. Builds every per-tag subset the way process_openapi did before indexing
+   (one scan of all paths per tag)
+3. Builds the same subsets from a single build_index pass
+4. Prints both timings and the speedup
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "openapi"))
+
+from openapi_parser import build_index, create_subset_openapi, find_schema_refs
+
+DEFAULT_SPEC = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "openapi", "openapi_for_canvas.json"
+)
+
+def tag_untagged_operations(openapi):
+    """Give untagged operations a tag from their first path segment after the version."""
+    for path, methods in openapi["paths"].items():
+        segments = [s for s in path.strip("/").split("/") if s and not s.startswith("{")]
+        if segments and segments[0] in ["v1", "api"]:
+            segments = segments[1:]
+        for operation in methods.values():
+            if not operation.get("tags"):
+                operation["tags"] = [segments[0] if segments else "default"]
+
+def legacy_subsets(openapi):
+    """Per-tag subsets computed by rescanning all paths for every tag."""
+    components_schemas = openapi.get("components", {}).get("schemas", {})
+    tags = []
+    for methods in openapi["paths"].values():
+        for operation in methods.values():
+            for tag in operation.get("tags", ["default"]):
+                if tag not in tags:
+                    tags.append(tag)
+
+    subsets = {}
+    for tag in tags:
+        used = set()
+        subset_paths = {}
+        for path, methods in openapi["paths"].items():
+            for method, operation in methods.items():
+                if tag in operation.get("tags", []):
+                    subset_paths.setdefault(path, {})[method] = operation
+                    used |= find_schema_refs(operation)
+        schemas = {}
+
+        def add_ref_schemas(name):
+            if name not in components_schemas or name in schemas:
+                return
+            schemas[name] = components_schemas[name]
+            for prop in (components_schemas[name].get("properties") or {}).values():
+                if not isinstance(prop, dict):
+                    continue
+                ref = prop.get("$ref") or (prop.get("items") or {}).get("$ref", "")
+                if ref.startswith("#/components/schemas/"):
+                    add_ref_schemas(ref.split("/")[-1])
+
+        for name in used:
+            add_ref_schemas(name)
+        subsets[tag] = (subset_paths, schemas)
+    return subsets
+
+def indexed_subsets(openapi):
+    """Per-tag subsets computed from one build_index pass."""
+    index = build_index(openapi)
+    components_schemas = openapi.get("components", {}).get("schemas", {})
+    return {
+        tag: create_subset_openapi(tag, openapi["paths"], components_schemas, openapi["info"], index)
+        for tag in index["groups"]
+    }
+
+def best_of(function, openapi, repeat):
+    """Run function several times and return the fastest run and its result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(openapi)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark per-tag subsetting in the OpenAPI parser")
+    parser.add_argument("--openapi", default=DEFAULT_SPEC,
+                        help="Path to OpenAPI schema file (default: openapi_for_canvas.json)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs per variant; the fastest is reported (default: 3)")
+    args = parser.parse_args()
+
+    with open(args.openapi, "r", encoding="utf-8") as f:
+        openapi = json.load(f)
+    tag_untagged_operations(openapi)
+
+    operations = sum(len(methods) for methods in openapi["paths"].values())
+    legacy_time, legacy = best_of(legacy_subsets, openapi, args.repeat)
+    indexed_time, indexed = best_of(indexed_subsets, openapi, args.repeat)
+
+    # Both variants must select the same operations for every tag
+    for tag, (subset_paths, _) in legacy.items():
+        assert subset_paths == indexed[tag]["paths"], f"Path mismatch for tag {tag}"
+
+    print(f"Spec: {args.openapi}")
+    print(f"  - {operations} operations in {len(legacy)} tags")
+    print(f"  - Rescan per tag: {legacy_time * 1000:.1f} ms")
+    print(f"  - Single index:   {indexed_time * 1000:.1f} ms")
+    print(f"  - Speedup:        {legacy_time / indexed_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Tests for the Open WebUI Canvas tool
+
+These tests run the tool against a local fake Canvas server that:
+1. Serves courses, assignments and modules with Canvas-style Link pagination
+2. Honours per_page (last value wins, as in Rails), enrollment_state and
+   bucket=future
+3. Records every request and the token it was sent with, so the tests can
+   count round trips
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pytest
+
+pytest.importorskip("canvasapi")
+pytest.importorskip("pydantic")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interfaces"))
+
+import canvas_owui_tool
+
+COURSES = 60
+ACTIVE_COURSES = 12
+ASSIGNMENTS_PER_COURSE = 150
+
+def canvas_time(moment):
+    """Format a datetime the way Canvas does."""
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class FakeCanvas:
+    """A threaded HTTP server answering a small subset of the Canvas API."""
+
+    def __init__(self):
+        now = datetime.now(timezone.utc)
+        self.requests = []
+        self.tokens = []
+        self.courses = [
+            {
+                "id": course_id,
+                "name": f"Course {course_id}",
+                "enrollments": [{
+                    "type": "student",
+                    "enrollment_state": "active" if course_id <= ACTIVE_COURSES else "completed",
+                }],
+            }
+            for course_id in range(1, COURSES + 1)
+        ]
+        self.assignments = {
+            course["id"]: [
+                {
+                    "id": course["id"] * 1000 + number,
+                    "name": f"Assignment {number}",
+                    "course_id": course["id"],
+                    "description": "<p>Write <b>an essay</b> &amp; submit it.</p>" * 50,
+                    "created_at": "2024-01-01T00:00:00Z",
+                    "updated_at": "2024-01-02T00:00:00Z",
+                    "due_at": canvas_time(now + timedelta(days=number - 140, hours=1)),
+                    "points_possible": 10,
+                    "lock_at": None,
+                }
+                for number in range(ASSIGNMENTS_PER_COURSE)
+            ]
+            for course in self.courses
+        }
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                fake.requests.append((url.path, {key: values[-1] for key, values in query.items()}))
+                fake.tokens.append(self.headers.get("Authorization"))
+
+                match = re.fullmatch(r"/api/v1/courses/(\d+)/assignments/(\d+)", url.path)
+                if match:
+                    found = [a for a in fake.assignments[int(match[1])] if a["id"] == int(match[2])]
+                    return self.reply(found[0] if found else {"errors": [{"message": "not found"}]},
+                                      status=200 if found else 404)
+
+                if url.path == "/api/v1/courses":
+                    items = fake.courses
+                    state = query.get("enrollment_state", [None])[-1]
+                    if state:
+                        items = [c for c in items if c["enrollments"][0]["enrollment_state"] == state]
+                elif re.fullmatch(r"/api/v1/courses/\d+/assignments", url.path):
+                    items = fake.assignments[int(url.path.split("/")[4])]
+                    if query.get("bucket", [None])[-1] == "future":
+                        now = canvas_time(datetime.now(timezone.utc))
+                        items = [a for a in items if a["due_at"] is None or a["due_at"] > now]
+                elif re.fullmatch(r"/api/v1/courses/\d+/modules", url.path):
+                    items = [{"id": 1, "name": "Week 1", "position": 1, "published": True}]
+                else:
+                    return self.reply({"errors": [{"message": "not found"}]}, status=404)
+
+                # Canvas defaults to 10 per page; Rails keeps the last value of a repeated parameter
+                per_page = int(query.get("per_page", ["10"])[-1])
+                page = int(query.get("page", ["1"])[-1])
+                links = []
+                if page * per_page < len(items):
+                    next_query = {key: values[-1] for key, values in query.items()}
+                    next_query.update(page=page + 1, per_page=per_page)
+                    links.append(f'<{fake.url}{url.path}?{urlencode(next_query)}>; rel="next"')
+                self.reply(items[(page - 1) * per_page:page * per_page], links)
+
+            def reply(self, data, links=(), status=200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if links:
+                    self.send_header("Link", ", ".join(links))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+@pytest.fixture
+def fake_canvas():
+    fake = FakeCanvas()
+    yield fake
+    fake.close()
+
+@pytest.fixture
+def tools(fake_canvas):
+    tools = canvas_owui_tool.Tools()
+    tools.valves.canvas_domain = fake_canvas.url
+    tools.valves.api_token = "test-token"
+    return tools
+
+def test_list_courses_fetches_active_courses_in_one_page(fake_canvas, tools):
+    courses = tools.list_courses()
+
+    assert len(courses) == ACTIVE_COURSES
+    assert len(fake_canvas.requests) == 1
+    path, params = fake_canvas.requests[0]
+    assert path == "/api/v1/courses"
+    assert params["per_page"] == "100"
+    assert params["enrollment_state"] == "active"
+
+def test_empty_enrollment_state_lists_all_courses(fake_canvas, tools):
+    tools.valves.course_enrollment_state = ""
+
+    assert len(tools.list_courses()) == COURSES
+    assert len(fake_canvas.requests) == 1
+    assert "enrollment_state" not in fake_canvas.requests[0][1]
+
+def test_list_assignments_costs_only_its_pages(fake_canvas, tools):
+    assignments = tools.list_assignments(3, max_bytes=None)
+
+    assert len(assignments) == ASSIGNMENTS_PER_COURSE
+    # 150 assignments at 100 per page, and no get_course round trip
+    assert [path for path, _ in fake_canvas.requests] == ["/api/v1/courses/3/assignments"] * 2
+
+def test_repeated_calls_are_cached_until_refresh(fake_canvas, tools):
+    first = tools.list_assignments(3)
+    assert len(fake_canvas.requests) == 2
+
+    assert tools.list_assignments(3) == first
+    assert len(fake_canvas.requests) == 2
+    assert tools.cache_stats == {"hits": 1, "misses": 1}
+
+    tools.list_assignments(3, refresh=True)
+    assert len(fake_canvas.requests) == 4
+
+def test_changing_credentials_drops_course_handles(fake_canvas, tools):
+    tools.list_courses()
+    tools.valves.api_token = "other-token"
+    tools.list_assignments(3)
+
+    assert fake_canvas.tokens == ["Bearer test-token"] + ["Bearer other-token"] * 2
+    tools.valves.api_token = "test-token"
+    # The other user's result is not served for these credentials
+    tools.list_assignments(3)
+    assert fake_canvas.tokens[3:] == ["Bearer test-token"] * 2
+
+def test_list_upcoming_due_fans_out_over_future_assignments(fake_canvas, tools):
+    upcoming = tools.list_upcoming_due(days=7, max_bytes=None)
+
+    # Assignments 140..146 fall within the next 7 days in every active course
+    assert len(upcoming) == ACTIVE_COURSES * 7
+    assert [item["due_at"] for item in upcoming] == sorted(item["due_at"] for item in upcoming)
+    assert {item["course_id"] for item in upcoming} == set(range(1, ACTIVE_COURSES + 1))
+    # One courses page, then one page of future assignments per active course
+    assert len(fake_canvas.requests) == 1 + ACTIVE_COURSES
+    assert all(params.get("bucket") == "future" for path, params in fake_canvas.requests[1:])
+
+def test_get_assignment_details_is_compact(fake_canvas, tools):
+    details = tools.get_assignment_details(2, 2005)
+
+    assert details["name"] == "Assignment 5"
+    assert "lock_at" not in details
+    assert "<p>" not in details["description"]
+    assert len(json.dumps(details)) <= canvas_owui_tool.DEFAULT_MAX_RESPONSE_BYTES
+    assert [path for path, _ in fake_canvas.requests] == ["/api/v1/courses/2/assignments/2005"]
+
+def test_unknown_fields_are_ignored(fake_canvas, tools):
+    details = tools.get_assignment_details(2, 2005, fields=["edit", "_requester", "name"])
+    listed = tools.list_assignments(2, fields=["_requester"], max_bytes=None)
+
+    assert details == {"name": "Assignment 5"}
+    assert set(listed[0]) == {"id", "name", "created_at", "updated_at", "due_at"}
+    json.dumps([details, listed])
+
+def test_list_modules_tolerates_missing_keys(fake_canvas, tools):
+    # The fake server omits unlock_at, state, items_url and the other optional keys
+    modules = tools.list_modules(4)
+
+    assert modules == [{"id": 1, "name": "Week 1", "position": 1, "published": True}]
+    assert tools.list_modules(4, fields=["name", "delete", "_requester"]) == [{"name": "Week 1"}]
+
+def test_compact_only_reduces_html_fields():
+    compacted = canvas_owui_tool._compact({
+        "name": "Implement List<T> where a<b and c>d",
+        "description": "<p>Use <b>generics</b></p>",
+        "lock_at": None,
+    })
+
+    assert compacted == {"name": "Implement List<T> where a<b and c>d", "description": "Use generics"}
+
+def test_get_assignment_details_decodes_entities_once(fake_canvas, tools):
+    fake_canvas.assignments[2][5]["description"] = "<p>Use &lt;div&gt; tags</p>"
+
+    assert tools.get_assignment_details(2, 2005)["description"] == "Use <div> tags"
+    # Served from the cache with a budget: only the size is enforced again
+    details = tools.get_assignment_details(2, 2005, max_bytes=4000)
+    assert details["description"] == "Use <div> tags"
+
+def test_course_stub_uses_the_client_requester(fake_canvas, tools):
+    canvas = tools.canvas
+    course = canvas_owui_tool._course_stub(canvas, 7)
+
+    assert course.id == 7
+    assert course._requester is canvas._Canvas__requester
+    assert fake_canvas.requests == []
+
+def test_course_stub_falls_back_to_get_course():
+    class Client:
+        """A client without canvasapi's private requester attribute."""
+
+        def __init__(self):
+            self.fetched = []
+
+        def get_course(self, course_id):
+            self.fetched.append(course_id)
+            return "course"
+
+    client = Client()
+
+    assert canvas_owui_tool._course_stub(client, 7) == "course"
+    assert client.fetched == [7]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
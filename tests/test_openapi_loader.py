@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for the OpenAPI loader
+
+These tests check the reference graph between component schemas:
+1. References are found in every keyword (allOf, additionalProperties...)
+2. Closures are transitive and handle reference cycles
+3. Closures survive the round trip through the compiled artifact
+4. Subsets keep the schemas that retained components reference
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "openapi"))
+
+import openapi_loader
+from openapi_loader import RefGraph
+
+def ref(name):
+    return {"$ref": f"#/components/schemas/{name}"}
+
+SCHEMAS = {
+    # A cycle: Parent -> Child -> Parent
+    "Parent": {"type": "object", "properties": {"children": {"type": "array", "items": ref("Child")}}},
+    "Child": {"type": "object", "properties": {"parent": ref("Parent"), "tag": ref("Tag")}},
+    "Tag": {"type": "string"},
+    # Composition and maps
+    "Admin": {"allOf": [ref("User"), {"type": "object", "properties": {"role": ref("Role")}}]},
+    "User": {"type": "object", "properties": {"name": {"type": "string"}}},
+    "Role": {"type": "string", "enum": ["owner", "member"]},
+    "Directory": {"type": "object", "additionalProperties": ref("Admin")},
+    # Self reference and a dangling reference
+    "Node": {"type": "object", "properties": {"next": ref("Node"), "extra": ref("Missing")}},
+    "Unused": {"type": "integer"},
+}
+
+def test_find_schema_refs_covers_every_keyword():
+    assert openapi_loader.find_schema_refs(SCHEMAS["Admin"]) == {"User", "Role"}
+    assert openapi_loader.find_schema_refs(SCHEMAS["Directory"]) == {"Admin"}
+    assert openapi_loader.find_schema_refs({"oneOf": [ref("A"), {"$ref": "B"}], "anyOf": [ref("C")]}) == {"A", "B", "C"}
+
+def test_cycle_members_share_their_closure():
+    graph = RefGraph(SCHEMAS)
+
+    assert graph.closure("Parent") == {"Parent", "Child", "Tag"}
+    assert graph.closure("Child") == graph.closure("Parent")
+    assert graph.closure("Tag") == {"Tag"}
+
+def test_closures_follow_all_of_and_additional_properties():
+    graph = RefGraph(SCHEMAS)
+
+    assert graph.closure("Admin") == {"Admin", "User", "Role"}
+    assert graph.closure("Directory") == {"Directory", "Admin", "User", "Role"}
+
+def test_self_and_dangling_references():
+    graph = RefGraph(SCHEMAS)
+
+    assert "Missing" not in graph.edges["Node"]
+    assert graph.closure("Node") == {"Node"}
+    assert graph.closure("Missing") == frozenset()
+
+def test_closure_of_unions_closures():
+    graph = RefGraph(SCHEMAS)
+
+    assert graph.closure_of(["Directory", "Child"]) == {"Directory", "Admin", "User", "Role", "Parent", "Child", "Tag"}
+    assert graph.closure_of([]) == set()
+
+def test_long_chains_do_not_recurse():
+    count = 5000
+    schemas = {f"S{n}": ref(f"S{n + 1}") for n in range(count)}
+    schemas[f"S{count}"] = ref("S0")
+
+    assert len(RefGraph(schemas).closure("S0")) == count + 1
+
+def test_compiled_closures_match_the_graph():
+    spec = {"openapi": "3.1.0", "info": {}, "paths": {}, "components": {"schemas": SCHEMAS}}
+    compiled = openapi_loader.CompiledSpec(openapi_loader.compile_spec(spec, "digest"))
+
+    assert compiled.ref_graph().closures() == RefGraph(SCHEMAS).closures()
+
+# Schemas S and T are only reachable through components.responses
+COMPONENT_REF_SPEC = {
+    "openapi": "3.1.0",
+    "info": {"title": "Components", "version": "1"},
+    "paths": {
+        "/things": {"get": {
+            "tags": ["things"],
+            "responses": {"404": {"$ref": "#/components/responses/NotFound"}},
+        }},
+        "/other": {"get": {"tags": ["other"], "responses": {"200": {"description": "OK"}}}},
+    },
+    "components": {
+        "schemas": {"S": {"properties": {"t": ref("T")}}, "T": {"type": "string"}, "Unused": {"type": "integer"}},
+        "responses": {"NotFound": {"description": "Not found", "content": {"application/json": {"schema": ref("S")}}}},
+    },
+}
+
+def test_subsets_keep_schemas_referenced_by_other_components(tmp_path):
+    spec_file = tmp_path / "spec.json"
+    spec_file.write_text(json.dumps(COMPONENT_REF_SPEC))
+
+    lazy = openapi_loader.LazySpec.from_file(str(spec_file)).subset([("/things", "get")])
+    compiled = openapi_loader.load_compiled_spec(str(spec_file))
+
+    assert sorted(lazy["components"]["schemas"]) == ["S", "T"]
+    assert compiled.tag_subset(["things"])["components"] == lazy["components"]
+    assert sorted(compiled.tag_subset(["things", "other"])["components"]["schemas"]) == ["S", "T"]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
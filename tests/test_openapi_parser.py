@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Tests for the OpenAPI parser
+
+These tests generate tools from tests/test_openapi.json in a temporary
+directory and check that incremental generation:
+1. Leaves the files of unchanged groups alone
+2. Deletes the files and manifest entries of groups that are gone
+3. Regenerates everything with force or a changed generator, and keeps
+   other groups' entries with only_groups
+
+They also check how untagged operations are grouped by path, operationId or
+a group map file.
+"""
+
+import asyncio
+import importlib.util
+import inspect
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "openapi"))
+
+import openapi_parser
+
+TEST_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_openapi.json")
+
+GROUPS = ["items", "users"]
+
+@pytest.fixture
+def spec_file(tmp_path):
+    """A copy of the test spec, so its compiled artifact is written to tmp_path."""
+    spec_file = tmp_path / "spec.json"
+    shutil.copy(TEST_SPEC, spec_file)
+    return spec_file
+
+@pytest.fixture
+def output_dir(tmp_path):
+    return tmp_path / "tools"
+
+def generate(spec_file, output_dir, **options):
+    openapi_parser.process_openapi(str(spec_file), str(output_dir), **options)
+
+def manifest(output_dir):
+    with open(output_dir / openapi_parser.MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)["groups"]
+
+def mtimes(output_dir):
+    return {path.name: path.stat().st_mtime_ns for path in output_dir.iterdir()
+            if path.name != openapi_parser.MANIFEST_FILE}
+
+def age(output_dir):
+    """Move every generated file an hour into the past, so rewrites show up in mtimes."""
+    for path in output_dir.iterdir():
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 3600 * 10**9))
+
+def test_generates_tools_and_manifest(spec_file, output_dir):
+    generate(spec_file, output_dir)
+
+    assert sorted(manifest(output_dir)) == GROUPS
+    assert sorted(mtimes(output_dir)) == sorted(name for tag in GROUPS for name in openapi_parser.group_files(tag))
+    for tag in GROUPS:
+        assert manifest(output_dir)[tag]["files"] == openapi_parser.group_files(tag)
+
+def test_second_run_skips_unchanged_groups(spec_file, output_dir, capsys):
+    generate(spec_file, output_dir)
+    age(output_dir)
+    before = mtimes(output_dir)
+    capsys.readouterr()
+
+    generate(spec_file, output_dir)
+
+    assert mtimes(output_dir) == before
+    assert "Skipped 2 unchanged groups" in capsys.readouterr().out
+
+def test_changed_group_is_rewritten(spec_file, output_dir):
+    generate(spec_file, output_dir)
+    age(output_dir)
+    before = mtimes(output_dir)
+
+    spec = json.loads(spec_file.read_text())
+    spec["paths"]["/users"]["get"]["summary"] = "List all users"
+    spec_file.write_text(json.dumps(spec))
+    generate(spec_file, output_dir)
+
+    after = mtimes(output_dir)
+    assert after["items_tool.py"] == before["items_tool.py"]
+    assert after["users_tool.py"] > before["users_tool.py"]
+
+def test_generator_changes_rewrite_every_group(spec_file, output_dir, monkeypatch):
+    generate(spec_file, output_dir)
+    age(output_dir)
+    before = mtimes(output_dir)
+
+    # As if generate_method had been edited between the runs
+    monkeypatch.setattr(openapi_parser, "_generator_hashes", {"sync": "changed generator"})
+    generate(spec_file, output_dir)
+
+    after = mtimes(output_dir)
+    assert all(after[name] > before[name] for name in before)
+
+def test_generator_hash_covers_the_generator_source(tmp_path):
+    with open(openapi_parser.__file__, encoding="utf-8") as f:
+        source = f.read()
+    edited_file = tmp_path / "edited_parser.py"
+    edited_file.write_text(source.replace("def generate_method(", "# edited\ndef generate_method(", 1))
+    module_spec = importlib.util.spec_from_file_location("edited_parser", edited_file)
+    edited = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(edited)
+
+    assert edited.GENERATION_TARGETS == openapi_parser.GENERATION_TARGETS
+    assert edited.generator_hash("sync") != openapi_parser.generator_hash("sync")
+    assert openapi_parser.generator_hash("sync") != openapi_parser.generator_hash("async")
+
+def test_deleted_file_is_regenerated(spec_file, output_dir):
+    generate(spec_file, output_dir)
+    (output_dir / "users_tool.py").unlink()
+
+    generate(spec_file, output_dir)
+
+    assert (output_dir / "users_tool.py").exists()
+
+def test_removed_group_is_deleted(spec_file, output_dir):
+    generate(spec_file, output_dir)
+
+    spec = json.loads(spec_file.read_text())
+    spec["paths"] = {path: methods for path, methods in spec["paths"].items() if not path.startswith("/items")}
+    spec_file.write_text(json.dumps(spec))
+    generate(spec_file, output_dir)
+
+    assert sorted(manifest(output_dir)) == ["users"]
+    assert sorted(mtimes(output_dir)) == sorted(openapi_parser.group_files("users"))
+
+def test_force_regenerates_every_group(spec_file, output_dir):
+    generate(spec_file, output_dir)
+    age(output_dir)
+    before = mtimes(output_dir)
+
+    generate(spec_file, output_dir, force=True)
+
+    after = mtimes(output_dir)
+    assert all(after[name] > before[name] for name in before)
+    assert sorted(manifest(output_dir)) == GROUPS
+
+def test_force_still_deletes_removed_groups(spec_file, output_dir):
+    generate(spec_file, output_dir)
+
+    spec = json.loads(spec_file.read_text())
+    spec["paths"] = {path: methods for path, methods in spec["paths"].items() if not path.startswith("/items")}
+    spec_file.write_text(json.dumps(spec))
+    generate(spec_file, output_dir, force=True)
+
+    assert sorted(mtimes(output_dir)) == sorted(openapi_parser.group_files("users"))
+
+def test_only_groups_keeps_other_manifest_entries(spec_file, output_dir):
+    generate(spec_file, output_dir)
+    entries = manifest(output_dir)
+    age(output_dir)
+    before = mtimes(output_dir)
+
+    generate(spec_file, output_dir, only_groups=["users"], force=True)
+
+    after = mtimes(output_dir)
+    assert manifest(output_dir) == entries
+    assert after["items_tool.py"] == before["items_tool.py"]
+    assert after["users_tool.py"] > before["users_tool.py"]
+
+def test_only_groups_does_not_delete_other_groups(spec_file, output_dir):
+    generate(spec_file, output_dir, only_groups=["users"])
+    generate(spec_file, output_dir, only_groups=["items"])
+
+    assert sorted(manifest(output_dir)) == GROUPS
+    assert sorted(mtimes(output_dir)) == sorted(name for tag in GROUPS for name in openapi_parser.group_files(tag))
+
+def untagged_spec(resources):
+    """A Canvas-like spec without tags: each course resource gets list/create/get/update/delete."""
+    paths = {
+        "/v1/courses": {"get": {"operationId": "list_courses"}},
+        "/v1/courses/{course_id}": {"get": {"operationId": "get_course"}, "put": {"operationId": "update_course"}},
+        "/v1/courses/{course_id}/search_users": {"get": {"operationId": "search_course_users"}},
+    }
+    for resource in resources:
+        paths[f"/v1/courses/{{course_id}}/{resource}"] = {
+            "get": {"operationId": f"list_{resource}"},
+            "post": {"operationId": f"create_{resource}"},
+        }
+        paths[f"/v1/courses/{{course_id}}/{resource}/{{id}}"] = {
+            method: {"operationId": f"{method}_{resource}"} for method in ["get", "put", "delete"]
+        }
+    for methods in paths.values():
+        for operation in methods.values():
+            operation["responses"] = {"200": {"description": "OK"}}
+    return {"openapi": "3.0.0", "info": {"title": "Untagged", "version": "1"}, "paths": paths}
+
+def operations_of(spec):
+    return ((path, method, operation) for path, methods in spec["paths"].items() for method, operation in methods.items())
+
+def test_path_group_skips_versions_and_contexts():
+    assert openapi_parser.path_group("/api/v1/courses/{course_id}/assignments/{id}") == "assignments"
+    assert openapi_parser.path_group("/api/v1/courses/{course_id}/assignments/{id}", context=True) == "courses"
+    assert openapi_parser.path_group("/v1/users/self/favorites/courses") == "favorites"
+    assert openapi_parser.path_group("/v1/courses") == "courses"
+    assert openapi_parser.path_group("/v1/{id}") == "default"
+
+def test_untagged_operations_are_grouped_by_resource():
+    groups = openapi_parser.index_groups(operations_of(untagged_spec(["assignments", "modules"])), group_by="auto")
+
+    assert sorted(groups) == ["assignments", "courses", "modules"]
+    assert len(groups["assignments"]) == 5
+    # search_users is too small for its own group and joins its context
+    assert ("/v1/courses/{course_id}/search_users", "get") in groups["courses"]
+
+def test_groups_are_capped_at_max_operations():
+    groups = openapi_parser.index_groups(operations_of(untagged_spec(["assignments"])), "auto", max_operations=2)
+
+    assert sorted(groups) == ["assignments_1", "assignments_2", "assignments_3", "courses_1", "courses_2"]
+    assert all(len(operations) <= 2 for operations in groups.values())
+
+def test_operation_id_and_group_map_grouping():
+    spec = untagged_spec(["assignments"])
+
+    by_operation_id = openapi_parser.index_groups(operations_of(spec), "operation-id")
+    mapped = openapi_parser.index_groups(operations_of(spec), "auto", [("GET /v1/courses/*/assignments*", "Reading")])
+
+    assert sorted(by_operation_id) == ["create", "delete", "get", "list", "put", "search", "update"]
+    assert sorted(mapped["reading"]) == [
+        ("/v1/courses/{course_id}/assignments", "get"),
+        ("/v1/courses/{course_id}/assignments/{id}", "get"),
+    ]
+
+def test_untagged_spec_generates_one_tool_per_resource(tmp_path, output_dir):
+    spec_file = tmp_path / "untagged.json"
+    spec_file.write_text(json.dumps(untagged_spec(["assignments", "modules"])))
+
+    generate(spec_file, output_dir)
+
+    assert sorted(manifest(output_dir)) == ["assignments", "courses", "modules"]
+    assert "def list_assignments(" in (output_dir / "assignments_tool.py").read_text()
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Record the worker pools process_openapi starts."""
+    started = []
+
+    class RecordingPool(openapi_parser.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            started.append(kwargs.get("max_workers"))
+
+    monkeypatch.setattr(openapi_parser, "ProcessPoolExecutor", RecordingPool)
+    return started
+
+def contents(output_dir):
+    return {path.name: path.read_bytes() for path in output_dir.iterdir()}
+
+def test_parallel_run_matches_serial_run(tmp_path, pools, monkeypatch):
+    spec_file = tmp_path / "untagged.json"
+    spec_file.write_text(json.dumps(untagged_spec([f"resource{number}" for number in range(12)])))
+    monkeypatch.setattr(openapi_parser, "PARALLEL_MIN_OPERATIONS", 0)
+
+    generate(spec_file, tmp_path / "serial")
+    generate(spec_file, tmp_path / "parallel", jobs=2)
+
+    assert pools == [2]
+    assert contents(tmp_path / "parallel") == contents(tmp_path / "serial")
+    assert len(manifest(tmp_path / "parallel")) == 13
+
+def test_small_specs_are_generated_serially(spec_file, output_dir, pools):
+    generate(spec_file, output_dir, jobs=4)
+
+    assert pools == []
+    assert sorted(manifest(output_dir)) == GROUPS
+
+def load_tool(tool_file):
+    """Import a generated tool file as a module."""
+    module_spec = importlib.util.spec_from_file_location(tool_file.stem, tool_file)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module
+
+def test_async_target_generates_coroutine_methods(spec_file, output_dir, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    monkeypatch.setenv("API_BASE_URL", "http://api")
+    generate(spec_file, output_dir, target="async")
+    tool = load_tool(output_dir / "users_tool.py")
+    requests_sent = []
+
+    async def upstream(request):
+        requests_sent.append(request)
+        return httpx.Response(200, json={"path": request.url.path, "query": str(request.url.query, "ascii")})
+
+    async def main():
+        tools = tool.Tools()
+        tools._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream), headers=tools.headers)
+        results = await tool.run_concurrently([tools.get_user(user_id=user_id) for user_id in range(5)], limit=2)
+        listed = await tools.list_users(limit=3)
+        await tools._client.aclose()
+        return results, listed
+
+    for name in ["list_users", "create_user", "get_user", "delete_user"]:
+        assert inspect.iscoroutinefunction(getattr(tool.Tools, name))
+    results, listed = asyncio.run(main())
+
+    assert [result["path"] for result in results] == [f"/users/{user_id}" for user_id in range(5)]
+    # None-valued parameters are not sent
+    assert listed == {"path": "/users", "query": "limit=3"}
+    assert len(requests_sent) == 6
+
+def test_run_concurrently_bounds_calls_in_flight(spec_file, output_dir):
+    pytest.importorskip("httpx")
+    generate(spec_file, output_dir, target="async")
+    tool = load_tool(output_dir / "items_tool.py")
+    in_flight = []
+
+    async def call(number):
+        in_flight.append(1)
+        peak = len(in_flight)
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return {"number": number, "peak": peak}
+
+    results = asyncio.run(tool.run_concurrently([call(number) for number in range(6)], limit=2))
+
+    assert [result["number"] for result in results] == list(range(6))
+    assert max(result["peak"] for result in results) == 2
+
+def test_sync_tools_share_a_pooled_retrying_session(spec_file, output_dir, monkeypatch):
+    requests = pytest.importorskip("requests")
+    for name, value in {"API_BASE_URL": "http://api", "API_KEY": "secret", "API_POOL_SIZE": "4",
+                        "API_MAX_RETRIES": "5", "API_CONNECT_TIMEOUT": "2"}.items():
+        monkeypatch.setenv(name, value)
+    generate(spec_file, output_dir)
+    tools = load_tool(output_dir / "users_tool.py").Tools()
+
+    adapter = tools.session.get_adapter("http://api/users")
+    assert adapter.max_retries.total == 5
+    assert 429 in adapter.max_retries.status_forcelist and 503 in adapter.max_retries.status_forcelist
+    assert adapter._pool_maxsize == 4
+    assert tools.timeout == (2.0, 30.0)
+
+    sent = []
+
+    class RecordingAdapter(requests.adapters.BaseAdapter):
+        def send(self, request, **kwargs):
+            sent.append((request, kwargs))
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"ok": true}'
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    tools.session.mount("http://", RecordingAdapter())
+
+    assert tools.get_user(user_id=7) == {"ok": True}
+    assert tools.list_users(offset=5) == {"ok": True}
+    assert [(request.method, request.url) for request, _ in sent] == [
+        ("GET", "http://api/users/7"), ("GET", "http://api/users?offset=5")
+    ]
+    assert all(request.headers["Authorization"] == "Bearer secret" for request, _ in sent)
+    assert all(kwargs["timeout"] == (2.0, 30.0) for _, kwargs in sent)
+
+def test_generated_methods_are_cheaper_than_the_legacy_ones():
+    pytest.importorskip("requests")
+    import benchmark_generated_tools
+
+    results = benchmark_generated_tools.compare(calls=200, repeat=3)
+
+    # None values are no longer sent, and reading the environment once makes calls cheaper
+    assert results["generated"][1] < results["legacy"][1]
+    assert results["generated, API_TRUST_ENV=false"][0] < results["legacy"][0]
+
+def test_sync_tools_trust_the_environment_by_default(spec_file, output_dir, monkeypatch):
+    pytest.importorskip("requests")
+    monkeypatch.setenv("HTTP_PROXY", "http://proxy.example:3128")
+    generate(spec_file, output_dir)
+    tool = load_tool(output_dir / "items_tool.py")
+
+    assert tool.Tools().session.trust_env is True
+    monkeypatch.setenv("API_TRUST_ENV", "false")
+    opted_out = tool.Tools().session
+    assert opted_out.trust_env is False
+    assert opted_out.proxies["http"] == "http://proxy.example:3128"
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,738 @@
+#!/usr/bin/env python3
+"""
+Tests for the OpenAPI proxy
+
+The target server is replaced by an httpx.MockTransport, so these tests
+exercise the proxy's own behaviour without a network:
+1. Configuration sources and their precedence
+2. Route matching against the served schema
+3. The response cache (keys, TTLs, eviction, revalidation, invalidation)
+4. Request coalescing and rate-limit-aware scheduling
+5. Link-header pagination
+6. Metrics and their exposition endpoint
+
+State lives in the default memory backend unless a test says otherwise.
+"""
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "tools", "proxy"))
+
+import openapi_proxy
+
+class Upstream:
+    """Mock target server that records requests and answers with respond(request)."""
+
+    def __init__(self, respond=None):
+        self.requests = []
+        self.respond = respond or (lambda request: httpx.Response(200, json={"path": request.url.path}))
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        return self.respond(request)
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    for name in list(os.environ):
+        if name.startswith(openapi_proxy.ENV_PREFIX):
+            monkeypatch.delenv(name)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the response cache clock with one the test advances by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(openapi_proxy.ResponseCache, "clock", staticmethod(lambda: now[0]))
+    return now
+
+@pytest.fixture
+def use_upstream(monkeypatch):
+    """use_upstream(upstream) points the proxy's shared HTTP client at a mock upstream."""
+    def use(upstream):
+        monkeypatch.setattr(openapi_proxy, "client", httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+        return upstream
+    return use
+
+@pytest.fixture
+def start_proxy(monkeypatch):
+    """start_proxy(upstream, **settings) runs the proxy app in front of a mock upstream."""
+    test_clients = []
+
+    def start(upstream, **settings):
+        monkeypatch.setattr(
+            openapi_proxy, "create_http_client",
+            lambda: httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        )
+        openapi_proxy.create_app({"target_url": "http://upstream", "enforce_routes": False, **settings})
+        test_client = TestClient(openapi_proxy.app)
+        test_client.__enter__()
+        test_clients.append(test_client)
+        return test_client
+
+    yield start
+    for test_client in test_clients:
+        test_client.__exit__(None, None, None)
+    openapi_proxy._pending_requests.clear()
+
+def test_handed_off_settings_override_environment_variables(monkeypatch):
+    monkeypatch.setenv("OPENAPI_PROXY_TARGET_URL", "http://from-env")
+    monkeypatch.setenv("OPENAPI_PROXY_MAX_PAGES", "7")
+    monkeypatch.setenv(openapi_proxy.SETTINGS_ENV, json.dumps({"target_url": "http://from-cli"}))
+
+    settings = openapi_proxy.load_config()
+
+    assert settings["target_url"] == "http://from-cli"
+    # Keys the handed-off settings leave out still come from the environment
+    assert settings["max_pages"] == 7
+
+def test_environment_variables_override_config_file(monkeypatch, tmp_path):
+    config_file = tmp_path / "proxy.json"
+    config_file.write_text(json.dumps({"target_url": "http://from-file", "read_timeout": 12}))
+    monkeypatch.setenv("OPENAPI_PROXY_TARGET_URL", "http://from-env")
+
+    settings = openapi_proxy.load_config(str(config_file))
+
+    assert settings["target_url"] == "http://from-env"
+    assert settings["read_timeout"] == 12.0
+
+def test_route_ttls_from_environment(monkeypatch):
+    monkeypatch.setenv("OPENAPI_PROXY_CACHE_ROUTE_TTLS", "/v1/courses/*=300, /v1/users/*=60")
+
+    assert openapi_proxy.load_config()["cache_route_ttls"] == [("/v1/courses/*", 300.0), ("/v1/users/*", 60.0)]
+
+def test_route_ttls_from_json(monkeypatch):
+    monkeypatch.setenv("OPENAPI_PROXY_CACHE_ROUTE_TTLS", '[["/v1/*", 60], "/v2/*=5"]')
+
+    assert openapi_proxy.load_config()["cache_route_ttls"] == [("/v1/*", 60.0), ("/v2/*", 5.0)]
+
+def test_invalid_route_ttl_is_rejected(monkeypatch):
+    monkeypatch.setenv("OPENAPI_PROXY_CACHE_ROUTE_TTLS", "60")
+
+    with pytest.raises(ValueError):
+        openapi_proxy.load_config()
+
+def test_sqlite_state_waits_for_locks_off_the_event_loop(tmp_path):
+    state_path = str(tmp_path / "state.db")
+    cache = openapi_proxy.SQLiteResponseCache(10000, 60, [], state_path)
+    key = openapi_proxy.request_key("GET", "v1/courses", [], "Bearer a")
+    response = httpx.Response(200, content=b"[]")
+    # Another worker holds the write lock for a while
+    other_worker = openapi_proxy.connect_state_db(state_path)
+    other_worker.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        store = asyncio.create_task(cache.run(cache.store, key, response))
+        await asyncio.sleep(0.3)
+        assert not store.done()
+        other_worker.execute("COMMIT")
+        await store
+        ticker.cancel()
+        return ticks
+
+    # The loop kept running while the store waited for the lock
+    assert asyncio.run(main()) >= 10
+    assert cache.get(key)["body"] == b"[]"
+
+@pytest.fixture
+def spec_file(tmp_path):
+    """A copy of tests/test_openapi.json, so its compiled artifact is written to tmp_path."""
+    spec_file = tmp_path / "openapi.json"
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_openapi.json"), spec_file)
+    return str(spec_file)
+
+def test_sqlite_cache_hits_do_not_write_until_eviction(tmp_path):
+    cache = openapi_proxy.SQLiteResponseCache(100, 60, [], str(tmp_path / "state.db"))
+    keys = [openapi_proxy.request_key("GET", path, [], "Bearer a") for path in ["/a", "/b", "/c"]]
+    response = httpx.Response(200, content=b"x" * 40)
+    cache.store(keys[0], response)
+    cache.store(keys[1], response)
+    time.sleep(0.01)
+    writes = cache.db.total_changes
+
+    for _ in range(5):
+        assert cache.get(keys[0]) is not None
+    assert cache.db.total_changes == writes
+
+    # The buffered hit still makes /b the least recently used entry
+    cache.store(keys[2], response)
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+
+def test_sqlite_cache_writes_hits_out_periodically(tmp_path):
+    cache = openapi_proxy.SQLiteResponseCache(10000, 60, [], str(tmp_path / "state.db"))
+    key = openapi_proxy.request_key("GET", "/a", [], "Bearer a")
+    cache.store(key, httpx.Response(200, content=b"[]"))
+    cache.RECENCY_FLUSH_SECONDS = 0
+    writes = cache.db.total_changes
+
+    cache.get(key)
+
+    assert cache.db.total_changes == writes + 1
+
+def test_route_table_prefers_literal_segments_and_falls_back():
+    routes = openapi_proxy.RouteTable()
+    routes.add("/v1/courses/self", "get", "get_own_course")
+    routes.add("/v1/courses/{course_id}/assignments", "get", "list_assignments")
+    routes.add("/v1/courses/{course_id}", "put", "update_course")
+
+    assert routes.match("v1/courses/self")["GET"]["operation_id"] == "get_own_course"
+    assert routes.match("v1/courses/7")["PUT"]["operation_id"] == "update_course"
+    # The literal branch dead-ends, so the templated one is tried
+    assert routes.match("v1/courses/self/assignments")["GET"]["path"] == "/v1/courses/{course_id}/assignments"
+    assert routes.match("v1/courses//assignments") is None
+    assert routes.match("v1/users") is None
+
+def test_requests_outside_the_schema_are_answered_locally(start_proxy, spec_file):
+    upstream = Upstream()
+    proxy = start_proxy(upstream, openapi_path=spec_file, enforce_routes=True)
+
+    assert proxy.get("/users/7").json() == {"path": "/users/7"}
+    missing = proxy.get("/courses/7")
+    not_allowed = proxy.put("/users/7", json={})
+
+    assert missing.status_code == 404
+    assert not_allowed.status_code == 405
+    assert not_allowed.headers["allow"] == "DELETE, GET"
+    assert [request.url.path for request in upstream.requests] == ["/users/7"]
+
+def test_head_is_routed_as_get(start_proxy, spec_file):
+    upstream = Upstream()
+    proxy = start_proxy(upstream, openapi_path=spec_file, enforce_routes=True)
+
+    assert proxy.head("/items").status_code == 200
+    assert [request.method for request in upstream.requests] == ["HEAD"]
+
+def test_routes_follow_the_tag_filter(start_proxy, spec_file):
+    upstream = Upstream()
+    proxy = start_proxy(upstream, openapi_path=spec_file, enforce_routes=True, include_tags=["items"])
+
+    assert proxy.get("/items").status_code == 200
+    assert proxy.get("/users").status_code == 404
+    assert len(upstream.requests) == 1
+
+def test_cache_key_normalizes_query_and_separates_credentials(start_proxy):
+    upstream = Upstream()
+    proxy = start_proxy(upstream, cache_enabled=True)
+
+    first = proxy.get("/v1/courses?include[]=a&per_page=5", headers={"Authorization": "Bearer a"})
+    reordered = proxy.get("/v1/courses?per_page=5&include[]=a", headers={"Authorization": "Bearer a"})
+    other_user = proxy.get("/v1/courses?include[]=a&per_page=5", headers={"Authorization": "Bearer b"})
+
+    assert [first.headers["x-proxy-cache"], reordered.headers["x-proxy-cache"],
+            other_user.headers["x-proxy-cache"]] == ["MISS", "HIT", "MISS"]
+    assert len(upstream.requests) == 2
+
+def test_route_ttls_override_the_default(start_proxy, clock):
+    upstream = Upstream()
+    proxy = start_proxy(
+        upstream, cache_enabled=True, cache_default_ttl=10,
+        cache_route_ttls=[("/v1/courses/*/users", 0), ("/v1/courses/*", 100)]
+    )
+
+    for path in ["/v1/courses/1", "/v1/courses/1/users", "/v1/users"]:
+        proxy.get(path)
+    clock[0] += 50
+    statuses = {path: proxy.get(path).headers["x-proxy-cache"]
+                for path in ["/v1/courses/1", "/v1/courses/1/users", "/v1/users"]}
+
+    # 100 s route TTL, never cached, and expired after the 10 s default
+    assert statuses == {"/v1/courses/1": "HIT", "/v1/courses/1/users": "MISS", "/v1/users": "MISS"}
+
+def test_cache_evicts_least_recently_used_entries_by_size(start_proxy):
+    upstream = Upstream(lambda request: httpx.Response(200, content=b"x" * 40))
+    proxy = start_proxy(upstream, cache_enabled=True, cache_max_bytes=100)
+
+    proxy.get("/a")
+    proxy.get("/b")
+    proxy.get("/a")
+    # Storing /c goes over 100 bytes, so /b (least recently used) is evicted
+    proxy.get("/c")
+
+    assert proxy.get("/a").headers["x-proxy-cache"] == "HIT"
+    assert proxy.get("/b").headers["x-proxy-cache"] == "MISS"
+    cache = proxy.get("/_proxy/cache").json()
+    assert cache["bytes"] <= 100
+    assert cache["evictions"] >= 1
+
+def revalidating_upstream():
+    """Upstream that answers conditional requests for the current ETag with 304."""
+    def respond(request):
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, json={"version": 1}, headers={"etag": '"v1"'})
+    return Upstream(respond)
+
+def test_stale_entries_are_revalidated_with_etag(start_proxy, clock):
+    upstream = revalidating_upstream()
+    proxy = start_proxy(upstream, cache_enabled=True, cache_default_ttl=10)
+
+    proxy.get("/v1/courses")
+    clock[0] += 20
+    response = proxy.get("/v1/courses")
+
+    assert response.status_code == 200
+    assert response.json() == {"version": 1}
+    assert response.headers["x-proxy-cache"] == "REVALIDATED"
+    assert upstream.requests[1].headers["if-none-match"] == '"v1"'
+    # The confirmed entry is fresh again
+    assert proxy.get("/v1/courses").headers["x-proxy-cache"] == "HIT"
+
+def test_revalidation_survives_eviction_during_the_request(start_proxy, clock):
+    upstream = revalidating_upstream()
+    respond = upstream.respond
+
+    def evict_then_respond(request):
+        cache = openapi_proxy.response_cache
+        for key in list(cache.entries):
+            cache.remove(key)
+        return respond(request)
+
+    proxy = start_proxy(upstream, cache_enabled=True, cache_default_ttl=10)
+    proxy.get("/v1/courses")
+    clock[0] += 20
+    upstream.respond = evict_then_respond
+    response = proxy.get("/v1/courses")
+
+    assert response.status_code == 200
+    assert response.json() == {"version": 1}
+    assert response.headers["x-proxy-cache"] == "REVALIDATED"
+
+def test_writes_invalidate_overlapping_paths(start_proxy):
+    upstream = Upstream()
+    proxy = start_proxy(upstream, cache_enabled=True)
+    paths = ["/v1/courses", "/v1/courses/1/assignments", "/v1/courses/10", "/v1/users"]
+    for path in paths:
+        proxy.get(path)
+
+    proxy.post("/v1/courses/1", json={})
+
+    statuses = {path: proxy.get(path).headers["x-proxy-cache"] for path in paths}
+    assert statuses == {
+        "/v1/courses": "MISS",
+        "/v1/courses/1/assignments": "MISS",
+        "/v1/courses/10": "HIT",
+        "/v1/users": "HIT",
+    }
+
+def test_rate_limiter_releases_queued_requests_by_priority():
+    limiter = openapi_proxy.RateLimiter(bucket_size=10, refill_rate=100, reserve=0, max_retries=0, backoff=0)
+    # An empty bucket: one request's cost comes back every 10 ms
+    limiter._bucket("token")["remaining"] = 0.0
+    order = []
+
+    async def request(priority):
+        await limiter.acquire("token", priority)
+        order.append(priority)
+        await limiter.release("token", None)
+
+    async def main():
+        await asyncio.gather(*[request(priority) for priority in [5, 1, 3, 0]])
+
+    asyncio.run(main())
+
+    assert order == [0, 1, 3, 5]
+    assert limiter.stats["requests"] == 4
+    assert limiter.stats["queued_requests"] == 4
+    assert limiter.queue_depth() == 0
+
+def test_request_cancelled_before_queueing_does_not_block_the_bucket():
+    limiter = openapi_proxy.RateLimiter(bucket_size=10, refill_rate=100, reserve=0, max_retries=0, backoff=0)
+    bucket = limiter._bucket("token")
+
+    async def main():
+        # Another request holds the bucket's lock, as the SQLite backend does across a thread hop
+        async with bucket["condition"]:
+            waiter = asyncio.create_task(limiter.acquire("token", priority=0))
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+        await asyncio.wait_for(limiter.acquire("token", priority=1), timeout=1)
+
+    asyncio.run(main())
+
+    assert bucket["waiting"] == []
+    assert limiter.stats["requests"] == 1
+
+def test_rate_limiter_corrects_budget_from_response_headers():
+    limiter = openapi_proxy.RateLimiter(bucket_size=700, refill_rate=10, reserve=50, max_retries=0, backoff=0)
+    response = httpx.Response(200, headers={"x-request-cost": "21", "x-rate-limit-remaining": "300"})
+
+    async def main():
+        await limiter.acquire("token")
+        await limiter.release("token", response)
+
+    asyncio.run(main())
+
+    remaining, cost = limiter.budget("token")
+    assert remaining == pytest.approx(300, abs=1)
+    # Running estimate: 0.8 * previous estimate (1) + 0.2 * reported cost
+    assert cost == pytest.approx(5.0)
+
+def throttling_upstream(throttled_responses, body="403 Forbidden (Rate Limit Exceeded)"):
+    """Upstream whose first responses are 403s with the given body."""
+    def respond(request):
+        if len(upstream.requests) <= throttled_responses:
+            return httpx.Response(403, text=body)
+        return httpx.Response(200, json={"ok": True})
+    upstream = Upstream(respond)
+    return upstream
+
+def send_through(limiter, url="http://upstream/v1/courses"):
+    async def main():
+        return await limiter.send(openapi_proxy.client.build_request("GET", url, headers={"Authorization": "Bearer a"}))
+    return asyncio.run(main())
+
+def test_rate_limiter_retries_throttled_requests_with_backoff(use_upstream):
+    upstream = use_upstream(throttling_upstream(2))
+    limiter = openapi_proxy.RateLimiter(bucket_size=700, refill_rate=10000, reserve=0, max_retries=3, backoff=0.01)
+
+    response = send_through(limiter)
+
+    assert response.status_code == 200
+    assert len(upstream.requests) == 3
+    assert limiter.stats["throttled_responses"] == 2
+    assert limiter.stats["retries"] == 2
+
+def test_rate_limiter_gives_up_after_max_retries(use_upstream):
+    upstream = use_upstream(throttling_upstream(10))
+    limiter = openapi_proxy.RateLimiter(bucket_size=700, refill_rate=10000, reserve=0, max_retries=2, backoff=0.01)
+
+    response = send_through(limiter)
+
+    assert response.status_code == 403
+    assert len(upstream.requests) == 3
+    assert limiter.stats["throttled_responses"] == 3
+    assert limiter.stats["retries"] == 2
+
+def test_throttled_response_drains_the_budget(use_upstream):
+    use_upstream(throttling_upstream(1))
+    limiter = openapi_proxy.RateLimiter(bucket_size=700, refill_rate=10, reserve=0, max_retries=0, backoff=0)
+
+    send_through(limiter)
+
+    remaining, _ = limiter.budget(openapi_proxy.credential_hash("Bearer a"))
+    assert remaining < 1
+
+def test_rate_limiter_passes_other_403s_through(use_upstream):
+    upstream = use_upstream(throttling_upstream(1, body="403 Forbidden (user not authorized)"))
+    limiter = openapi_proxy.RateLimiter(bucket_size=700, refill_rate=10, reserve=0, max_retries=3, backoff=0.01)
+
+    response = send_through(limiter)
+
+    assert response.status_code == 403
+    assert len(upstream.requests) == 1
+    assert limiter.stats["retries"] == 0
+
+def slow_upstream(delay=0.05):
+    """Upstream that keeps each request in flight for a while."""
+    upstream = Upstream()
+
+    async def handler(request):
+        upstream.requests.append(request)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"request": len(upstream.requests)})
+
+    return upstream, handler
+
+def coalesced(key, authorization="Bearer a"):
+    request = openapi_proxy.client.build_request(
+        "GET", "http://upstream/v1/courses", headers={"Authorization": authorization}
+    )
+    return openapi_proxy.send_coalesced(key, request)
+
+def test_concurrent_identical_requests_share_one_upstream_request(use_upstream):
+    upstream, handler = slow_upstream()
+    use_upstream(handler)
+    key = openapi_proxy.request_key("GET", "v1/courses", [], "Bearer a")
+    other_key = openapi_proxy.request_key("GET", "v1/courses", [], "Bearer b")
+    coalesced_before = openapi_proxy.coalescing_stats["coalesced_requests"]
+
+    async def main():
+        return await asyncio.gather(*[coalesced(key) for _ in range(5)], coalesced(other_key, "Bearer b"))
+
+    responses = asyncio.run(main())
+
+    assert len(upstream.requests) == 2
+    assert len({id(response) for response in responses[:5]}) == 1
+    assert responses[5] is not responses[0]
+    assert openapi_proxy.coalescing_stats["coalesced_requests"] - coalesced_before == 4
+    assert openapi_proxy._pending_requests == {}
+
+def test_cancelled_leader_hands_over_to_a_follower(use_upstream):
+    upstream, handler = slow_upstream()
+    use_upstream(handler)
+    key = openapi_proxy.request_key("GET", "v1/courses", [], "Bearer a")
+
+    async def main():
+        leader = asyncio.create_task(coalesced(key))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(coalesced(key)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        responses = await asyncio.gather(*followers)
+        return leader, responses
+
+    leader, responses = asyncio.run(main())
+
+    assert leader.cancelled()
+    assert all(response.status_code == 200 for response in responses)
+    # One follower took over and sent the request again; the others shared it
+    assert len(upstream.requests) == 2
+    assert len({id(response) for response in responses}) == 1
+
+def test_cancelled_follower_leaves_the_shared_request_alone(use_upstream):
+    upstream, handler = slow_upstream()
+    use_upstream(handler)
+    key = openapi_proxy.request_key("GET", "v1/courses", [], "Bearer a")
+
+    async def main():
+        leader = asyncio.create_task(coalesced(key))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(coalesced(key))
+        other = asyncio.create_task(coalesced(key))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return follower, await leader, await other
+
+    follower, leader_response, other_response = asyncio.run(main())
+
+    assert follower.cancelled()
+    assert other_response is leader_response
+    assert len(upstream.requests) == 1
+
+def test_upstream_errors_reach_every_waiting_request(use_upstream):
+    async def failing(request):
+        await asyncio.sleep(0.02)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    use_upstream(failing)
+    key = openapi_proxy.request_key("GET", "v1/courses", [], "Bearer a")
+
+    async def main():
+        return await asyncio.gather(*[coalesced(key) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    assert openapi_proxy._pending_requests == {}
+
+def test_proxy_coalesces_concurrent_gets(start_proxy):
+    upstream, handler = slow_upstream()
+    start_proxy(handler, coalesce_requests=True)
+
+    async def main():
+        transport = httpx.ASGITransport(app=openapi_proxy.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as proxy:
+            return await asyncio.gather(*[
+                proxy.get("/v1/courses", headers={"Authorization": "Bearer a"}) for _ in range(5)
+            ])
+
+    responses = asyncio.run(main())
+
+    assert [response.json() for response in responses] == [{"request": 1}] * 5
+    assert len(upstream.requests) == 1
+
+def test_proxy_coalesces_only_requests_with_the_same_validators(start_proxy):
+    upstream, handler = slow_upstream()
+    start_proxy(handler, coalesce_requests=True)
+    variants = [{}, {}, {"If-None-Match": '"v1"'}, {"Range": "bytes=0-9"}, {"Accept": "text/csv"}]
+
+    async def main():
+        transport = httpx.ASGITransport(app=openapi_proxy.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as proxy:
+            return await asyncio.gather(*[
+                proxy.get("/v1/courses", headers={"Authorization": "Bearer a", **headers}) for headers in variants
+            ])
+
+    responses = asyncio.run(main())
+
+    assert len(upstream.requests) == 4
+    assert responses[0].json() == responses[1].json()
+    # Each conditional or range request went upstream on its own
+    assert sum("if-none-match" in request.headers for request in upstream.requests) == 1
+    assert sum("range" in request.headers for request in upstream.requests) == 1
+
+def paged_upstream(pages, with_last=True, per_page=2):
+    """Upstream serving a list in pages linked with Canvas-style Link headers."""
+    def respond(request):
+        page = int(request.url.params.get("page", "1"))
+        base = f"http://upstream{request.url.path}"
+        links = []
+        if page < pages:
+            links.append(f'<{base}?page={page + 1}&per_page={per_page}>; rel="next"')
+        if with_last:
+            links.append(f'<{base}?page={pages}&per_page={per_page}>; rel="last"')
+        items = [page * 10 + index for index in range(per_page)]
+        return httpx.Response(200, json=items, headers={"Link": ", ".join(links)} if links else {})
+    return Upstream(respond)
+
+def test_paginate_all_merges_every_page(start_proxy):
+    upstream = paged_upstream(4)
+    proxy = start_proxy(upstream)
+
+    response = proxy.get("/v1/courses?proxy_paginate=all", headers={"Authorization": "Bearer a"})
+
+    assert response.json() == [10, 11, 20, 21, 30, 31, 40, 41]
+    assert response.headers["x-proxy-pages"] == "4"
+    assert all(openapi_proxy.PAGINATE_PARAM not in request.url.params for request in upstream.requests)
+    assert all(request.headers["authorization"] == "Bearer a" for request in upstream.requests)
+
+def test_paginate_follows_next_links_without_a_last_page(start_proxy):
+    upstream = paged_upstream(3, with_last=False)
+    proxy = start_proxy(upstream)
+
+    response = proxy.get("/v1/courses?proxy_paginate=all")
+
+    assert response.json() == [10, 11, 20, 21, 30, 31]
+    assert [request.url.params.get("page") for request in upstream.requests] == [None, "2", "3"]
+
+@pytest.mark.parametrize("with_last", [True, False])
+def test_paginate_stops_at_max_pages(start_proxy, with_last):
+    upstream = paged_upstream(10, with_last=with_last)
+    proxy = start_proxy(upstream, max_pages=3)
+
+    response = proxy.get("/v1/courses?proxy_paginate=all")
+
+    assert response.json() == [10, 11, 20, 21, 30, 31]
+    assert response.headers["x-proxy-pages"] == "3"
+    assert len(upstream.requests) == 3
+
+def test_paginate_ndjson_streams_one_item_per_line(start_proxy):
+    proxy = start_proxy(paged_upstream(3))
+
+    response = proxy.get("/v1/courses?proxy_paginate=ndjson")
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [10, 11, 20, 21, 30, 31]
+
+def test_paginate_passes_other_responses_through(start_proxy):
+    upstream = Upstream(lambda request: httpx.Response(404, json={"errors": [{"message": "not found"}]}))
+    proxy = start_proxy(upstream)
+
+    response = proxy.get("/v1/courses/1?proxy_paginate=all")
+
+    assert response.status_code == 404
+    assert response.json() == {"errors": [{"message": "not found"}]}
+
+def test_paginate_ignores_links_to_other_hosts(start_proxy):
+    def respond(request):
+        return httpx.Response(200, json=[1], headers={"Link": '<http://elsewhere/v1/courses?page=2>; rel="next"'})
+    upstream = Upstream(respond)
+    proxy = start_proxy(upstream)
+
+    assert proxy.get("/v1/courses?proxy_paginate=all").json() == [1]
+    assert len(upstream.requests) == 1
+
+def test_paginate_flag_is_not_forwarded_on_other_methods(start_proxy):
+    upstream = Upstream()
+    proxy = start_proxy(upstream)
+
+    proxy.post("/v1/courses?proxy_paginate=all&per_page=5", json={})
+
+    assert list(upstream.requests[0].url.params.multi_items()) == [("per_page", "5")]
+
+def test_invalid_paginate_mode_is_rejected(start_proxy):
+    upstream = Upstream()
+    proxy = start_proxy(upstream)
+
+    assert proxy.get("/v1/courses?proxy_paginate=some").status_code == 400
+    assert upstream.requests == []
+
+@pytest.fixture
+def fresh_metrics(monkeypatch):
+    """Give the test its own metrics registry."""
+    registry = openapi_proxy.Metrics()
+    monkeypatch.setattr(openapi_proxy, "metrics", registry)
+    return registry
+
+def scrape(proxy):
+    """Read /metrics into {series: value}, checking every series has HELP and TYPE lines."""
+    response = proxy.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = {}
+    typed = set()
+    for line in response.text.splitlines():
+        if line.startswith("# TYPE "):
+            typed.add(line.split()[2])
+        elif not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+            name = series.split("{")[0]
+            assert name in typed or re.sub(r"_(bucket|sum|count)$", "", name) in typed
+    return samples
+
+def test_metrics_count_requests_by_operation(start_proxy, spec_file, fresh_metrics):
+    upstream, handler = slow_upstream(delay=0.05)
+    proxy = start_proxy(handler, openapi_path=spec_file, enforce_routes=True)
+
+    bodies = [proxy.get("/users/7").content, proxy.get("/users/8").content]
+    proxy.get("/courses")
+    proxy.post("/users", content=b'{"name": "x"}', headers={"Content-Type": "application/json"})
+    samples = scrape(proxy)
+
+    assert samples['proxy_requests_total{method="GET",operation="get_user",status="200"}'] == 2
+    assert samples['proxy_requests_total{method="GET",operation="unmatched",status="404"}'] == 1
+    assert samples['proxy_requests_total{method="POST",operation="create_user",status="200"}'] == 1
+    assert samples['proxy_response_bytes_total{operation="get_user"}'] == sum(len(body) for body in bodies)
+    assert samples['proxy_request_bytes_total{operation="create_user"}'] == len(b'{"name": "x"}')
+    # The metrics endpoint does not count itself
+    assert sum(value for series, value in samples.items() if series.startswith("proxy_requests_total")) == 4
+
+def test_metrics_split_upstream_time_from_proxy_time(start_proxy, spec_file, fresh_metrics):
+    upstream, handler = slow_upstream(delay=0.05)
+    proxy = start_proxy(handler, openapi_path=spec_file, enforce_routes=True)
+
+    proxy.get("/items")
+    samples = scrape(proxy)
+
+    labels = '{operation="list_items"}'
+    total = samples[f"proxy_request_duration_seconds_sum{labels}"]
+    upstream_time = samples[f"proxy_upstream_duration_seconds_sum{labels}"]
+    assert upstream_time >= 0.05
+    assert samples[f"proxy_overhead_duration_seconds_sum{labels}"] == pytest.approx(total - upstream_time)
+    assert samples['proxy_upstream_duration_seconds_bucket{operation="list_items",le="0.025"}'] == 0
+    assert samples['proxy_upstream_duration_seconds_bucket{operation="list_items",le="+Inf"}'] == 1
+    assert samples[f"proxy_request_duration_seconds_count{labels}"] == 1
+
+def test_metrics_expose_cache_and_pool_gauges(start_proxy, fresh_metrics):
+    proxy = start_proxy(Upstream(), cache_enabled=True, max_connections=7)
+
+    proxy.get("/v1/courses")
+    proxy.get("/v1/courses")
+    samples = scrape(proxy)
+
+    assert samples["proxy_cache_hits_total"] == 1
+    assert samples["proxy_cache_misses_total"] == 1
+    assert samples["proxy_cache_hit_ratio"] == 0.5
+    assert samples["proxy_cache_bytes"] > 0
+    assert samples["proxy_pool_max_connections"] == 7
+    assert "proxy_rate_limit_queue_depth" not in samples
+
+def test_metric_labels_are_escaped():
+    registry = openapi_proxy.Metrics()
+    registry.inc("proxy_requests_total", {"operation": 'say "hi" \\ bye'})
+
+    assert 'proxy_requests_total{operation="say \\"hi\\" \\\\ bye"} 1.0' in registry.render({})
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))